@@ -1,15 +1,30 @@
 """
-Script Name: synsimulat_data.py
+Script Name: 00-simulate_data.py
 
 Description:
-    This script generates a synthetic dataset containing the following columns:
+    This script generates synthetic data to test workflows, validate methodologies and
+    benchmark the pipeline. By default it generates a synthetic dataset containing the
+    following columns:
     - Country: Randomly selected country names.
     - Year: Randomly selected years within a specified range.
     - Population: Random population figures within a defined range.
     - Digital Number (DN): Random floating-point values representing DN.
     - Manufacturing as a Portion of GDP: Random percentages representing the manufacturing sector's contribution to GDP.
 
-    The generated dataset is saved as a CSV file for further analysis or testing purposes.
+    With `--workspace` it instead synthesizes every raw input of the pipeline under the same
+    relative layout as the repository, so the scripts can be run on it end to end (see
+    `benchmark.py`):
+    - GeoTIFFs of night-time lights at a configurable resolution (down to the full-global
+      30 arc-second grid), written strip by strip so memory stays bounded;
+    - a matching country shapefile, a tiling of the raster's extent into one jittered polygon
+      per country, with some cells left as sea;
+    - per-year country aggregates and legacy pixel-level tables;
+    - World Bank style wide tables (GDP, manufacturing share, population) and SPI scores.
+
+    Every generator draws whole arrays at once with NumPy, and everything is reproducible from
+    one seed: each raster strip uses its own generator derived from the seed and the strip, so
+    a raster does not depend on how it is written. Country names and codes come from the
+    country reference table, so the synthetic tables join like the real ones.
 
 Author:
     Shamayla Durrin Islam
@@ -17,31 +32,40 @@ Author:
 
 Date:
     Created: November 24, 2024
+    Updated: October 17, 2026 (vectorized and seedable generators, synthetic rasters, shapefiles and
+             World Bank tables)
 
 Dependencies:
     - Python 3.8 or higher
+    - numpy
     - pandas >= 1.3
-    - faker >= 8.0
+    - geopandas >= 0.9 and shapely >= 2.0 (for the shapefile)
+    - rasterio >= 1.2 (for the GeoTIFFs)
 
 Inputs:
     - None. The script generates data programmatically.
 
 Outputs:
-    - A CSV file named 'synthetic_data.csv' containing the generated dataset.
+    - A CSV file named 'simulated_data.csv' containing the generated dataset.
+    - With --workspace, the raw data tree described above.
 
 Usage:
     1. Ensure that the required dependencies are installed:
-        pip install pandas faker
+        pip install numpy pandas geopandas rasterio
     2. Run the script:
-        python synthetic_data_generator.py
+        python scripts/00-simulate_data.py --records 1000 --seed 853
+       Synthesize the pipeline inputs at 2 arc-minute resolution:
+        python scripts/00-simulate_data.py --workspace /tmp/ntl-sim --resolution 120 --countries 200 --years 30
 """
 
+import argparse
+import os
+
+import numpy as np
 import pandas as pd
-import random
-from faker import Faker
 
-# Initialize the Faker object
-fake = Faker()
+from atomic_io import write_csv_atomic
+from country_names import load_country_index
 
 # Set the number of records to generate
 num_records = 1000
@@ -50,38 +74,234 @@ num_records = 1000
 start_year = 1990
 end_year = 2020
 
-# Initialize an empty list to store the generated data
-data = []
-
-# Loop to generate synthetic data records
-for _ in range(num_records):
-    # Generate a random country name
-    country = fake.country()
-    
-    # Generate a random year within the specified range
-    year = random.randint(start_year, end_year)
-    
-    # Generate a random population between 1 million and 100 million
-    population = random.randint(1_000_000, 100_000_000)
-    
-    # Generate a random Digital Number (DN) value between 0 and 100
-    dn = round(random.uniform(0, 100), 2)
-    
-    # Generate a random manufacturing GDP percentage between 5% and 40%
-    manufacturing_gdp = round(random.uniform(5, 40), 2)
-    
-    # Append the generated record to the data list
-    data.append({
-        'Country': country,
-        'Year': year,
-        'Population': population,
-        'DN': dn,
-        'ManufacturingAsPortionOfGDP': manufacturing_gdp
+output_path = "data/00-simulated_data/simulated_data.csv"
+
+# Global extent (west, south, east, north) of the synthetic rasters
+GLOBAL_BOUNDS = (-180.0, -90.0, 180.0, 90.0)
+
+# Rows of each raster strip (and side of its blocks): strips are drawn and written one at a time
+STRIP_ROWS = 256
+
+# Share of lit pixels and DN ceiling of the synthetic rasters (harmonized DN saturates at 63)
+LIT_SHARE = 0.08
+MAX_DN = 63
+
+# Years covered by the synthetic World Bank downloads and SPI scores
+WDI_YEARS = range(1990, 2024)
+SPI_YEARS = range(2016, 2024)
+
+# Relative paths of the synthesized inputs, as in the repository
+tiff_dir = "data/01-raw_data/01-tiffiles"
+shapefile_dir = "data/01-raw_data/02-shapefile"
+legacy_dir = "data/01-raw_data/03-extracted"
+worldbank_dir = "data/01-raw_data/04-worldbankdata"
+aggregated_dir = "data/02-analysis_data/01-aggregatedbycountry"
+
+
+def reference_countries():
+    """Canonical countries with their own ISO3 code, as (names, codes)."""
+    index = load_country_index()
+    codes = pd.Series(index.iso3_to_country)
+    return codes.to_numpy(dtype=object), codes.index.to_numpy(dtype=object)
+
+
+def simulate_table(rng, records=num_records, first_year=start_year, last_year=end_year):
+    """The synthetic tabular dataset (one row per record)."""
+    names, _ = reference_countries()
+    return pd.DataFrame({
+        'Country': rng.choice(names, records),
+        'Year': rng.integers(first_year, last_year + 1, records),
+        'Population': rng.integers(1_000_000, 100_000_001, records),
+        'DN': np.round(rng.uniform(0, 100, records), 2),
+        'ManufacturingAsPortionOfGDP': np.round(rng.uniform(5, 40, records), 2),
     })
 
-# Convert the list of dictionaries into a pandas DataFrame
-df = pd.DataFrame(data)
 
-# Save the DataFrame to a CSV file
-df.to_csv('data/00-simulated_data/simulated_data.csv', index=False)
+def pick_countries(rng, n_countries):
+    """`n_countries` distinct reference countries (all of them when fewer exist), as (names, codes)."""
+    names, codes = reference_countries()
+    chosen = np.sort(rng.choice(len(names), min(n_countries, len(names)), replace=False))
+    return names[chosen], codes[chosen]
+
+
+def simulate_countries(rng, names, bounds=GLOBAL_BOUNDS, detail=16, jitter=0.35, sea_share=0.3):
+    """
+    Country polygons tiling `bounds`: a grid with about `len(names) / (1 - sea_share)` cells,
+    whose edges are split into `detail` segments and jittered (shared vertices move together,
+    so the polygons still tile the extent). Cells without a country are sea.
+    """
+    import geopandas as gpd
+    import shapely
+
+    west, south, east, north = bounds
+    n_cells = int(np.ceil(len(names) / (1 - sea_share)))
+    cols = int(np.ceil(np.sqrt(n_cells * (east - west) / (north - south))))
+    rows = int(np.ceil(n_cells / cols))
+
+    # Lattice of the cell corners and edge points, jittered inside the extent
+    x, y = np.meshgrid(np.linspace(west, east, cols * detail + 1), np.linspace(north, south, rows * detail + 1))
+    step_x, step_y = (east - west) / (cols * detail), (north - south) / (rows * detail)
+    x[:, 1:-1] += rng.uniform(-jitter, jitter, x[:, 1:-1].shape) * step_x
+    y[1:-1, :] += rng.uniform(-jitter, jitter, y[1:-1, :].shape) * step_y
+
+    # Ring of each cell, clockwise from its north-west corner: top, right, bottom and left edges
+    cells = np.sort(rng.choice(rows * cols, len(names), replace=False))
+    r0, c0 = (cells // cols * detail)[:, None], (cells % cols * detail)[:, None]
+    steps = np.arange(detail)[None, :]
+    ring_rows = np.concatenate([r0 + 0 * steps, r0 + steps, r0 + detail + 0 * steps, r0 + detail - steps], axis=1)
+    ring_cols = np.concatenate([c0 + steps, c0 + detail + 0 * steps, c0 + detail - steps, c0 + 0 * steps], axis=1)
+    rings = np.stack([x[ring_rows, ring_cols], y[ring_rows, ring_cols]], axis=-1)
+
+    return gpd.GeoDataFrame({"COUNTRY": names}, geometry=shapely.polygons(rings), crs="EPSG:4326")
+
+
+def raster_shape(resolution, bounds=GLOBAL_BOUNDS):
+    """Rows and columns of a grid of `resolution` arc-seconds over `bounds`."""
+    west, south, east, north = bounds
+    size = resolution / 3600
+    return int(round((north - south) / size)), int(round((east - west) / size))
+
+
+def simulate_raster(path, seed, resolution, bounds=GLOBAL_BOUNDS, lit_share=LIT_SHARE, compress="lzw"):
+    """
+    Write a synthetic uint8 night-time light GeoTIFF of `resolution` arc-seconds over `bounds`,
+    strip by strip: `lit_share` of the pixels are lit, with right-skewed DN values up to
+    `MAX_DN`. `seed` is an integer or a sequence of integers. Returns the raster's shape.
+    """
+    import rasterio
+    from rasterio.transform import from_origin
+    from rasterio.windows import Window
+
+    west, south, east, north = bounds
+    height, width = raster_shape(resolution, bounds)
+    profile = {
+        "driver": "GTiff", "height": height, "width": width, "count": 1, "dtype": "uint8",
+        "crs": "EPSG:4326", "transform": from_origin(west, north, resolution / 3600, resolution / 3600),
+        "tiled": True, "blockxsize": STRIP_ROWS, "blockysize": STRIP_ROWS, "compress": compress,
+        "BIGTIFF": "IF_SAFER",
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with rasterio.open(path, "w", **profile) as dataset:
+        for strip, row_off in enumerate(range(0, height, STRIP_ROWS)):
+            rows = min(STRIP_ROWS, height - row_off)
+            rng = np.random.default_rng([*np.atleast_1d(seed).tolist(), strip])
+            lit = rng.random((rows, width)) < lit_share
+            dn = np.minimum(np.ceil(rng.gamma(0.6, 10, (rows, width))), MAX_DN).astype("uint8")
+            dataset.write(np.where(lit, dn, 0).astype("uint8"), 1, window=Window(0, row_off, width, rows))
+    return height, width
+
+
+def simulate_aggregates(rng, names, years):
+    """Per-country yearly DN totals: a country level, a common growth trend and noise, {year: table}."""
+    level = rng.lognormal(10, 1.5, len(names))
+    growth = rng.normal(0.03, 0.02, len(names))
+    noise = rng.normal(0, 0.1, (len(years), len(names)))
+    totals = level * np.exp(growth * np.arange(len(years))[:, None] + noise)
+    return {year: pd.DataFrame({"country": names, "dn": np.rint(totals[i]).astype("int64")})
+            for i, year in enumerate(years)}
+
+
+def simulate_pixels(rng, names, rows):
+    """A legacy pixel-level table (one lit pixel per row) with coordinates, DN and country."""
+    weights = rng.dirichlet(np.ones(len(names)))
+    return pd.DataFrame({
+        "latitude": rng.uniform(-60, 75, rows).astype("float32"),
+        "longitude": rng.uniform(-180, 180, rows).astype("float32"),
+        "DN": np.minimum(np.ceil(rng.gamma(0.6, 10, rows)), MAX_DN).astype("uint8"),
+        "Country": rng.choice(names, rows, p=weights),
+    })
+
+
+def simulate_world_bank(rng, names, codes, years=WDI_YEARS, missing_share=0.05):
+    """World Bank style wide tables (Country, Country_Code, one column per year): {file name: table}."""
+    t = np.arange(len(years))[None, :]
+    shape = (len(names), len(years))
+
+    def wide(values):
+        values = np.where(rng.random(shape) < missing_share, np.nan, values)
+        table = pd.DataFrame(values, columns=[str(year) for year in years])
+        table.insert(0, "Country_Code", codes)
+        table.insert(0, "Country", names)
+        return table
+
+    gdp = np.exp(rng.normal(23, 2, (len(names), 1)) + rng.normal(0.03, 0.02, (len(names), 1)) * t
+                 + rng.normal(0, 0.05, shape))
+    population = np.exp(rng.normal(15, 1.8, (len(names), 1)) + 0.015 * t + rng.normal(0, 0.01, shape))
+    manufacturing = np.clip(rng.normal(15, 6, (len(names), 1)) + rng.normal(0, 1, shape), 1, 60)
+    return {
+        "GDP.csv": wide(np.round(gdp)),
+        "population.csv": wide(np.round(population)),
+        "manufacturing.csv": wide(manufacturing),
+    }
+
+
+def simulate_spi(rng, names, years=SPI_YEARS):
+    """SPI scores in the long format of the SPI download (country, year, SPI)."""
+    level = rng.uniform(20, 90, len(names))
+    scores = np.clip(level[:, None] + rng.normal(0, 3, (len(names), len(years))), 0, 100)
+    return pd.DataFrame({
+        "country": np.repeat(names, len(years)),
+        "year": np.tile(np.asarray(years), len(names)),
+        "SPI": scores.ravel(),
+    })
+
+
+def simulate_workspace(root, seed, resolution=600, n_countries=200, years=range(1992, 2022), raster_years=1,
+                       pixel_rows=1_000_000, bounds=GLOBAL_BOUNDS):
+    """
+    Synthesize the raw inputs of the pipeline under `root`, with the repository's relative
+    layout. Returns a description of what was written.
+    """
+    rng = np.random.default_rng(seed)
+    names, codes = pick_countries(rng, n_countries)
+    years = list(years)
+
+    countries = simulate_countries(rng, names, bounds)
+    os.makedirs(os.path.join(root, shapefile_dir), exist_ok=True)
+    countries.to_file(os.path.join(root, shapefile_dir, "countries.shp"))
+
+    shapes = {}
+    for i, year in enumerate(years[:raster_years]):
+        path = os.path.join(root, tiff_dir, f"Harmonized_DN_NTL_{year}_simVIIRS.tif")
+        shapes[year] = simulate_raster(path, [seed, i], resolution, bounds)
+
+    for year, table in simulate_aggregates(rng, names, years).items():
+        write_csv_atomic(table, os.path.join(root, aggregated_dir, f"{year}.csv"))
+    if pixel_rows:
+        write_csv_atomic(simulate_pixels(rng, names, pixel_rows), os.path.join(root, legacy_dir, f"{years[0]}.csv"))
+    for file_name, table in simulate_world_bank(rng, names, codes).items():
+        write_csv_atomic(table, os.path.join(root, worldbank_dir, file_name))
+    write_csv_atomic(simulate_spi(rng, names), os.path.join(root, worldbank_dir, "SPI.csv"))
+
+    height, width = next(iter(shapes.values())) if shapes else raster_shape(resolution, bounds)
+    return {"resolution": resolution, "height": height, "width": width, "pixels": height * width,
+            "countries": len(names), "years": len(years), "pixel_rows": pixel_rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic data for tests and benchmarks.")
+    parser.add_argument("--seed", type=int, default=853, help="Seed of every random draw.")
+    parser.add_argument("--records", type=int, default=num_records, help="Rows of the synthetic tabular dataset.")
+    parser.add_argument("--output", default=output_path, help="CSV to write the tabular dataset to.")
+    parser.add_argument("--workspace", help="Synthesize the pipeline's raw inputs under this directory instead.")
+    parser.add_argument("--resolution", type=float, default=600, help="Raster resolution in arc-seconds (30 = full VIIRS).")
+    parser.add_argument("--countries", type=int, default=200, help="Number of synthetic countries.")
+    parser.add_argument("--years", type=int, default=30, help="Number of years of country aggregates.")
+    parser.add_argument("--raster-years", type=int, default=1, help="Number of years with a synthetic GeoTIFF.")
+    parser.add_argument("--pixel-rows", type=int, default=1_000_000, help="Rows of the legacy pixel-level table.")
+    args = parser.parse_args()
+
+    if args.workspace:
+        summary = simulate_workspace(args.workspace, args.seed, args.resolution, args.countries,
+                                     range(1992, 1992 + args.years), args.raster_years, args.pixel_rows)
+        print(f"Synthesized {summary} under {args.workspace}")
+        return
+
+    # Save the DataFrame to a CSV file
+    df = simulate_table(np.random.default_rng(args.seed), args.records)
+    write_csv_atomic(df, args.output)
+    print(f"Saved {len(df)} records to {args.output}")
+
 
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,49 @@
 Script Name: data_extraction.py
 
 Description:
-    This script extracts data from a GeoTIFF file (e.g., Night-Time Light (NTL) data),
-    converts it into latitude, longitude, and DN value format, and then merges the data 
-    with a shapefile of world countries to assign a 'COUNTRY' column. The output is 
-    saved as a CSV file.
+    This script extracts data from the GeoTIFF files (e.g., Night-Time Light (NTL) data) and
+    aggregates the DN values by country using a shapefile of world countries. The shapefile
+    is rasterized once onto the raster grid (a country-ID label raster) and the DN values are
+    summed per country with array operations (see `ntl_extraction.py`), instead of looping
+    over every pixel and spatially joining one point per lit pixel. Extraction and
+    aggregation are fused: no pixel-level table is materialized, and the output is one CSV
+    file per year with one `country,dn` row per country, written straight into
+    `data/02-analysis_data/01-aggregatedbycountry`.
+
+    Users who need the pixel detail can pass `--pixels-dir` to also export every lit pixel's
+    latitude, longitude, DN and country as a compact Parquet file (see `pixel_export.py`).
+    With `--zonal-dir`, the same pass also computes zonal statistics (lit pixel count, mean,
+    max, percentiles, DN histogram and saturated pixel share, see `zonal_stats.py`) per
+    country and per zone of any extra boundary layer given with `--layer`, written as one wide
+    Parquet table per layer and year.
+
+    Every `Harmonized_DN_NTL_<year>_*.tif` in the input directory is processed, several years
+    at a time in a process pool. The country label raster is computed once per raster grid and
+    shapefile and cached on disk (see `label_cache.py`); each worker memory-maps it once and
+    reuses it for all the years it is given, and only reads the shapefile when the cache has
+    to be (re)built. Outputs are written atomically, so an interrupted run can simply be
+    restarted: years whose output already exists are skipped unless `--overwrite` is given.
+
+    With `--area-weighted` the yearly files also get each country's area, area-weighted DN sum
+    and light density (DN per km2), correcting for the smaller ground area of high-latitude
+    pixels (see `ntl_extraction.py`).
+
+    With `--assignment fractional`, pixels straddling a border are split between the countries
+    they overlap in proportion to their coverage (see `border_coverage.py`), instead of going
+    entirely to the country containing their centre; interior pixels keep the fast label path.
+
+    With `--tile-size` or `--max-memory` the rasters are streamed window by window so that
+    peak memory stays bounded regardless of the raster's resolution.
+
+    With `--raster-cache-dir` each GeoTIFF is decompressed once into an uncompressed,
+    memory-mapped copy keyed by the file's hash (see `raster_cache.py`), and later runs read
+    the windows straight from it; `--threads` then reads and reduces several windows at once.
+
+    With `--progress` the extraction reports its progress (pixels per second and ETA per year,
+    years done overall), and with `--metrics` every year is recorded as one JSON line with its
+    wall and CPU time, the time spent reading, labelling, reducing and writing, the pixels per
+    second, the peak memory and the bytes read and written (see `instrumentation.py`).
+    `--profile extract` profiles each year with cProfile.
 
 Author:
     Shamayla Durrin Islam
@@ -13,98 +52,320 @@ Author:
 
 Date:
     Created: November 23, 2024
+    Updated: October 17, 2026 (vectorized label-raster extraction, streaming mode, batch runs,
+             fused extraction and aggregation)
 
 Dependencies:
     - Python 3.8 or higher
+    - numpy
     - pandas >= 1.3
     - geopandas >= 0.9
     - rasterio >= 1.2
-    - shapely >= 1.7
+    - pyarrow (only for the optional pixel-level export)
 
 Inputs:
-    - GeoTIFF file containing raster data (e.g., NTL data).
+    - GeoTIFF files containing raster data (e.g., NTL data), one per year.
     - Shapefile of world countries with CRS EPSG:4326 (or compatible).
 
 Outputs:
-    - A CSV file containing latitude, longitude, DN value, and assigned country.
+    - One CSV file per year containing the total DN value for each country (and optionally its
+      area, area-weighted DN sum and light density).
+    - Optionally, one Parquet file per year with the lit pixels.
+    - Optionally, one Parquet file per boundary layer and year with the zonal statistics.
 
 Usage:
-    1. Update `file_path` and `shapefile_path` variables with appropriate file paths.
+    1. Place the GeoTIFF files in `data/01-raw_data/01-tiffiles` (or pass `--input-dir`).
     2. Install required dependencies using pip:
-        pip install pandas geopandas rasterio shapely
+        pip install numpy pandas geopandas rasterio
     3. Run the script:
-        python data_extraction.py
+        python scripts/01-data_extraction.py --workers 4
+       Also export the lit pixels as Parquet:
+        python scripts/01-data_extraction.py --pixels-dir data/01-raw_data/03-extracted
+       Zonal statistics per country and per admin-1 region:
+        python scripts/01-data_extraction.py --zonal-dir data/02-analysis_data/05-zonalstats \
+            --layer admin1=data/01-raw_data/07-admin1:GID_1
+       Area-weighted totals and light density:
+        python scripts/01-data_extraction.py --area-weighted --overwrite
+       Split border pixels between countries by coverage:
+        python scripts/01-data_extraction.py --assignment fractional --overwrite
+       Without the on-disk label raster cache:
+        python scripts/01-data_extraction.py --no-label-cache
+       Only some years, or redo years that were already extracted:
+        python scripts/01-data_extraction.py --years 2019 2020 --overwrite
+       Read the decoded rasters from the raster cache, four windows at a time:
+        python scripts/01-data_extraction.py --raster-cache-dir --stream --threads 4 --overwrite
+       Live progress, and the metrics of every year as JSON lines:
+        python scripts/01-data_extraction.py --stream --progress --metrics others/metrics/extraction.jsonl
+       Stream the rasters through bounded memory:
+        python scripts/01-data_extraction.py --stream              # native block windows
+        python scripts/01-data_extraction.py --tile-size 2048      # 2048 x 2048 tiles
+        python scripts/01-data_extraction.py --max-memory 512M     # tiles sized to a memory budget
 """
 
-import pandas as pd
-import geopandas as gpd
-import rasterio
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import numpy as np
-from shapely.geometry import Point
-
-# Define file paths
-file_path = "raw_data/tiffiles/Harmonized_DN_NTL_2019_simVIIRS.tif"  # GeoTIFF file path
-shapefile_path = "raw_data/shapefile"  # Shapefile path
-
-# Load the shapefile
-shapefile = gpd.read_file(shapefile_path)
-
-# Reproject the shapefile to EPSG:4326 if necessary
-if shapefile.crs.to_epsg() != 4326:
-    print("Reprojecting shapefile to EPSG:4326...")
-    shapefile = shapefile.to_crs(epsg=4326)
-else:
-    print("Shapefile is already in EPSG:4326.")
-
-# Open the GeoTIFF file with rasterio
-print("Reading GeoTIFF data...")
-with rasterio.open(file_path) as dataset:
-    # Read the first band
-    first_band = dataset.read(1)
-    transform = dataset.transform  # Get the affine transformation
-    
-    # Get dimensions
-    rows, cols = first_band.shape
-
-# Create a list to store the data
-data = []
-
-# Loop through each pixel to extract data
-print("Extracting raster data...")
-for row in range(rows):
-    for col in range(cols):
-        # Get the DN value for the pixel
-        dn_value = first_band[row, col]
-        
-        # Skip no-data or invalid values
-        if np.isnan(dn_value) or dn_value == 0:  # Adjust '0' if your no-data value is different
+import rasterio
+
+from atomic_io import write_csv_atomic, write_parquet_atomic
+from instrumentation import (
+    add_arguments,
+    configure_from_args,
+    configure_worker,
+    progress,
+    settings,
+    span,
+    timed,
+)
+from label_cache import load_label_raster
+from ntl_extraction import (
+    build_label_raster,
+    country_ids,
+    discover_tiffs,
+    extract_country_totals,
+    grid_key,
+    load_countries,
+    parse_size,
+    tile_size_for_memory,
+)
+from zonal_stats import DEFAULT_PERCENTILES, HARMONIZED_SATURATION
+
+# Define default file paths
+input_dir = "data/01-raw_data/01-tiffiles"  # Directory with the GeoTIFF files
+shapefile_path = "data/01-raw_data/02-shapefile"  # Shapefile path
+output_dir = "data/02-analysis_data/01-aggregatedbycountry"  # Directory for the per-year CSV files
+label_cache_dir = "data/01-raw_data/06-labelcache"  # Directory for the cached label rasters
+raster_cache_dir = "data/01-raw_data/09-rastercache"  # Directory for the decoded, memory-mapped GeoTIFFs
+
+# Per-worker state set by `init_worker`: the shapefile settings, the boundary polygons (read
+# lazily, only when a label raster has to be built) keyed by (shapefile, name field), and the
+# label rasters keyed by grid, shapefile and name field
+worker_shapefile_path = None
+worker_cache_dir = None
+boundaries = {}
+label_rasters = {}
+
+
+def init_worker(shapefile_path, cache_dir, instrumentation=None):
+    """Remember the shapefile and label cache used for every year this worker processes."""
+    global worker_shapefile_path, worker_cache_dir
+    worker_shapefile_path = shapefile_path
+    worker_cache_dir = cache_dir
+    configure_worker(instrumentation)
+
+
+def get_countries(shapefile_path=None, name_field="COUNTRY"):
+    """Read a boundary shapefile (by default the countries) the first time this worker needs it."""
+    key = (shapefile_path or worker_shapefile_path, name_field)
+    if key not in boundaries:
+        with timed("load_shapefile"):
+            boundaries[key] = load_countries(key[0], name_field)
+    return boundaries[key]
+
+
+def labels_for(file_path, stream, shapefile_path=None, name_field="COUNTRY"):
+    """
+    Label raster of a boundary layer (by default the countries) for the GeoTIFF's grid, from
+    this worker's memo or the on-disk cache.
+    """
+    shapefile_path = shapefile_path or worker_shapefile_path
+    with rasterio.open(file_path) as dataset:
+        key = (grid_key(dataset), shapefile_path, name_field)
+        if key not in label_rasters:
+            if worker_cache_dir is not None:
+                label_rasters[key] = load_label_raster(
+                    dataset, shapefile_path, lambda: get_countries(shapefile_path, name_field),
+                    worker_cache_dir, name_field,
+                )
+            elif stream:
+                # Without the cache, streaming labels each window on the fly
+                return None
+            else:
+                label_rasters[key] = build_label_raster(get_countries(shapefile_path, name_field),
+                                                        dataset.transform, (dataset.height, dataset.width),
+                                                        name_field)
+    return label_rasters[key]
+
+
+def zone_layers(file_path, stream, layers, labels):
+    """The country layer followed by the extra `(name, shapefile, name field)` boundary layers."""
+    from zonal_stats import ZoneLayer
+
+    result = [ZoneLayer("country", labels[1], label_raster=labels[0]) if labels
+              else ZoneLayer("country", zones=get_countries())]
+    for name, layer_path, name_field in layers:
+        layer_labels = labels_for(file_path, stream, layer_path, name_field)
+        if layer_labels:
+            result.append(ZoneLayer(name, layer_labels[1], label_raster=layer_labels[0]))
+        else:
+            result.append(ZoneLayer(name, zones=get_countries(layer_path, name_field), name_field=name_field))
+    return result
+
+
+def parse_layer(text):
+    """Parse a `NAME=SHAPEFILE:FIELD` boundary layer specification."""
+    name, _, spec = text.partition("=")
+    layer_path, _, name_field = spec.rpartition(":")
+    if not name or not layer_path or not name_field:
+        raise argparse.ArgumentTypeError(f"Expected NAME=SHAPEFILE:FIELD, got '{text}'.")
+    return name, layer_path, name_field
+
+
+def extract_year(year, file_path, output_path, pixels_path, stream, tile_size, max_memory,
+                 zonal_paths=None, layers=(), saturation=None, percentiles=None, area_weighted=False,
+                 assignment="center", raster_cache_dir=None, threads=None):
+    """
+    Aggregate one year's GeoTIFF by country and write it atomically to `output_path`,
+    optionally exporting the lit pixels to `pixels_path` and, when `zonal_paths` (layer name ->
+    Parquet path) is given, the zonal statistics of the country and extra boundary `layers`.
+    """
+    with span("extract", year=year):
+        with rasterio.open(file_path) as dataset:
+            dtype = np.dtype(dataset.dtypes[0])
+        if max_memory is not None and tile_size is None:
+            tile_size = tile_size_for_memory(max_memory, dtype)
+        stream = stream or tile_size is not None
+
+        with timed("label_raster"):
+            labels = labels_for(file_path, stream)
+        countries_arg = None if labels else get_countries()
+
+        coverage = None
+        if assignment == "fractional":
+            from border_coverage import BorderCoverage
+
+            names = labels[1] if labels else country_ids(get_countries())[1]
+            coverage = BorderCoverage(get_countries(), names)
+
+        zonal = None
+        if zonal_paths:
+            from zonal_stats import ZonalStats
+
+            zonal = ZonalStats(zone_layers(file_path, stream, layers, labels), dtype,
+                               saturation=saturation, percentiles=percentiles)
+
+        if pixels_path is None:
+            result = extract_country_totals(file_path, countries_arg, stream=stream,
+                                            tile_size=tile_size, labels=labels, zonal=zonal,
+                                            area_weighted=area_weighted, coverage=coverage,
+                                            raster_cache_dir=raster_cache_dir, threads=threads)
+        else:
+            from pixel_export import PixelWriter
+
+            names = labels[1] if labels else country_ids(countries_arg)[1]
+            with PixelWriter(pixels_path, names, dtype) as pixel_writer:
+                result = extract_country_totals(file_path, countries_arg, stream=stream,
+                                                tile_size=tile_size, labels=labels,
+                                                pixel_writer=pixel_writer, zonal=zonal,
+                                                area_weighted=area_weighted, coverage=coverage,
+                                                raster_cache_dir=raster_cache_dir, threads=threads)
+
+        with timed("write"):
+            if zonal is not None:
+                for name, table in zonal.frames().items():
+                    write_parquet_atomic(table, zonal_paths[name])
+            write_csv_atomic(result, output_path)
+    return year, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate night-time light GeoTIFFs by country and year.")
+    parser.add_argument("--input-dir", default=input_dir,
+                        help="Directory containing the Harmonized_DN_NTL_<year>_*.tif files.")
+    parser.add_argument("--shapefile", default=shapefile_path, help="Country boundary shapefile.")
+    parser.add_argument("--output-dir", default=output_dir, help="Directory for the per-year CSV files.")
+    parser.add_argument("--pixels-dir",
+                        help="Also write each year's lit pixels to <pixels-dir>/<year>.parquet.")
+    parser.add_argument("--label-cache-dir", default=label_cache_dir,
+                        help="Directory for the cached country label rasters.")
+    parser.add_argument("--no-label-cache", action="store_true",
+                        help="Rasterize the shapefile in every run instead of using the label raster cache.")
+    parser.add_argument("--area-weighted", action="store_true",
+                        help="Also write each country's area (area_km2), area-weighted DN sum (dn_area) "
+                             "and light density (dn_density, DN per km2).")
+    parser.add_argument("--assignment", choices=["center", "fractional"], default="center",
+                        help="Assign each pixel to the country containing its centre, or split the pixels "
+                             "on a border between countries by the share of the pixel each one covers.")
+    parser.add_argument("--zonal-dir",
+                        help="Also write zonal statistics to <zonal-dir>/<layer>/<year>.parquet "
+                             "(layer 'country' plus any --layer).")
+    parser.add_argument("--layer", type=parse_layer, action="append", default=[], metavar="NAME=SHAPEFILE:FIELD",
+                        help="Extra boundary layer for the zonal statistics, e.g. admin1=data/admin1.shp:GID_1 "
+                             "(FIELD must identify each zone uniquely). Can be repeated.")
+    parser.add_argument("--saturation", type=float, default=HARMONIZED_SATURATION,
+                        help="DN at or above which a pixel counts as saturated (top-coded).")
+    parser.add_argument("--percentiles", type=float, nargs="+", default=list(DEFAULT_PERCENTILES),
+                        help="DN percentiles reported by the zonal statistics.")
+    parser.add_argument("--raster-cache-dir", nargs="?", const=raster_cache_dir,
+                        help="Read the GeoTIFFs from their decoded, memory-mapped copies in this directory "
+                             f"(default when given without a value: {raster_cache_dir}), decoding them on first use.")
+    parser.add_argument("--threads", type=int,
+                        help="Windows read and reduced concurrently per year when streaming from the raster cache.")
+    parser.add_argument("--years", type=int, nargs="+", help="Only process these years.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of years processed concurrently.")
+    parser.add_argument("--overwrite", action="store_true", help="Redo years whose output already exists.")
+    parser.add_argument("--stream", action="store_true",
+                        help="Read the rasters window by window (native blocks unless a tile size is given).")
+    parser.add_argument("--tile-size", type=int,
+                        help="Stream the rasters in square tiles of this many pixels.")
+    parser.add_argument("--max-memory", type=parse_size,
+                        help="Stream the rasters in tiles sized to this memory budget (per worker), e.g. 512M or 2G.")
+    add_arguments(parser)
+    args = parser.parse_args()
+    configure_from_args(args)
+
+    if args.layer and not args.zonal_dir:
+        parser.error("--layer requires --zonal-dir.")
+    layer_names = ["country"] + [name for name, _, _ in args.layer]
+    if len(set(layer_names)) != len(layer_names):
+        parser.error("Boundary layer names must be unique (and not 'country').")
+
+    # Discover the GeoTIFF for each year
+    tiffs = discover_tiffs(args.input_dir)
+    if args.years:
+        missing = sorted(set(args.years) - set(tiffs))
+        if missing:
+            print(f"No GeoTIFF found for: {', '.join(map(str, missing))}")
+        tiffs = {year: path for year, path in tiffs.items() if year in args.years}
+
+    # Skip years that were already extracted by a previous (possibly interrupted) run
+    jobs = []
+    for year, file_path in sorted(tiffs.items()):
+        output_path = os.path.join(args.output_dir, f"{year}.csv")
+        pixels_path = os.path.join(args.pixels_dir, f"{year}.parquet") if args.pixels_dir else None
+        zonal_paths = ({name: os.path.join(args.zonal_dir, name, f"{year}.parquet") for name in layer_names}
+                       if args.zonal_dir else {})
+        done = (os.path.exists(output_path) and (pixels_path is None or os.path.exists(pixels_path))
+                and all(os.path.exists(path) for path in zonal_paths.values()))
+        if done and not args.overwrite:
+            print(f"Skipping {year}: {output_path} already exists.")
             continue
-        
-        # Convert pixel indices to geographic coordinates
-        lon, lat = rasterio.transform.xy(transform, row, col, offset='center')
-        
-        # Append the data as a tuple (latitude, longitude, DN value)
-        data.append((lat, lon, dn_value))
-
-# Convert the extracted data to a Pandas DataFrame
-df = pd.DataFrame(data, columns=["Latitude", "Longitude", "DN"])
-print(f"Extracted {len(df)} valid data points.")
-
-# Create geometry for each point using latitude and longitude
-geometry = [Point(xy) for xy in zip(df["Longitude"], df["Latitude"])]
-geo_df = gpd.GeoDataFrame(df, geometry=geometry, crs="EPSG:4326")
-
-# Perform a spatial join with the shapefile to assign country names
-print("Performing spatial join...")
-result = gpd.sjoin(geo_df, shapefile, how="left", predicate="intersects")
-
-# Select relevant columns and rename as needed
-result = result[["Latitude", "Longitude", "DN", "COUNTRY"]]
-
-# Save the result to a CSV file
-output_path = "raw_data/extracted/1993.csv"  # Output CSV file path
-result.to_csv(output_path, index=False)
-print(f"Processed data saved to {output_path}.")
-
-# Display the first few rows of the result
-print(result.head())
+        jobs.append((year, file_path, output_path, pixels_path, zonal_paths))
+
+    if not jobs:
+        print("Nothing to extract.")
+        return
+
+    workers = max(1, min(args.workers, len(jobs)))
+    print(f"Extracting {len(jobs)} year(s) with {workers} worker(s)...")
+    cache_dir = None if args.no_label_cache else args.label_cache_dir
+    with span("extraction", years=len(jobs), workers=workers), progress("years", len(jobs), "years") as report, \
+            ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                initargs=(args.shapefile, cache_dir, settings())) as pool:
+        futures = {
+            pool.submit(extract_year, year, file_path, output_path, pixels_path,
+                        args.stream, args.tile_size, args.max_memory, zonal_paths, args.layer,
+                        args.saturation, args.percentiles, args.area_weighted, args.assignment,
+                        args.raster_cache_dir, args.threads): year
+            for year, file_path, output_path, pixels_path, zonal_paths in jobs
+        }
+        for future in as_completed(futures):
+            year, n_countries = future.result()
+            print(f"Saved {year}: DN values for {n_countries} countries.")
+            report.advance()
+
+
+if __name__ == "__main__":
+    main()
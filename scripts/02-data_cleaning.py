@@ -2,370 +2,339 @@
 Script Name: data_cleaning.py
 
 Description:
-    This script processes and cleans annual datasets related to night-time light (NTL) data, GDP, manufacturing share of GDP, population, 
-    and SPI (Statistical Performance Indicator). The script standardizes, aggregates, renames, and merges datasets for analysis purposes. 
+    This script processes and cleans annual datasets related to night-time light (NTL) data, GDP, manufacturing share of GDP, population,
+    and SPI (Statistical Performance Indicator). The script standardizes, aggregates, renames, and merges datasets for analysis purposes.
     Key steps include:
     1. Cleaning and aggregating NTL data by country and year.
     2. Transforming and standardizing World Bank data (GDP, Manufacturing, Population, SPI).
     3. Assigning SPI-based grades to countries based on statistical performance.
     4. Merging cleaned datasets into a final unified dataset for analysis.
 
+    Every step is a stage tracked in a manifest (`data/02-analysis_data/.manifest.json`, see
+    `pipeline_manifest.py`) recording the content hash of its inputs. A rerun only recomputes
+    the stages whose inputs changed, and only the rows those changes affect: adding or
+    updating one year's aggregate re-reads that one file, replaces its rows in
+    `concatenated.csv`, and re-merges only that year into the analysis dataset.
+
+    The yearly files are read in one bulk (threaded) pass and concatenated once. The
+    territory -> sovereign renaming and the country removal are applied to the distinct
+    country names only, and every row is mapped through its integer category code.
+
+    Country names are normalized through the shared reference table
+    `data/01-raw_data/05-countryreference/countries.csv` (see `country_names.py`), and the
+    tables are joined on ISO3 country codes.
+
+    Every stage is an instrumentation span (see `instrumentation.py`): with `--metrics` its wall
+    and CPU time, rows processed per second, time spent reading and writing, peak memory and
+    bytes read and written are recorded as one JSON line, `--progress` reports the reading of
+    the yearly files, and `--profile STAGE` profiles a stage with cProfile.
+
 Author:
     Shamayla Durrin Islam
     shamayla.islam@mail.utoronto.ca
 
 Date:
     28/11/2024
+    Updated: 17/10/2026 (incremental, dependency-tracked rebuilds)
 
 Dependencies:
     - Python 3.8 or higher
     - pandas >= 1.3
-    - rasterio 
+    - pyarrow
     - os
 
 Inputs:
-    - Extracted NTL datasets (CSV format)
+    - Per-country yearly NTL aggregates written by 01-data_extraction.py (CSV format)
     - World Bank datasets: GDP, Manufacturing, Population, SPI (CSV format)
+    - Country reference table: aliases, canonical names, ISO3 codes and regions (CSV format)
 
 Outputs:
     - Cleaned and aggregated NTL data (by country and year)
-    - Standardized World Bank datasets (GDP, Manufacturing, Population, SPI)
-    - Unified dataset with merged variables for analysis (CSV and Parquet format)
+    - World Bank indicators (GDP, Manufacturing, Population) in a long-format Parquet store partitioned by
+      indicator and year (see wdi_ingest.py), and the SPI grades (CSV format)
+    - Unified dataset with merged variables for analysis (CSV, and Parquet with an int16 year, dictionary-encoded
+      names and float32 indicators)
 
 Usage:
     1. Set the input and output directories for raw and processed data.
-    2. Run the script to clean, process, and merge datasets.
+    2. Run the script from the repository root to clean, process, and merge datasets:
+        python scripts/02-data_cleaning.py
+       Recompute every stage regardless of the manifest:
+        python scripts/02-data_cleaning.py --force
+       Only some stages (as run by ntl.py), on a data/ tree elsewhere:
+        python scripts/02-data_cleaning.py --stage worldbank --indicator gdp --data-dir /scratch/data
+       Record the metrics of every stage, and profile the concatenation:
+        python scripts/02-data_cleaning.py --metrics --profile concatenate
     3. Access the final dataset for further statistical or econometric analysis.
 """
 
-
-# First we simply take each extracted file that contains the DN values, Country and Year and we will remove all the observations that do not have a valid country identified.
-# Then we will sum all the DN values for each country as we will be needing the aggregate luminosity.  
-# Define input and output directories
-
-import rasterio
-import pandas
+import argparse
 import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+
+from atomic_io import write_csv_atomic, write_parquet_atomic
+from country_names import load_country_index, reference_path
+from instrumentation import add_arguments, configure_from_args, count, progress, span, timed
+from pipeline_manifest import Manifest, file_sha256
+from wdi_ingest import indicator_panel, ingest, partition_dir
+
+# Define input and output paths (under the `data/` tree, see `use_data_dir`)
+data_dir = "data"
+legacy_dir = "data/01-raw_data/03-extracted"  # Directory with legacy pixel-level annual data files
+aggregated_dir = "data/02-analysis_data/01-aggregatedbycountry"  # Directory with the per-country yearly aggregates
+concatenated_path = "data/02-analysis_data/02-concatenated/concatenated.csv"
+worldbank_dir = "data/01-raw_data/04-worldbankdata"  # Raw World Bank downloads
+processed_dir = "data/02-analysis_data/03-worldbankdataprocessed"  # Standardized World Bank data
+indicator_store_dir = os.path.join(processed_dir, "indicators")  # Long-format, partitioned indicator store
+analysis_csv_path = "data/02-analysis_data/04-analysis/analysis.csv"
+analysis_parquet_path = "data/02-analysis_data/04-analysis/analysis.parquet"
+manifest_path = "data/02-analysis_data/.manifest.json"
+path_names = ["legacy_dir", "aggregated_dir", "concatenated_path", "worldbank_dir", "processed_dir",
+              "indicator_store_dir", "analysis_csv_path", "analysis_parquet_path", "manifest_path"]
+
+# Stages of the script, in order; `--stage` runs a subset
+stages = ["aggregate", "concatenate", "worldbank", "spi", "merge"]
+
+# Rename columns to standard names
+column_mapping = {
+    "country": "country",  # Ensure consistency for country
+    "dn": "dn",            # Normalize 'DN' to 'dn'
+    "dn_value": "dn"       # Normalize 'DN_value' to 'dn'
+}
 
+# Country names are normalized through one reference table (see `country_names.py`):
+# - NTL: territories that are named independently in the shapefile are renamed as their parent
+#   country, and excluded areas (e.g. Vatican City) are removed.
+# - World Bank: countries are identified by their ISO3 code, so e.g. 'Czechia' and 'Korea, Rep.'
+#   resolve to the shapefile's 'Czech Republic' and 'South Korea'.
+# All the tables are then joined on the ISO3 country code rather than on the country name.
+
+# Columns of the analysis dataset, in order
+analysis_columns = ["country", "year", "dn", "gdp", "manufacturingsharegdp", "country_code", "population",
+                    "SPI", "grade"]
+
+# World Bank indicators: name in the indicator store (and analysis column) -> raw file. Any other
+# single-indicator download can be added here; see wdi_ingest.py for the WDI bulk file.
+world_bank_indicators = {
+    "gdp": "GDP.csv",
+    "manufacturingsharegdp": "manufacturing.csv",
+    "population": "population.csv",
+}
 
-input_dir = "data/01-raw_data/extracted"  # Directory with raw annual data files
-output_dir = "data/02-analysis_data/01-aggregatedbycountry"  # Directory to save cleaned data
-
-# Ensure the output directory exists
-os.makedirs(output_dir, exist_ok=True)
-
-# Get a list of all CSV files in the input directory
-file_list = [f for f in os.listdir(input_dir) if f.endswith(".csv")]
-
-# Process each file
-for file_name in file_list:
-    year = file_name.split(".")[0]  # Extract the year from the file name
-    file_path = os.path.join(input_dir, file_name)
-    
-    # Load the dataset
-    print(f"Processing file: {file_name}")
-    df = pd.read_csv(file_path)
-    
-    # Normalize column names to lowercase
-    df.columns = df.columns.str.lower()
-    
-    # Rename columns to standard names
-    column_mapping = {
-        "country": "country",  # Ensure consistency for country
-        "dn": "dn",            # Normalize 'DN' to 'dn'
-        "dn_value": "dn"       # Normalize 'DN_value' to 'dn'
-    }
-    df.rename(columns=column_mapping, inplace=True)
-    
-    # Ensure the required columns exist
-    if "country" not in df.columns or "dn" not in df.columns:
-        print(f"Skipping file {file_name}: Required columns ('country' and 'dn') not found.")
-        continue
-
-    # Remove observations without a valid 'country'
-    df = df.dropna(subset=["country"])
-    
-    # Group by 'country' and sum the DN values
-    grouped_df = df.groupby("country", as_index=False)["dn"].sum()
-    
-    # Save the cleaned dataset to the output directory
-    output_file_path = os.path.join(output_dir, f"{year}.csv")
-    grouped_df.to_csv(output_file_path, index=False)
-    print(f"Saved cleaned data for {year} to: {output_file_path}")
 
+def use_data_dir(root):
+    """Read and write every table under the `data/` tree rooted at `root` instead of `data/`."""
+    global data_dir
+    for name in path_names:
+        globals()[name] = os.path.join(root, os.path.relpath(globals()[name], data_dir))
+    data_dir = root
 
 
-#Here we will concatenate into a single data frame. 
-#Also, some of the regions are part of coutries but named independently in the shapefile we will rename them as the parent country and sum their dn values again. 
+def warn_unknown(values, source):
+    """Report names that are not in the country reference table (they cannot be joined by code)."""
+    unknown = load_country_index().unknown(values)
+    if unknown:
+        print(f"Warning: {len(unknown)} unknown country name(s) in {source}: {', '.join(unknown)}")
 
-# Define input and output paths
-input_dir = "/Users/shamayladurrin/Desktop/STA304/NTLGDPCorr/data/02-analysis_data/yearwise/"  # Directory with cleaned annual data files
 
-# Get a list of all cleaned CSV files
-file_list = [f for f in os.listdir(input_dir) if f.endswith(".csv")]
+def read_table(file_path):
+    """
+    Read a CSV keeping codes such as Namibia's 'NA' as strings; only empty cells are missing.
+    Floats are parsed exactly, so a table read back and rewritten is unchanged.
+    """
+    return pd.read_csv(file_path, keep_default_na=False, na_values=[""], encoding="utf-8-sig",
+                       float_precision="round_trip")
 
-# Initialize an empty DataFrame to store the aggregated data
-final_df = pd.DataFrame()
 
-# Process each cleaned file
-for file_name in file_list:
-    # Extract the year from the file name (removing the .csv extension)
-    year = os.path.splitext(file_name.split("_")[0])[0]
-    file_path = os.path.join(input_dir, file_name)
-    
-    # Load the cleaned dataset
-    print(f"Processing cleaned file: {file_name}")
-    df = pd.read_csv(file_path)
-    
+def standardize_columns(df, file_name):
+    """Lowercase and rename the columns; None if the required 'country' and 'dn' columns are missing."""
     # Normalize column names to lowercase
     df.columns = df.columns.str.lower()
-    
-    # Rename columns to standard names
-    column_mapping = {
-        "country": "country",  # Ensure consistency for country
-        "dn": "dn",            # Normalize 'DN' to 'dn'
-        "dn_value": "dn"       # Normalize 'DN_value' to 'dn'
-    }
-    df.rename(columns=column_mapping, inplace=True)
-    
+    df = df.rename(columns=column_mapping)
+
     # Ensure the required columns exist
     if "country" not in df.columns or "dn" not in df.columns:
         print(f"Skipping file {file_name}: Required columns ('country' and 'dn') not found.")
-        continue
+        return None
+    return df
+
+
+def year_files(input_dir):
+    """Map each CSV in `input_dir` to the year in its file name (e.g. 1992.csv or 1992_cleaned.csv)."""
+    files = {}
+    for file_name in sorted(os.listdir(input_dir)):
+        if not file_name.endswith(".csv"):
+            continue
+
+        # Extract the year from the file name (removing the .csv extension)
+        year = os.path.splitext(file_name.split("_")[0])[0]
+        try:
+            files[os.path.join(input_dir, file_name)] = int(year)
+        except ValueError:
+            print(f"Skipping file {file_name}: Unable to parse year '{year}'.")
+    return files
+
+
+# Section 1: Aggregate NTL data by country
+
+# 01-data_extraction.py now writes the per-country yearly aggregates straight into 01-aggregatedbycountry,
+# so there is nothing to do here for a fresh extraction.
+# For pixel-level CSVs produced by older versions of the extraction script, we take each extracted file that contains the DN values, Country and Year and we will remove all the observations that do not have a valid country identified.
+# Then we will sum all the DN values for each country as we will be needing the aggregate luminosity.
+
+def aggregate_legacy_files(manifest):
+    """Aggregate each legacy pixel-level CSV whose content changed since the last run."""
+    if not os.path.isdir(legacy_dir):
+        return
+
+    for file_path, year in year_files(legacy_dir).items():
+        output_file_path = os.path.join(aggregated_dir, f"{year}.csv")
+        stage = f"aggregate/{year}"
+        if not manifest.is_stale(stage, [file_path], [output_file_path]):
+            continue
+
+        with span("aggregate", year=year):
+            # Load the dataset
+            print(f"Processing file: {os.path.basename(file_path)}")
+            with timed("read"):
+                df = standardize_columns(pd.read_csv(file_path), os.path.basename(file_path))
+            if df is None:
+                continue
+            count(rows=len(df))
+
+            # Remove observations without a valid 'country'
+            df = df.dropna(subset=["country"])
+
+            # Group by 'country' and sum the DN values
+            grouped_df = df.groupby("country", as_index=False)["dn"].sum()
+
+            # Save the cleaned dataset to the output directory
+            with timed("write"):
+                write_csv_atomic(grouped_df, output_file_path)
+            manifest.record(stage, [file_path], [output_file_path])
+        print(f"Saved cleaned data for {year} to: {output_file_path}")
+
+
+#Here we will concatenate into a single data frame.
+#Also, some of the regions are part of coutries but named independently in the shapefile we will rename them as the parent country and sum their dn values again.
+
+def read_year_file(file_path, year):
+    """Load one cleaned per-year file and tag it with its year."""
+    # Load the cleaned dataset
+    df = standardize_columns(read_table(file_path), os.path.basename(file_path))
+    if df is None:
+        return None
 
     # Add the year as a column
-    try:
-        df["year"] = int(year)  # Convert the year to an integer
-    except ValueError:
-        print(f"Skipping file {file_name}: Unable to parse year '{year}'.")
-        continue
-    
-    # Append to the final DataFrame
-    final_df = pd.concat([final_df, df], ignore_index=True)
-    
-rename_mapping = {
-    # Rename to 'France'
-    'Guadeloupe': 'France',
-    'Réunion': 'France',
-    'Mayotte': 'France',
-    'French Guiana': 'France',
-    'Martinique': 'France',
-    'French Southern Territories': 'France',
-    'Wallis and Futuna': 'France',
-    # Rename to 'Portugal'
-    'Madeira': 'Portugal',
-    'Azores': 'Portugal',
-    # Rename to 'United Kingdom'
-    'Guernsey': 'United Kingdom',
-    'Jersey': 'United Kingdom',
-    'Anguilla': 'United Kingdom',
-    'Montserrat': 'United Kingdom',
-    'Saint Helena': 'United Kingdom',
-    'Falkland Islands': 'United Kingdom',
-    'South Georgia and South Sandwich Islands': 'United Kingdom',
-    'British Indian Ocean Territory': 'United Kingdom',
-    # Rename to 'Australia'
-    'Norfolk Island': 'Australia',
-    'Christmas Island': 'Australia',
-    'Heard Island and McDonald Islands': 'Australia',
-    # Rename to 'Netherlands'
-    'Sint Maarten': 'Netherlands',
-    'Bonaire': 'Netherlands',
-    'Saba': 'Netherlands',
-    'Saint Eustatius': 'Netherlands',
-    # Rename to 'New Zealand'
-    'Niue': 'New Zealand',
-    # Rename to 'Spain'
-    'Canarias': 'Spain',
-    #rename to norway
-    'Svalbard': 'Norway',
-    #Rename to France
-    'Saint Barthelemy': 'France',
-    'Saint Pierre and Miquelon': 'France',
-    #Rename to Australia
-    'Cocos Islands': 'Australia',
-    # Rename to fix spelling
-    "Côte d'Ivoire" : "Cote d'Ivoire"
-}
-# Apply renaming
-final_df['country'] = final_df['country'].replace(rename_mapping)
-
-
-# Define countries to remove
-remove_countries = [
-    'Vatican City', 'Saint Martin', 'Cook Islands', 'Bouvet Island'
-]
-
-# Apply renaming
-final_df['country'] = final_df['country'].replace(rename_mapping)
-
-# Remove specified countries
-final_df = final_df[~final_df['country'].isin(remove_countries)]
-
-# Group by 'country' and sum the DN values
-final_df = final_df.groupby(["country", "year"], as_index=False)["dn"].sum()
-
-# Save the concatenated DF
-
-file_path = '/analysis_data/03-concatenated/concatenated.csv'
-
-# Save the DataFrame to a CSV file
-final_df.to_csv(file_path, index=False)
-
-#standertise the column names for merging later
-
-final_df.columns = final_df.columns.str.lower().str.strip() 
-
-# Section 2 : Clean World Bank Data 
-
-#First we will fix the gdp data set 
-
-# Load your dataset (replace 'your_file.csv' with the actual file name)
-file_path = '/Users/shamayladurrin/Desktop/GDPNTL/raw_data/gdpdata/GDP.csv'  # Update this to your file path
-gdp = pd.read_csv(file_path)
-
-# Convert from wide to long format
-gdp = pd.melt(
-    gdp,
-    id_vars=['Country', 'Country_Code'],  # Columns to keep fixed
-    var_name='Year',                     # Name for the years column
-    value_name='GDP'                     # Name for the GDP column
-)
-
-# Define renaming rules
-rename_mapping = {
-    'West Bank and Gaza': 'Palestinian Territory',
-    'Viet Nam': 'Vietnam',
-    "Korea, Dem. People's Rep.": 'North Korea',
-    'Channel Islands': 'Jersey',
-    'Congo, Dem. Rep.': 'Congo DRC',
-    'St. Lucia': 'Saint Lucia',
-    'Micronesia, Fed. Sts.': 'Micronesia',
-    'Venezuela, RB': 'Venezuela',
-    'Yemen, Rep.': 'Yemen',
-    'St. Kitts and Nevis': 'Saint Kitts and Nevis',
-    'Korea, Rep.': 'South Korea',
-    'Virgin Islands (U.S.)': 'US Virgin Islands',
-    'Bahamas, The': 'Bahamas',
-    'Czechia': 'Czech Republic',
-    'Syrian Arab Republic': 'Syria',
-    'Egypt, Arab Rep.': 'Egypt',
-    'Lao PDR': 'Laos',
-    'Kyrgyz Republic': 'Kyrgyzstan'
-}
-
-# Apply renaming
-gdp['Country'] = gdp['Country'].replace(rename_mapping)
-gdp.columns = gdp.columns.str.lower().str.strip()
-
-# Here we fix the manufacturing data set
-
-file_path = '/Users/shamayladurrin/Desktop/GDPNTL/analysis_data/04-worldbankdataprocessed/gdp.csv'
-gdp.to_csv(file_path, index=False)
-
-# Load your dataset (replace 'your_file.csv' with the actual file name)
-file_path = '/Users/shamayladurrin/Desktop/GDPNTL/raw_data/manufacturingData/manufacturing.csv'  # Update this to your file path
-manu = pd.read_csv(file_path)
-
-# Convert from wide to long format
-manu = pd.melt(
-    manu,
-    id_vars=['Country', 'Country_Code'],  # Columns to keep fixed
-    var_name='Year',                     # Name for the years column
-    value_name='ManufacturingShareGDP'                     
-)
-
-# Define renaming rules
-rename_mapping = {
-    'West Bank and Gaza': 'Palestinian Territory',
-    'Viet Nam': 'Vietnam',
-    "Korea, Dem. People's Rep.": 'North Korea',
-    'Channel Islands': 'Jersey',
-    'Congo, Dem. Rep.': 'Congo DRC',
-    'St. Lucia': 'Saint Lucia',
-    'Micronesia, Fed. Sts.': 'Micronesia',
-    'Venezuela, RB': 'Venezuela',
-    'Yemen, Rep.': 'Yemen',
-    'St. Kitts and Nevis': 'Saint Kitts and Nevis',
-    'Korea, Rep.': 'South Korea',
-    'Virgin Islands (U.S.)': 'US Virgin Islands',
-    'Bahamas, The': 'Bahamas',
-    'Czechia': 'Czech Republic',
-    'Syrian Arab Republic': 'Syria',
-    'Egypt, Arab Rep.': 'Egypt',
-    'Lao PDR': 'Laos',
-    'Kyrgyz Republic': 'Kyrgyzstan'
-}
+    return pd.DataFrame({"country": df["country"], "year": year, "dn": df["dn"]})
+
+
+def clean_year_files(files):
+    """Load per-year aggregate files, tag the year, apply the renaming and removal rules and re-sum."""
+    # Read all the files in one bulk pass (in parallel) and concatenate them once. The results
+    # come back in order, so they are reported from this thread rather than from the workers
+    with timed("read"), progress("yearly files", len(files), "files") as report, \
+            ThreadPoolExecutor(max_workers=min(8, len(files) or 1)) as pool:
+        frames = []
+        for file_path, df in zip(files, pool.map(read_year_file, files, files.values())):
+            print(f"Processing cleaned file: {os.path.basename(file_path)}")
+            report.advance()
+            if df is not None:
+                frames.append(df)
+                count(rows=len(df))
+    if not frames:
+        return pd.DataFrame({"country": pd.Series(dtype=str), "year": pd.Series(dtype="int64"),
+                             "dn": pd.Series(dtype="int64")})
+    final_df = pd.concat(frames, ignore_index=True)
+
+    # Apply the renaming and removal on the categories (one entry per distinct name), then map
+    # every row through its integer category code
+    country = final_df["country"].astype("category")
+    warn_unknown(country.cat.categories, "the NTL aggregates")
+    renamed = pd.Index(load_country_index().ntl_country(country.cat.categories))
+    kept = renamed != ""
+    countries = pd.Index(sorted(set(renamed[kept])))
+    new_codes = countries.get_indexer(renamed)
+
+    codes = country.cat.codes.to_numpy()
+    rows = codes >= 0  # Rows without a country are dropped by the group by
+    rows[rows] = kept[codes[rows]]
+
+    final_df = pd.DataFrame({
+        "country": pd.Categorical.from_codes(new_codes[codes[rows]], countries),
+        "year": final_df["year"].to_numpy()[rows].astype("int64"),
+        "dn": final_df["dn"].to_numpy()[rows],
+    })
 
-# Apply renaming
-manu['Country'] = manu['Country'].replace(rename_mapping)
-manu.columns = manu.columns.str.lower().str.strip()
-
-file_path = '/Users/shamayladurrin/Desktop/GDPNTL/analysis_data/04-worldbankdataprocessed/manufacturing.csv'
-manu.to_csv(file_path, index=False)
-
-# Now we will fix the population data set
-
-# Load your dataset (replace 'your_file.csv' with the actual file name)
-file_path = '/Users/shamayladurrin/Desktop/GDPNTL/raw_data/manufacturingData/manufacturing.csv'  # Update this to your file path
-pop = pd.read_csv(file_path)
-
-# Convert from wide to long format
-pop = pd.melt(
-    pop,
-    id_vars=['Country', 'Country_Code'],  # Columns to keep fixed
-    var_name='Year',                     # Name for the years column
-    value_name='Population'                     
-)
-
-# Define renaming rules
-rename_mapping = {
-    'West Bank and Gaza': 'Palestinian Territory',
-    'Viet Nam': 'Vietnam',
-    "Korea, Dem. People's Rep.": 'North Korea',
-    'Channel Islands': 'Jersey',
-    'Congo, Dem. Rep.': 'Congo DRC',
-    'St. Lucia': 'Saint Lucia',
-    'Micronesia, Fed. Sts.': 'Micronesia',
-    'Venezuela, RB': 'Venezuela',
-    'Yemen, Rep.': 'Yemen',
-    'St. Kitts and Nevis': 'Saint Kitts and Nevis',
-    'Korea, Rep.': 'South Korea',
-    'Virgin Islands (U.S.)': 'US Virgin Islands',
-    'Bahamas, The': 'Bahamas',
-    'Czechia': 'Czech Republic',
-    'Syrian Arab Republic': 'Syria',
-    'Egypt, Arab Rep.': 'Egypt',
-    'Lao PDR': 'Laos',
-    'Kyrgyz Republic': 'Kyrgyzstan'
-}
+    # Group by 'country' and sum the DN values
+    final_df = final_df.groupby(["country", "year"], as_index=False, observed=True)["dn"].sum()
+    final_df["country"] = final_df["country"].astype(str)
+    return final_df
+
+
+def concatenate(manifest):
+    """
+    Rebuild `concatenated.csv`, re-reading only the yearly files that changed. Returns the
+    concatenated data.
+    """
+    files = year_files(aggregated_dir)
+    stage = "concatenate"
+    params = {"country_reference": file_sha256(reference_path)}
+
+    if not manifest.is_stale(stage, list(files), [concatenated_path], params):
+        return pd.read_csv(concatenated_path, keep_default_na=False, na_values=[""])
+
+    changed, removed = manifest.changed_inputs(stage, list(files))
+    incremental = not manifest.params_changed(stage, params) and os.path.exists(concatenated_path)
+
+    if incremental:
+        # Replace only the rows of the years whose file was added, changed or removed
+        recorded_years = manifest.extra(stage).get("years", {})
+        stale_years = {files[path] for path in changed} | {recorded_years[path] for path in removed
+                                                           if path in recorded_years}
+        print(f"Updating {len(stale_years)} year(s) in {concatenated_path}")
+
+        final_df = pd.read_csv(concatenated_path, keep_default_na=False, na_values=[""])
+        final_df = final_df[~final_df["year"].isin(stale_years)]
+        new_rows = clean_year_files({path: year for path, year in files.items() if year in stale_years})
+        final_df = pd.concat([final_df, new_rows], ignore_index=True)
+        final_df = final_df.sort_values(["country", "year"], ignore_index=True)
+    else:
+        final_df = clean_year_files(files)
 
-# Apply renaming
-pop['Country'] = pop['Country'].replace(rename_mapping)
-pop.columns = pop.columns.str.lower().str.strip()
+    #standertise the column names for merging later
+    final_df.columns = final_df.columns.str.lower().str.strip()
 
-# Save it 
-file_path = '/Users/shamayladurrin/Desktop/GDPNTL/analysis_data/04-worldbankdataprocessed/population.csv'
-pop.to_csv(file_path, index=False)
+    # Save the concatenated DF
+    with timed("write"):
+        write_csv_atomic(final_df, concatenated_path)
+    manifest.record(stage, list(files), [concatenated_path], params,
+                    extra={"years": {path: year for path, year in files.items()}})
+    return final_df
 
-file_path = '/Users/shamayladurrin/Desktop/STA304/NTLGDPCorr/data/01-raw_data/worldbankdata/SPI.csv'
-spi = pd.read_csv(file_path)
 
-# Now we will prepare the rating data set 
+# Section 2 : Clean World Bank Data
 
-#SPI 
+def ingest_world_bank(manifest, name):
+    """Ingest one raw World Bank table into the long-format indicator store with canonical country names."""
+    file_path = os.path.join(worldbank_dir, world_bank_indicators[name])
+    output_path = partition_dir(indicator_store_dir, name)
+    stage = f"worldbank/{name}"
+    params = {"country_reference": file_sha256(reference_path), "store": "parquet"}
 
-file_path = '/Users/shamayladurrin/Desktop/STA304/NTLGDPCorr/data/01-raw_data/worldbankdata/SPI.csv'
-spi = pd.read_csv(file_path)
+    if not manifest.is_stale(stage, [file_path], [output_path], params):
+        return
 
-# Convert the year column to numeric (if it's not already)
-spi['year'] = pd.to_numeric(spi['year'], errors='coerce')
+    # Stream the table, convert it from wide to long format and name each country after its code
+    print(f"Processing World Bank table: {world_bank_indicators[name]}")
+    ingest(file_path, indicator_store_dir, indicator=name)
+    manifest.record(stage, [file_path], [output_path], params)
 
-# Remove rows with years after 2020
-spi = spi[spi['year'] <= 2020]
 
-# Group by 'year' (or 'date') and calculate the average SPI for each country or globally
-spi = spi.groupby(['country'], as_index=False)['SPI'].mean()
+# Now we will prepare the rating data set
 
 # Define a function to assign grades based on SPI
 def assign_grade(spi_value):
@@ -380,41 +349,186 @@ def assign_grade(spi_value):
     else:
         return 'F'
 
-# Apply the grading function to create a new column
-spi['grade'] = spi['SPI'].apply(assign_grade)
 
-file_path = '/Users/shamayladurrin/Desktop/GDPNTL/analysis_data/04-worldbankdataprocessed/ratingonSPI.csv'
-spi.to_csv(file_path, index=False)
+def grade_spi(manifest):
+    """Average the SPI up to 2020 for each country and assign a grade."""
+    file_path = os.path.join(worldbank_dir, "SPI.csv")
+    output_path = os.path.join(processed_dir, "ratingonSPI.csv")
+    stage = "spi"
 
-#Section 3: Merging
+    params = {"country_reference": file_sha256(reference_path)}
+
+    if not manifest.is_stale(stage, [file_path], [output_path], params):
+        return
 
-# final_df + GDP
-# Convert 'year' column to string in both datasets
-final_df['year'] = final_df['year'].astype(str)
-gdp['year'] = gdp['year'].astype(str)
+    print("Processing SPI ratings")
+    spi = pd.read_csv(file_path, encoding="utf-8-sig")  # Missing SPI values are written as 'NA'
 
-# Now merge the datasets
-merged = pd.merge(final_df, gdp, on=['year', 'country'], how='inner')
+    # Convert the year column to numeric (if it's not already)
+    spi['year'] = pd.to_numeric(spi['year'], errors='coerce')
 
-# merged + manu
-manu['year'] = manu['year'].astype(str)
+    # Remove rows with years after 2020
+    spi = spi[spi['year'] <= 2020]
 
-# Now merge the datasets
-merged = pd.merge(merged, manu, on=['year', 'country'], how='inner')
+    # The SPI data uses its own spelling of the country names (e.g. 'Czechia'), so we look up
+    # the canonical name and code of each country
+    index = load_country_index()
+    warn_unknown(spi['country'].unique(), "SPI.csv")
+    spi['country'] = index.canonical(spi['country'])
+    spi['country_code'] = index.iso3(spi['country'])
 
-# merged + pop
+    # Group by 'year' (or 'date') and calculate the average SPI for each country or globally
+    spi = spi.groupby(['country', 'country_code'], as_index=False, dropna=False)['SPI'].mean()
 
-pop['year'] = pop['year'].astype(str)
+    # Apply the grading function to create a new column
+    spi['grade'] = spi['SPI'].apply(assign_grade)
+    count(rows=len(spi))
 
-# Now merge the datasets
-merged = pd.merge(merged, pop, on=['year', 'country'], how='inner')
+    with timed("write"):
+        write_csv_atomic(spi, output_path)
+    manifest.record(stage, [file_path], [output_path], params)
 
-# Drop unnecessary columns
-merged = merged.drop(columns=['country_code_x', 'country_code_y'])
 
-# Now merge the datasets
-merged = pd.merge(merged, spi, on=['country'], how='inner')
+#Section 3: Merging
 
-# Save the DataFrame to a Parquet file
-parquet_file_path = '/Users/shamayladurrin/Desktop/GDPNTL/analysis_data/05-analysis/analysis.csv'
-merged.to_csv(parquet_file_path, index=False)
\ No newline at end of file
+def year_hashes(final_df):
+    """Order-independent hash of each year's rows, used to find the years that changed."""
+    row_hashes = pd.util.hash_pandas_object(final_df[["country", "year", "dn"]], index=False)
+    sums = row_hashes.groupby(final_df["year"].to_numpy()).sum()
+    return {str(year): str(value) for year, value in sums.items()}
+
+
+def typed_analysis(merged):
+    """Compact in-memory types: int16 year and categorical country, code and grade."""
+    return merged.astype({"year": "int16", "country": "category", "country_code": "category",
+                          "grade": "category"})
+
+
+def analysis_schema(merged):
+    """Explicit Parquet schema: int16 year, dictionary-encoded names and codes, float32 indicators."""
+    dn_type = pa.int64() if pd.api.types.is_integer_dtype(merged["dn"]) else pa.float64()
+    names = pa.dictionary(pa.int16(), pa.string())
+    return pa.schema([
+        ("country", names),
+        ("year", pa.int16()),
+        ("dn", dn_type),
+        ("gdp", pa.float32()),
+        ("manufacturingsharegdp", pa.float32()),
+        ("country_code", names),
+        ("population", pa.float32()),
+        ("SPI", pa.float32()),
+        ("grade", pa.dictionary(pa.int8(), pa.string())),
+    ])
+
+
+def merge_tables(final_df):
+    """
+    Inner-join the NTL data with GDP, manufacturing, population and the SPI grades, keyed by
+    (ISO3 code, int16 year). Only the indicators and years needed are read from the indicator
+    store; they are aligned on their MultiIndex in one pass and joined to the NTL rows once.
+    """
+    years = (int(final_df["year"].min()), int(final_df["year"].max())) if len(final_df) else None
+    indicators = indicator_panel(indicator_store_dir, list(world_bank_indicators), years)
+    spi = read_table(os.path.join(processed_dir, "ratingonSPI.csv"))
+    spi = spi.dropna(subset=["country_code"]).set_index("country_code")[["SPI", "grade"]]
+
+    # Look up the code of each NTL country; names missing from the reference table cannot be joined
+    merged = pd.DataFrame({
+        "country": final_df["country"].to_numpy(),
+        "year": final_df["year"].to_numpy().astype("int16"),
+        "dn": final_df["dn"].to_numpy(),
+        "country_code": load_country_index().iso3(final_df["country"]).to_numpy(),
+    }).dropna(subset=["country_code"])
+
+    merged = merged.join(indicators, on=["country_code", "year"], how="inner")
+    merged = merged.join(spi, on="country_code", how="inner")
+    return typed_analysis(merged[analysis_columns].reset_index(drop=True))
+
+
+def merge(manifest, final_df):
+    """
+    Rebuild the analysis dataset. When only the NTL data changed, only the years whose rows
+    changed are re-merged.
+    """
+    stage = "merge"
+    raw_tables = [os.path.join(worldbank_dir, raw_file) for raw_file in world_bank_indicators.values()]
+    inputs = [concatenated_path] + raw_tables + [os.path.join(processed_dir, "ratingonSPI.csv")]
+    outputs = [analysis_csv_path, analysis_parquet_path]
+
+    # Bump "format" when the layout of the analysis dataset changes, to rebuild it in full
+    params = {"country_reference": file_sha256(reference_path), "format": 2}
+
+    if not manifest.is_stale(stage, inputs, outputs, params):
+        return
+
+    hashes = year_hashes(final_df)
+    changed, removed = manifest.changed_inputs(stage, inputs)
+    incremental = (
+        changed == [concatenated_path]
+        and not removed
+        and not manifest.params_changed(stage, params)
+        and all(os.path.exists(path) for path in outputs)
+    )
+
+    if incremental:
+        previous = manifest.extra(stage).get("year_hashes", {})
+        stale_years = {year for year in set(hashes) | set(previous) if hashes.get(year) != previous.get(year)}
+        print(f"Re-merging {len(stale_years)} year(s) into the analysis dataset")
+
+        # The CSV keeps the indicators at full precision (the Parquet file stores them as float32)
+        merged = read_table(analysis_csv_path)
+        merged = merged[~merged["year"].astype(str).isin(stale_years)]
+        new_rows = merge_tables(final_df[final_df["year"].astype(str).isin(stale_years)])
+        merged = pd.concat([merged.astype(new_rows.dtypes.to_dict()), new_rows], ignore_index=True)
+        merged = typed_analysis(merged.sort_values(["country", "year"], ignore_index=True))
+    else:
+        print("Merging the analysis dataset")
+        merged = merge_tables(final_df)
+
+    count(rows=len(merged))
+
+    # Save the DataFrame to a CSV and a Parquet file
+    with timed("write"):
+        write_csv_atomic(merged, analysis_csv_path)
+        write_parquet_atomic(merged, analysis_parquet_path, schema=analysis_schema(merged))
+    manifest.record(stage, inputs, outputs, params, extra={"year_hashes": hashes})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clean, standardize and merge the NTL and World Bank data.")
+    parser.add_argument("--force", action="store_true", help="Recompute every stage, ignoring the manifest.")
+    parser.add_argument("--data-dir", default=data_dir,
+                        help="Root of the data/ tree holding the raw and analysis data.")
+    parser.add_argument("--stage", choices=stages, action="append",
+                        help="Only run this stage (can be repeated); all stages by default.")
+    parser.add_argument("--indicator", choices=list(world_bank_indicators), action="append",
+                        help="Only ingest this World Bank indicator (can be repeated).")
+    add_arguments(parser)
+    args = parser.parse_args()
+    configure_from_args(args)
+
+    use_data_dir(args.data_dir)
+    selected = set(args.stage or stages)
+    manifest = Manifest(manifest_path, force=args.force)
+
+    with span("cleaning"):
+        if "aggregate" in selected:
+            aggregate_legacy_files(manifest)
+        if selected & {"concatenate", "merge"}:
+            # The merge reads the concatenated data, which is only rebuilt here if it is stale
+            with span("concatenate"):
+                final_df = concatenate(manifest)
+        if "worldbank" in selected:
+            for name in args.indicator or world_bank_indicators:
+                with span("worldbank", indicator=name):
+                    ingest_world_bank(manifest, name)
+        if "spi" in selected:
+            with span("spi"):
+                grade_spi(manifest)
+        if "merge" in selected:
+            with span("merge"):
+                merge(manifest, final_df)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+"""
+Script Name: 03-prepareplottingdata.py
+
+Description:
+    Precomputes every figure-ready aggregate of the analysis dataset, so that the figures load
+    a few small tables instead of regrouping the full analysis table each time. The derived
+    columns (logs, region, grade, interval and manufacturing-share bin codes) are computed once,
+    and every table is then reduced from the same arrays with `np.bincount` over integer group
+    codes:
+    - plotting.parquet: average GDP, population and manufacturing share per country and 7-year
+      interval, with the country's SDG region (the table 03-prepareplottingdata.R used to write,
+      read by the paper).
+    - region_year.parquet: per SDG region and year, the number of countries and the sums of DN,
+      GDP and population (with the number of countries each sum covers).
+    - grade_year.parquet: per SPI grade and year, the cross-country elasticity of DN with
+      respect to GDP (slope of log DN on log GDP) with its standard error, correlation and R².
+    - manufacturing_bins.parquet: per manufacturing-share bin (`--bin-width` percentage points),
+      the number of observations and countries and the means of DN, log DN, GDP and log GDP.
+    - country_panel.parquet: per country, its region and grade, first and last year, means of
+      the indicators, average annual growth of DN and GDP (slope of the log on the year) and
+      the within-country elasticity of DN with respect to GDP.
+
+    Regions come from the shared country reference table (see `country_names.py`). The tables
+    use dictionary-encoded names, int16 years and float32 values, so each is a few kB to a few
+    hundred kB. The elasticities use the same centered sums as `correlation_cube.py`.
+
+    The build is tracked in a manifest (`data/03-plotting_data/.manifest.json`, see
+    `pipeline_manifest.py`): the tables are only rebuilt when the content of the analysis
+    dataset or of the country reference table changes (or `--force` is given).
+
+Author:
+    Shamayla Durrin Islam
+    shamayla.islam@mail.utoronto.ca
+
+Date:
+    Created: October 17, 2026
+
+Dependencies:
+    - Python 3.8 or higher
+    - numpy
+    - pandas >= 1.3
+    - pyarrow
+
+Usage:
+    From the repository root:
+        python scripts/03-prepareplottingdata.py
+    Rebuild even if the analysis dataset did not change, with 10-point manufacturing bins:
+        python scripts/03-prepareplottingdata.py --force --bin-width 10
+
+    Loading a table for a figure:
+        pd.read_parquet("data/03-plotting_data/grade_year.parquet")
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from atomic_io import write_parquet_atomic
+from correlation_cube import statistics
+from country_names import load_country_index, reference_path
+from fixed_effects import term_values
+from pipeline_manifest import Manifest
+
+# Define input and output paths
+analysis_parquet_path = "data/02-analysis_data/04-analysis/analysis.parquet"
+output_dir = "data/03-plotting_data"
+
+# Intervals over which the country averages of plotting.parquet are taken
+intervals = [(1991, 1997), (1998, 2004), (2005, 2011), (2012, 2020)]
+
+# Width of the manufacturing-share bins, in percentage points of GDP
+BIN_WIDTH = 5.0
+
+# Fewest observations for an elasticity
+MIN_OBS = 3
+
+# Bump when the content or layout of the tables changes, to rebuild them
+FORMAT = 1
+
+NAMES = pa.dictionary(pa.int16(), pa.string())
+LABELS = pa.dictionary(pa.int8(), pa.string())
+
+SCHEMAS = {
+    "plotting": pa.schema([
+        ("country", NAMES),
+        ("interval", LABELS),
+        ("region", LABELS),
+        ("avg_gdp", pa.float64()),
+        ("avg_population", pa.float64()),
+        ("avg_manufacturing_share", pa.float64()),
+    ]),
+    "region_year": pa.schema([
+        ("region", LABELS),
+        ("year", pa.int16()),
+        ("n_countries", pa.int16()),
+        ("dn", pa.float64()),
+        ("gdp", pa.float64()),
+        ("n_gdp", pa.int16()),
+        ("population", pa.float64()),
+        ("n_population", pa.int16()),
+    ]),
+    "grade_year": pa.schema([
+        ("grade", LABELS),
+        ("year", pa.int16()),
+        ("n", pa.int16()),
+        ("elasticity", pa.float32()),
+        ("se", pa.float32()),
+        ("corr", pa.float32()),
+        ("r2", pa.float32()),
+    ]),
+    "manufacturing_bins": pa.schema([
+        ("bin", LABELS),
+        ("bin_start", pa.float32()),
+        ("bin_end", pa.float32()),
+        ("n", pa.int32()),
+        ("n_countries", pa.int16()),
+        ("mean_dn", pa.float32()),
+        ("mean_log_dn", pa.float32()),
+        ("mean_gdp", pa.float32()),
+        ("mean_log_gdp", pa.float32()),
+    ]),
+    "country_panel": pa.schema([
+        ("country", NAMES),
+        ("country_code", NAMES),
+        ("region", LABELS),
+        ("grade", LABELS),
+        ("first_year", pa.int16()),
+        ("last_year", pa.int16()),
+        ("n_years", pa.int16()),
+        ("mean_dn", pa.float32()),
+        ("mean_gdp", pa.float32()),
+        ("mean_population", pa.float32()),
+        ("mean_manufacturing_share", pa.float32()),
+        ("dn_growth", pa.float32()),
+        ("gdp_growth", pa.float32()),
+        ("elasticity", pa.float32()),
+        ("corr", pa.float32()),
+    ]),
+}
+
+
+def numeric(data, column):
+    """A column as float64, with missing or unparsable values as NaN."""
+    return pd.to_numeric(data[column], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+
+
+def group_sums(codes, n_groups, values):
+    """Count of the non-missing values and their sum per group (rows with code -1 are ignored)."""
+    present = (codes >= 0) & ~np.isnan(values)
+    counts = np.bincount(codes[present], minlength=n_groups)
+    sums = np.bincount(codes[present], weights=values[present], minlength=n_groups)
+    return counts, sums
+
+
+def group_means(codes, n_groups, values):
+    """Mean of the non-missing values per group; NaN for groups without any."""
+    counts, sums = group_sums(codes, n_groups, values)
+    return np.divide(sums, counts, out=np.full(n_groups, np.nan), where=counts > 0)
+
+
+def group_regression(codes, n_groups, x, y, min_obs=MIN_OBS):
+    """
+    Per group, over the rows where x and y are both present: the count, the slope of y on x
+    with its standard error, the correlation and the R².
+    """
+    present = (codes >= 0) & ~np.isnan(x) & ~np.isnan(y)
+    codes, x, y = codes[present], x[present], y[present]
+    n = np.bincount(codes, minlength=n_groups).astype("float64")
+    mean_x = np.divide(np.bincount(codes, weights=x, minlength=n_groups), n, out=np.zeros(n_groups), where=n > 0)
+    mean_y = np.divide(np.bincount(codes, weights=y, minlength=n_groups), n, out=np.zeros(n_groups), where=n > 0)
+    dx, dy = x - mean_x[codes], y - mean_y[codes]
+    sxx = np.bincount(codes, weights=dx * dx, minlength=n_groups)
+    syy = np.bincount(codes, weights=dy * dy, minlength=n_groups)
+    sxy = np.bincount(codes, weights=dx * dy, minlength=n_groups)
+
+    corr, slope = statistics(sxx, syy, sxy, n, min_obs)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        residual = np.maximum(syy - slope * sxy, 0)
+        se = np.sqrt(residual / (n - 2) / sxx)
+    se[n <= 2] = np.nan
+    return n.astype("int64"), slope, se, corr, corr ** 2
+
+
+def codes_of(values, sort=True):
+    """Integer code of each value (-1 for missing) and the distinct values."""
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object), sort=sort)
+    return codes, np.asarray(uniques, dtype=object)
+
+
+def interval_labels(years):
+    """Label of the interval containing each year, None outside every interval."""
+    labels = np.full(len(years), None, dtype=object)
+    for start, end in intervals:
+        labels[(years >= start) & (years <= end)] = f"{start}-{end}"
+    return labels
+
+
+def build_tables(analysis, bin_width=BIN_WIDTH, min_obs=MIN_OBS):
+    """Every plotting table of the analysis dataset, by name; see the module description."""
+    index = load_country_index()
+
+    # Derived columns, computed once for all the tables
+    country_codes, countries = codes_of(analysis["country"])
+    years = numeric(analysis, "year")
+    dn, gdp = numeric(analysis, "dn"), numeric(analysis, "gdp")
+    population, manufacturing = numeric(analysis, "population"), numeric(analysis, "manufacturingsharegdp")
+    log_dn, log_gdp = term_values(analysis, "log(dn)"), term_values(analysis, "log(gdp)")
+
+    # Attributes of each country: region from the reference table, grade and code from the data
+    region = index.region(pd.Series(countries)).replace("", np.nan).to_numpy(dtype=object)
+    grade = pd.Series(analysis["grade"].astype(object).to_numpy()).groupby(country_codes).first()
+    country_code = pd.Series(analysis["country_code"].astype(object).to_numpy()).groupby(country_codes).first()
+    grade = grade.reindex(range(len(countries))).to_numpy(dtype=object)
+    country_code = country_code.reindex(range(len(countries))).to_numpy(dtype=object)
+
+    year_min = int(np.nanmin(years))
+    year_codes = np.where(np.isnan(years), -1, years - year_min).astype("int64")
+    n_years = int(year_codes.max()) + 1
+    tables = {}
+
+    # Country x interval averages (missing intervals kept as their own group, as dplyr does)
+    interval_codes, interval_names = codes_of(interval_labels(years))
+    interval_names = np.append(interval_names, None)
+    interval_codes = np.where(interval_codes < 0, len(interval_names) - 1, interval_codes)
+    cell = country_codes * len(interval_names) + interval_codes
+    size = len(countries) * len(interval_names)
+    occupied = np.unique(cell[country_codes >= 0])
+    tables["plotting"] = pd.DataFrame({
+        "country": countries[occupied // len(interval_names)],
+        "interval": interval_names[occupied % len(interval_names)],
+        "region": region[occupied // len(interval_names)],
+        "avg_gdp": group_means(cell, size, gdp)[occupied],
+        "avg_population": group_means(cell, size, population)[occupied],
+        "avg_manufacturing_share": group_means(cell, size, manufacturing)[occupied],
+    })
+
+    # Region x year sums
+    region_codes, regions = codes_of(region)
+    row_region = np.where(country_codes >= 0, region_codes[country_codes], -1)
+    cell = np.where((row_region >= 0) & (year_codes >= 0), row_region * n_years + year_codes, -1)
+    size = len(regions) * n_years
+    n_countries, dn_sum = group_sums(cell, size, dn)
+    n_gdp, gdp_sum = group_sums(cell, size, gdp)
+    n_population, population_sum = group_sums(cell, size, population)
+    rows = np.bincount(cell[cell >= 0], minlength=size)
+    occupied = np.nonzero(rows)[0]
+    tables["region_year"] = pd.DataFrame({
+        "region": regions[occupied // n_years],
+        "year": occupied % n_years + year_min,
+        "n_countries": n_countries[occupied],
+        "dn": dn_sum[occupied],
+        "gdp": gdp_sum[occupied],
+        "n_gdp": n_gdp[occupied],
+        "population": population_sum[occupied],
+        "n_population": n_population[occupied],
+    })
+
+    # Grade x year cross-country elasticities
+    grade_codes, grades = codes_of(analysis["grade"])
+    cell = np.where((grade_codes >= 0) & (year_codes >= 0), grade_codes * n_years + year_codes, -1)
+    size = len(grades) * n_years
+    n, slope, se, corr, r2 = group_regression(cell, size, log_gdp, log_dn, min_obs)
+    occupied = np.nonzero(n)[0]
+    tables["grade_year"] = pd.DataFrame({
+        "grade": grades[occupied // n_years],
+        "year": occupied % n_years + year_min,
+        "n": n[occupied],
+        "elasticity": slope[occupied],
+        "se": se[occupied],
+        "corr": corr[occupied],
+        "r2": r2[occupied],
+    })
+
+    # Manufacturing-share bins
+    bin_codes = np.where(np.isnan(manufacturing), -1, np.floor(manufacturing / bin_width)).astype("int64")
+    first_bin = int(bin_codes[bin_codes >= 0].min()) if (bin_codes >= 0).any() else 0
+    bin_codes = np.where(bin_codes >= 0, bin_codes - first_bin, -1)
+    n_bins = int(bin_codes.max()) + 1 if (bin_codes >= 0).any() else 0
+    rows = np.bincount(bin_codes[bin_codes >= 0], minlength=n_bins)
+    country_cell = np.where((bin_codes >= 0) & (country_codes >= 0), bin_codes * len(countries) + country_codes, -1)
+    countries_per_bin = np.bincount(np.unique(country_cell[country_cell >= 0]) // len(countries), minlength=n_bins)
+    occupied = np.nonzero(rows)[0]
+    starts = (occupied + first_bin) * bin_width
+    tables["manufacturing_bins"] = pd.DataFrame({
+        "bin": [f"{start:g}-{start + bin_width:g}" for start in starts],
+        "bin_start": starts,
+        "bin_end": starts + bin_width,
+        "n": rows[occupied],
+        "n_countries": countries_per_bin[occupied],
+        "mean_dn": group_means(bin_codes, n_bins, dn)[occupied],
+        "mean_log_dn": group_means(bin_codes, n_bins, log_dn)[occupied],
+        "mean_gdp": group_means(bin_codes, n_bins, gdp)[occupied],
+        "mean_log_gdp": group_means(bin_codes, n_bins, log_gdp)[occupied],
+    })
+
+    # Country panel summaries: growth is the slope of the log on the year
+    n_countries = len(countries)
+    has_year = (country_codes >= 0) & (year_codes >= 0)
+    first_year = np.full(n_countries, np.iinfo("int64").max)
+    last_year = np.full(n_countries, -1)
+    np.minimum.at(first_year, country_codes[has_year], year_codes[has_year])
+    np.maximum.at(last_year, country_codes[has_year], year_codes[has_year])
+    _, dn_growth, _, _, _ = group_regression(country_codes, n_countries, years, log_dn, min_obs)
+    _, gdp_growth, _, _, _ = group_regression(country_codes, n_countries, years, log_gdp, min_obs)
+    _, elasticity, _, corr, _ = group_regression(country_codes, n_countries, log_gdp, log_dn, min_obs)
+    tables["country_panel"] = pd.DataFrame({
+        "country": countries,
+        "country_code": country_code,
+        "region": region,
+        "grade": grade,
+        "first_year": np.where(last_year >= 0, first_year + year_min, -1),
+        "last_year": np.where(last_year >= 0, last_year + year_min, -1),
+        "n_years": np.bincount(np.unique(country_codes[has_year] * n_years + year_codes[has_year]) // n_years,
+                               minlength=n_countries),
+        "mean_dn": group_means(country_codes, n_countries, dn),
+        "mean_gdp": group_means(country_codes, n_countries, gdp),
+        "mean_population": group_means(country_codes, n_countries, population),
+        "mean_manufacturing_share": group_means(country_codes, n_countries, manufacturing),
+        "dn_growth": np.expm1(dn_growth),
+        "gdp_growth": np.expm1(gdp_growth),
+        "elasticity": elasticity,
+        "corr": corr,
+    })
+    return tables
+
+
+def table_paths(output_dir):
+    """Output file of every table."""
+    return {name: os.path.join(output_dir, f"{name}.parquet") for name in SCHEMAS}
+
+
+def write_tables(tables, output_dir):
+    """Write every table as Parquet with its compact schema."""
+    for name, path in table_paths(output_dir).items():
+        write_parquet_atomic(tables[name], path, schema=SCHEMAS[name])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute the figure-ready aggregates of the analysis dataset.")
+    parser.add_argument("--input", default=analysis_parquet_path, help="Analysis dataset (Parquet).")
+    parser.add_argument("--output-dir", default=output_dir, help="Directory for the plotting tables.")
+    parser.add_argument("--bin-width", type=float, default=BIN_WIDTH,
+                        help="Width of the manufacturing-share bins, in percentage points of GDP.")
+    parser.add_argument("--min-obs", type=int, default=MIN_OBS, help="Fewest observations for an elasticity.")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the analysis dataset did not change.")
+    args = parser.parse_args()
+
+    paths = table_paths(args.output_dir)
+    inputs = [args.input, reference_path]
+    params = {"format": FORMAT, "bin_width": args.bin_width, "min_obs": args.min_obs}
+    manifest = Manifest(os.path.join(args.output_dir, ".manifest.json"), force=args.force)
+    if not manifest.is_stale("plotting", inputs, list(paths.values()), params):
+        print("The plotting tables are up to date.")
+        return
+
+    analysis = pd.read_parquet(args.input)
+    tables = build_tables(analysis, args.bin_width, args.min_obs)
+    write_tables(tables, args.output_dir)
+    manifest.record("plotting", inputs, list(paths.values()), params)
+    for name, path in paths.items():
+        print(f"Saved {len(tables[name])} rows to {path}")
+
+
+if __name__ == "__main__":
+    main()
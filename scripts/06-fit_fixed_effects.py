@@ -0,0 +1,88 @@
+"""
+Script Name: 06-fit_fixed_effects.py
+
+Description:
+    Fits the fixed-effects models of `04-model_data.R` with the Python estimator in
+    `fixed_effects.py`: the country and year effects are absorbed by demeaning instead of
+    dummy columns, and the standard errors are clustered by country.
+    - model1: log(dn) ~ log(gdp), country and year fixed effects
+    - model2: log(dn) ~ log(gdp):grade, year fixed effects
+    - model3: log(dn) ~ log(population), country and year fixed effects
+    - model4: log(dn) ~ manufacturingsharegdp, country and year fixed effects
+    - model_a ... model_f: model1 within each SPI grade, fitted in one batched call
+
+    All the fits are saved in one JSON artifact (coefficients, covariance matrices, N, R² and
+    the estimated country and year effects with the country means of the regressors, used by
+    `predict_gdp.py`), tens of kilobytes in place of the megabytes of each `.rds` model frame.
+
+Author:
+    Shamayla Durrin Islam
+    shamayla.islam@mail.utoronto.ca
+
+Date:
+    Created: October 17, 2026
+
+Dependencies:
+    - Python 3.8 or higher
+    - numpy
+    - pandas >= 1.3
+    - pyarrow
+
+Inputs:
+    - data/02-analysis_data/04-analysis/analysis.parquet (written by 02-data_cleaning.py)
+
+Outputs:
+    - models/fixed_effects.json
+
+Usage:
+    Run from the repository root:
+        python scripts/06-fit_fixed_effects.py
+    Without clustering (classical standard errors, as `lm`):
+        python scripts/06-fit_fixed_effects.py --cluster none
+"""
+
+import argparse
+
+import pandas as pd
+
+from fixed_effects import fit, fit_by, save_fits
+
+analysis_parquet_path = "data/02-analysis_data/04-analysis/analysis.parquet"
+output_path = "models/fixed_effects.json"
+
+# Models fitted on the whole analysis dataset
+models = {
+    "model1": "log(dn) ~ log(gdp) | country + year",
+    "model2": "log(dn) ~ log(gdp):grade | year",
+    "model3": "log(dn) ~ log(population) | country + year",
+    "model4": "log(dn) ~ manufacturingsharegdp | country + year",
+}
+
+# Model fitted separately within each grade (saved as model_a, model_b, ...)
+grade_model = "log(dn) ~ log(gdp) | country + year"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit the fixed-effects NTL models.")
+    parser.add_argument("--input", default=analysis_parquet_path, help="Analysis dataset (Parquet).")
+    parser.add_argument("--output", default=output_path, help="JSON artifact to write.")
+    parser.add_argument("--cluster", default="country",
+                        help="Column to cluster the standard errors by ('none' for classical standard errors).")
+    args = parser.parse_args()
+    cluster = None if args.cluster.lower() == "none" else args.cluster
+
+    analysis = pd.read_parquet(args.input)
+
+    fits = {name: fit(analysis, formula, cluster=cluster, effects=True) for name, formula in models.items()}
+    by_grade = fit_by(analysis, grade_model, by="grade", cluster=cluster, effects=True)
+    fits.update({f"model_{str(grade).lower()}": grade_fit for grade, grade_fit in by_grade.items()})
+
+    for name, model in fits.items():
+        print(f"{name}: {model.formula} (N = {model.nobs}, R² = {model.r2:.3f})")
+        print(model.tidy().to_string(index=False))
+    save_fits(fits, args.output)
+    print(f"Saved {len(fits)} models to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
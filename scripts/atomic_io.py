@@ -0,0 +1,79 @@
+"""
+Script Name: atomic_io.py
+
+Description:
+    Helpers for writing pipeline outputs atomically. Each file is written to a temporary file
+    in the destination directory and renamed into place, so an interrupted run never leaves a
+    partially written output behind that a later run would mistake for a finished one.
+
+Author:
+    Shamayla Durrin Islam
+    shamayla.islam@mail.utoronto.ca
+
+Date:
+    Created: October 17, 2026
+
+Dependencies:
+    - Python 3.8 or higher
+    - pandas >= 1.3
+    - pyarrow (for Parquet outputs)
+
+Usage:
+    from atomic_io import write_csv_atomic, write_parquet_atomic
+
+    write_csv_atomic(df, "data/02-analysis_data/02-concatenated/concatenated.csv")
+"""
+
+import os
+import secrets
+import stat
+
+
+def temp_path(output_path):
+    """
+    Create an empty temporary file next to `output_path` and return its path. Unlike
+    tempfile.mkstemp (always 0600), it is created with the mode a plain open() would give it.
+    """
+    output_dir = os.path.dirname(output_path) or "."
+    os.makedirs(output_dir, exist_ok=True)
+
+    suffix = os.path.splitext(output_path)[1]
+    while True:
+        tmp_path = os.path.join(output_dir, f".tmp-{secrets.token_hex(8)}{suffix}")
+        try:
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        except FileExistsError:
+            continue
+        os.close(fd)
+        return tmp_path
+
+
+def replace(tmp_path, output_path):
+    """Rename `tmp_path` onto `output_path`, keeping the mode of the file it replaces."""
+    try:
+        os.chmod(tmp_path, stat.S_IMODE(os.stat(output_path).st_mode))
+    except FileNotFoundError:
+        pass
+    os.replace(tmp_path, output_path)
+
+
+def atomic_path(output_path, write):
+    """Call `write(tmp_path)` on a temporary file next to `output_path`, then rename it into place."""
+    tmp_path = temp_path(output_path)
+    try:
+        write(tmp_path)
+        replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_csv_atomic(df, output_path):
+    """Write a DataFrame to CSV (without the index) atomically."""
+    atomic_path(output_path, lambda tmp_path: df.to_csv(tmp_path, index=False))
+
+
+def write_parquet_atomic(df, output_path, schema=None):
+    """Write a DataFrame to Parquet (without the index) atomically, optionally with an explicit pyarrow schema."""
+    atomic_path(output_path, lambda tmp_path: df.to_parquet(tmp_path, index=False, schema=schema))
@@ -0,0 +1,329 @@
+"""
+Script Name: benchmark.py
+
+Description:
+    Benchmarks the pipeline stages on synthetic data at several raster resolutions, so that
+    performance regressions between versions can be caught. For every resolution a workspace
+    of synthetic inputs is generated with `00-simulate_data.py` (GeoTIFF, matching country
+    shapefile, yearly aggregates, legacy pixel table, World Bank tables and SPI), and each
+    stage is run on it with the pipeline's own functions:
+    - extract: streamed country totals of the GeoTIFF (`ntl_extraction.py`, as 01-data_extraction.py)
+    - aggregate: the legacy pixel-level table summed by country (02-data_cleaning.py)
+    - concat: the yearly aggregates cleaned and concatenated (02-data_cleaning.py)
+    - merge: the World Bank and SPI tables ingested and merged into the analysis dataset (02-data_cleaning.py)
+    - fit: the country and year fixed-effects model (`fixed_effects.py`)
+
+    Each run of a stage happens in a fresh interpreter, with the modules imported before the
+    clock starts, and records the wall and CPU time, the throughput, the peak resident memory
+    of the process and its growth during the stage (and, with `--trace-memory`, the peak of the
+    memory allocated through Python, at the cost of slower runs). The legacy pixel table has
+    one row per lit pixel of the raster, up to `--max-pixel-rows`.
+
+    The results are written as one JSON file with the environment (versions, CPU count, git
+    commit) and one record per (stage, size). With `--compare` the run is checked against an
+    earlier results file and the script exits with an error when a stage got slower than the
+    tolerance allows.
+
+Author:
+    Shamayla Durrin Islam
+    shamayla.islam@mail.utoronto.ca
+
+Date:
+    Created: October 17, 2026
+
+Dependencies:
+    - Python 3.8 or higher
+    - numpy
+    - pandas >= 1.3
+    - geopandas >= 0.9
+    - rasterio >= 1.2
+    - pyarrow
+
+Usage:
+    From the repository root (10 and 2 arc-minute global rasters by default):
+        python scripts/benchmark.py
+    Full-global 30 arc-second raster, best of 3 runs, compared with the previous version:
+        python scripts/benchmark.py --resolutions 30 --repeat 3 --compare others/benchmarks/previous.json
+"""
+
+import argparse
+import contextlib
+import importlib
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from atomic_io import atomic_path
+from instrumentation import peak_rss_mb
+
+simulate = importlib.import_module("00-simulate_data")
+
+output_path = "others/benchmarks/results.json"
+
+STAGES = ("extract", "aggregate", "concat", "merge", "fit")
+DEFAULT_RESOLUTIONS = (600, 120)
+
+# Window side of the streamed extraction
+EXTRACT_TILE_SIZE = 2048
+
+# Default cap on the rows of the legacy pixel table
+MAX_PIXEL_ROWS = 5_000_000
+
+# Model fitted by the fit stage
+FIT_FORMULA = "log(dn) ~ log(gdp) | country + year"
+
+# Version of the results file layout
+RESULTS_VERSION = 1
+
+
+def stage_extract(size):
+    """Country totals of the first GeoTIFF, streamed in tiles with the labels rasterized per window."""
+    from ntl_extraction import discover_tiffs, extract_country_totals, load_countries
+
+    countries = load_countries(simulate.shapefile_dir)
+    _, tiff_path = min(discover_tiffs(simulate.tiff_dir).items())
+    extract_country_totals(tiff_path, countries, stream=True, tile_size=EXTRACT_TILE_SIZE)
+    return size["pixels"], "pixels"
+
+
+def stage_aggregate(size):
+    """The legacy pixel-level table summed by country."""
+    cleaning = importlib.import_module("02-data_cleaning")
+    from pipeline_manifest import Manifest
+
+    cleaning.aggregate_legacy_files(Manifest(cleaning.manifest_path, force=True))
+    return size["pixel_rows"], "rows"
+
+
+def stage_concat(size):
+    """The yearly aggregates cleaned and concatenated."""
+    cleaning = importlib.import_module("02-data_cleaning")
+    from pipeline_manifest import Manifest
+
+    concatenated = cleaning.concatenate(Manifest(cleaning.manifest_path, force=True))
+    return len(concatenated), "rows"
+
+
+def stage_merge(size):
+    """The World Bank tables and SPI ingested and merged with the NTL data."""
+    cleaning = importlib.import_module("02-data_cleaning")
+    from pipeline_manifest import Manifest
+
+    manifest = Manifest(cleaning.manifest_path, force=True)
+    concatenated = pd.read_csv(cleaning.concatenated_path, keep_default_na=False, na_values=[""])
+    for name in cleaning.world_bank_indicators:
+        cleaning.ingest_world_bank(manifest, name)
+    cleaning.grade_spi(manifest)
+    cleaning.merge(manifest, concatenated)
+    return len(concatenated), "rows"
+
+
+def stage_fit(size):
+    """The fixed-effects model on the analysis dataset."""
+    cleaning = importlib.import_module("02-data_cleaning")
+    from fixed_effects import fit
+
+    model = fit(pd.read_parquet(cleaning.analysis_parquet_path), FIT_FORMULA, cluster="country")
+    return model.nobs, "rows"
+
+
+# Stages whose outputs a stage reads: they are run first (unmeasured) when not benchmarked
+PREREQUISITES = {"merge": ("concat",), "fit": ("concat", "merge")}
+
+STAGE_FUNCTIONS = {
+    "extract": stage_extract,
+    "aggregate": stage_aggregate,
+    "concat": stage_concat,
+    "merge": stage_merge,
+    "fit": stage_fit,
+}
+
+
+def measure(stage, workspace, size, trace_memory=False):
+    """Run one stage in `workspace` (in this process) and measure it."""
+    os.chdir(workspace)
+    # Import everything the stages use before the clock starts
+    importlib.import_module("02-data_cleaning")
+    importlib.import_module("ntl_extraction")
+    importlib.import_module("fixed_effects")
+
+    baseline_rss = peak_rss_mb()
+    if trace_memory:
+        tracemalloc.start()
+    wall, cpu = time.perf_counter(), time.process_time()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        items, unit = STAGE_FUNCTIONS[stage](size)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    traced = None
+    if trace_memory:
+        traced = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        tracemalloc.stop()
+
+    peak_rss = peak_rss_mb()  # None where getrusage is unavailable
+    return {
+        "wall_s": wall,
+        "cpu_s": cpu,
+        "items": int(items),
+        "unit": unit,
+        "throughput": items / wall if wall > 0 else None,
+        "peak_rss_mb": peak_rss,
+        "stage_rss_mb": max(peak_rss - baseline_rss, 0.0) if peak_rss is not None else None,
+        "peak_traced_mb": traced,
+    }
+
+
+def measure_isolated(stage, workspace, size, trace_memory=False):
+    """Run one stage in a fresh interpreter, so its imports, caches and peak memory start clean."""
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(measure, stage, workspace, size, trace_memory).result()
+
+
+def environment():
+    """Versions, platform and git commit the benchmark ran with."""
+    import rasterio
+
+    try:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, None
+
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "rasterio": rasterio.__version__,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "git_commit": commit,
+        "git_dirty": dirty,
+    }
+
+
+def size_key(record):
+    """The stage and data size of a result record, to match runs of different versions."""
+    return (record["stage"], record["resolution"], record["countries"], record["years"], record["pixel_rows"])
+
+
+def compare(results, previous, tolerance):
+    """Print the change in wall time of every stage and size; returns the records that regressed."""
+    earlier = {size_key(record): record for record in previous["results"]}
+    regressions = []
+    for record in results:
+        before = earlier.get(size_key(record))
+        if before is None or not before["wall_s"]:
+            continue
+        ratio = record["wall_s"] / before["wall_s"]
+        flag = "  REGRESSION" if ratio > 1 + tolerance else ""
+        print(f"{record['stage']:>9} @ {record['resolution']:g}\": {before['wall_s']:.3f}s -> "
+              f"{record['wall_s']:.3f}s ({ratio:.2f}x){flag}")
+        if flag:
+            regressions.append(record)
+    return regressions
+
+
+def run_benchmark(resolutions, stages, seed, n_countries, n_years, max_pixel_rows, repeat=1, trace_memory=False,
+                  workdir=None, keep=False):
+    """Synthesize a workspace per resolution and measure every stage on it; returns the result records."""
+    results = []
+    for resolution in resolutions:
+        height, width = simulate.raster_shape(resolution)
+        pixel_rows = int(min(height * width * simulate.LIT_SHARE, max_pixel_rows))
+        workspace = tempfile.mkdtemp(prefix=f"ntl-benchmark-{resolution:g}-", dir=workdir)
+        try:
+            print(f"Synthesizing {height} x {width} pixels ({resolution:g} arc-seconds), {n_countries} countries, "
+                  f"{n_years} years and {pixel_rows} pixel rows in {workspace}...")
+            started = time.perf_counter()
+            size = simulate.simulate_workspace(workspace, seed, resolution, n_countries,
+                                               range(1992, 1992 + n_years), pixel_rows=pixel_rows)
+            print(f"Synthesized in {time.perf_counter() - started:.1f}s")
+
+            needed = {prerequisite for stage in stages for prerequisite in PREREQUISITES.get(stage, ())}
+            for stage in STAGES:
+                if stage not in stages:
+                    if stage in needed:
+                        measure_isolated(stage, workspace, size)
+                    continue
+                runs = [measure_isolated(stage, workspace, size, trace_memory) for _ in range(repeat)]
+                best = min(runs, key=lambda run: run["wall_s"])
+                peaks = [run["peak_rss_mb"] for run in runs if run["peak_rss_mb"] is not None]
+                record = {"stage": stage, **size, **best, "wall_s_runs": [run["wall_s"] for run in runs],
+                          "peak_rss_mb": max(peaks) if peaks else None}
+                results.append(record)
+                peak = f"{record['peak_rss_mb']:.0f} MB" if peaks else "n/a"
+                print(f"{stage:>9}: {best['wall_s']:.3f}s wall, {best['cpu_s']:.3f}s CPU, "
+                      f"{best['throughput']:,.0f} {best['unit']}/s, peak RSS {peak}")
+        finally:
+            if keep:
+                print(f"Kept {workspace}")
+            else:
+                shutil.rmtree(workspace, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic data.")
+    parser.add_argument("--resolutions", type=float, nargs="+", default=list(DEFAULT_RESOLUTIONS),
+                        help="Raster resolutions in arc-seconds (30 = the full-global VIIRS grid).")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES),
+                        help="Stages to benchmark (the stages whose outputs they read are run first, unmeasured).")
+    parser.add_argument("--countries", type=int, default=200, help="Number of synthetic countries.")
+    parser.add_argument("--years", type=int, default=30, help="Number of years of country aggregates.")
+    parser.add_argument("--max-pixel-rows", type=int, default=MAX_PIXEL_ROWS,
+                        help="Cap on the rows of the legacy pixel table (one per lit pixel).")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs of each stage; the fastest is reported.")
+    parser.add_argument("--seed", type=int, default=853, help="Seed of the synthetic data.")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Also record the peak memory allocated through Python (slows the stages down).")
+    parser.add_argument("--workdir", help="Directory for the synthetic workspaces (default: the system temp directory).")
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic workspaces.")
+    parser.add_argument("--output", default=output_path, help="JSON file to write the results to.")
+    parser.add_argument("--compare", help="Earlier results file to compare the wall times with.")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Slowdown (as a fraction) above which a stage counts as a regression.")
+    args = parser.parse_args()
+
+    started = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    results = run_benchmark(args.resolutions, args.stages, args.seed, args.countries, args.years, args.max_pixel_rows,
+                            args.repeat, args.trace_memory, args.workdir, args.keep)
+
+    report = {
+        "version": RESULTS_VERSION,
+        "created": started,
+        "seed": args.seed,
+        "environment": environment(),
+        "results": results,
+    }
+
+    def write(tmp_path):
+        with open(tmp_path, "w") as handle:
+            json.dump(report, handle, indent=2)
+
+    atomic_path(args.output, write)
+    print(f"Saved {len(results)} results to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as handle:
+            regressions = compare(results, json.load(handle), args.tolerance)
+        if regressions:
+            sys.exit(f"{len(regressions)} stage(s) slower than the {args.tolerance:.0%} tolerance.")
+
+
+if __name__ == "__main__":
+    main()
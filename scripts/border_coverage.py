@@ -0,0 +1,168 @@
+"""
+Script Name: border_coverage.py
+
+Description:
+    Fractional assignment of border pixels for `01-data_extraction.py --assignment fractional`.
+    By default every pixel goes entirely to the country containing its centre. A pixel that
+    straddles a border (or a coastline) is then attributed wholly to one side. In fractional
+    mode the DN of such a pixel is split between the countries in proportion to the share of
+    the pixel each one covers:
+    - Boundary pixels are found by rasterizing the polygon edges with `all_touched=True`.
+      Every other pixel lies entirely inside one country (or outside all of them), so it
+      keeps the fast centre-label path.
+    - For the boundary pixels only, the pixel squares are intersected with the polygons found
+      through an STRtree, after clipping the polygons to the tile being processed so each
+      intersection only sees nearby vertices.
+    - The fractions of a pixel add up to at most 1 (they are normalized where overlapping
+      polygons would exceed it), so each pixel's DN is split exactly once. The share of a
+      coastal pixel that falls in the sea is dropped, like pixels outside every polygon.
+
+    Lit pixel counts become fractional as well. With area weighting, the area of boundary
+    pixels is split with the same fractions.
+
+Author:
+    Shamayla Durrin Islam
+    shamayla.islam@mail.utoronto.ca
+
+Date:
+    Created: October 17, 2026
+
+Dependencies:
+    - Python 3.8 or higher
+    - numpy
+    - rasterio >= 1.2
+    - shapely >= 2.0
+
+Usage:
+    from border_coverage import BorderCoverage
+
+    coverage = BorderCoverage(countries, names)
+    totals = extract_country_totals(tif_path, countries, labels=(labels, names), coverage=coverage)
+"""
+
+import numpy as np
+import shapely
+from rasterio.features import rasterize
+from rasterio.transform import array_bounds
+from rasterio.windows import Window, transform as window_transform
+from shapely import STRtree
+
+from ntl_extraction import lit_mask
+
+# Side of the tiles the boundary pixels are processed in; the polygons are clipped to each tile
+TILE_SIZE = 32
+
+
+class BorderCoverage:
+    """Per-pixel coverage fractions of the country polygons, computed for boundary pixels only."""
+
+    def __init__(self, countries, names, name_field="COUNTRY"):
+        name_to_id = {name: i for i, name in enumerate(names) if i}
+        keep = [geometry is not None and name in name_to_id
+                for geometry, name in zip(countries.geometry, countries[name_field])]
+
+        geometries = np.asarray(countries.geometry.values[keep], dtype=object)
+        self.edges = shapely.boundary(geometries)
+        self.geometries = shapely.make_valid(geometries)
+        self.geometry_labels = np.array([name_to_id[name] for name in countries[name_field][keep]], dtype="int64")
+        self.tree = STRtree(self.geometries)
+
+    def tile_fractions(self, transform, bounds, rows, cols):
+        """
+        Coverage of boundary pixels (`rows`, `cols` on the grid of `transform`) lying within the
+        tile `bounds` by the polygons: returns the pixel index, label and covered fraction of
+        every (pixel, polygon) overlap.
+        """
+        nearby = self.tree.query(shapely.box(*bounds), predicate="intersects")
+        if len(nearby) == 0:
+            return np.empty(0, dtype="int64"), np.empty(0, dtype="int64"), np.empty(0)
+        clipped = shapely.clip_by_rect(self.geometries[nearby], *bounds)
+
+        # Pixel squares from the affine transform
+        x0 = transform.c + transform.a * cols
+        y0 = transform.f + transform.e * rows
+        squares = shapely.box(np.minimum(x0, x0 + transform.a), np.minimum(y0, y0 + transform.e),
+                              np.maximum(x0, x0 + transform.a), np.maximum(y0, y0 + transform.e))
+
+        pixel, geometry = STRtree(clipped).query(squares, predicate="intersects")
+        fractions = shapely.area(shapely.intersection(squares[pixel], clipped[geometry]))
+        fractions /= abs(transform.a * transform.e)
+        return pixel, self.geometry_labels[nearby[geometry]], fractions
+
+    def fractions(self, transform, rows, cols):
+        """
+        Coverage of the boundary pixels `rows`, `cols` by the polygons, processed tile by tile:
+        returns the pixel index, label and covered fraction of every (pixel, polygon) overlap.
+        """
+        tiles = (rows // TILE_SIZE).astype("int64") * (int(cols.max(initial=0)) // TILE_SIZE + 1) + cols // TILE_SIZE
+        order = np.argsort(tiles, kind="stable")
+        starts = np.flatnonzero(np.diff(tiles[order], prepend=-1))
+        ends = np.append(starts[1:], len(order))
+
+        pixels, labels, fractions = [], [], []
+        for start, end in zip(starts, ends):
+            members = order[start:end]
+            row_off = rows[members[0]] // TILE_SIZE * TILE_SIZE
+            col_off = cols[members[0]] // TILE_SIZE * TILE_SIZE
+            bounds = array_bounds(TILE_SIZE, TILE_SIZE, window_transform(Window(col_off, row_off, TILE_SIZE, TILE_SIZE),
+                                                                         transform))
+            pixel, label, fraction = self.tile_fractions(transform, bounds, rows[members], cols[members])
+            pixels.append(members[pixel])
+            labels.append(label)
+            fractions.append(fraction)
+
+        if not pixels:
+            return np.empty(0, dtype="int64"), np.empty(0, dtype="int64"), np.empty(0)
+        pixel, label, fraction = np.concatenate(pixels), np.concatenate(labels), np.concatenate(fractions)
+
+        # A pixel is never assigned more than once in total
+        total = np.bincount(pixel, weights=fraction, minlength=len(rows))
+        fraction /= np.maximum(total, 1)[pixel]
+        return pixel, label, fraction
+
+    def boundary_mask(self, transform, shape):
+        """Pixels touched by a polygon edge."""
+        bounds = array_bounds(shape[0], shape[1], transform)
+        nearby = self.tree.query(shapely.box(*bounds), predicate="intersects")
+        if len(nearby) == 0:
+            return np.zeros(shape, dtype=bool)
+        return rasterize(
+            ((edge, 1) for edge in self.edges[nearby]),
+            out_shape=shape, transform=transform, fill=0, dtype="uint8", all_touched=True,
+        ).astype(bool)
+
+    def reduce(self, band, labels, n_labels, transform, row_area=None):
+        """
+        Per-label DN sums and (fractional) lit pixel counts of one window, plus the areas and
+        area-weighted DN sums when the per-row pixel areas are given. Interior pixels are
+        reduced by their centre label, boundary pixels by their coverage fractions.
+        """
+        labels = np.asarray(labels)
+        lit = lit_mask(band)
+        values = np.where(lit, band, 0).astype("float64")
+        border = self.boundary_mask(transform, band.shape)
+
+        # Interior pixels: the centre label is exact
+        interior = lit & ~border
+        sums = np.bincount(labels[interior], weights=values[interior], minlength=n_labels)
+        counts = np.bincount(labels[interior], minlength=n_labels).astype("float64")
+
+        # Boundary pixels (only the lit ones, unless their area is needed too)
+        rows, cols = np.nonzero(border if row_area is not None else border & lit)
+        pixel, label, fraction = self.fractions(transform, rows, cols)
+        pixel_values = values[rows, cols][pixel]
+        sums += np.bincount(label, weights=fraction * pixel_values, minlength=n_labels)
+        counts += np.bincount(label, weights=fraction * lit[rows, cols][pixel], minlength=n_labels)
+
+        if row_area is None:
+            return sums, counts, None, None
+
+        pixel_area = np.broadcast_to(row_area[:, None], band.shape)
+        inside = ~border
+        areas = np.bincount(labels[inside], weights=pixel_area[inside], minlength=n_labels)
+        dn_areas = np.bincount(labels[interior], weights=(values * pixel_area)[interior], minlength=n_labels)
+
+        boundary_area = row_area[rows][pixel]
+        areas += np.bincount(label, weights=fraction * boundary_area, minlength=n_labels)
+        dn_areas += np.bincount(label, weights=fraction * pixel_values * boundary_area, minlength=n_labels)
+        return sums, counts, areas, dn_areas
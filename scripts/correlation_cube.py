@@ -0,0 +1,274 @@
+"""
+Script Name: correlation_cube.py
+
+Description:
+    Builds a cube of rolling and expanding-window NTL-economy correlations and elasticities
+    from the analysis dataset, for every country, SDG region, SPI grade and the world, in one
+    pass:
+    1. The moments of (log DN, indicator) (count, sums, sums of squares and cross-products)
+       are accumulated per (country, year) on a dense country x year grid.
+    2. Their cumulative sums over the years give the moments of any window as the difference
+       of two cumulative rows, so every window ending in every year costs O(1), whatever its
+       width.
+    3. The window moments of the countries are pooled into regions, grades and the world with
+       the parallel (Chan) formulas, which give both the pooled statistics (countries and years
+       mixed) and the within-country ones (deviations from each country's window mean, i.e.
+       country fixed effects).
+
+    Each row of the cube holds, for one (level, group, term, window, end year): the number of
+    observations and countries, the correlation and the elasticity (OLS slope of log DN on the
+    indicator), pooled and within-country. For a single country both are the same time-series
+    statistics. The cube is written as one Parquet file with dictionary-encoded keys, sorted
+    by level, term and window, so readers can select slices with filters.
+
+Author:
+    Shamayla Durrin Islam
+    shamayla.islam@mail.utoronto.ca
+
+Date:
+    Created: October 17, 2026
+
+Dependencies:
+    - Python 3.8 or higher
+    - numpy
+    - pandas >= 1.3
+    - pyarrow
+
+Usage:
+    From the repository root (rolling 5- and 10-year windows plus expanding windows):
+        python scripts/correlation_cube.py
+        python scripts/correlation_cube.py --windows 3 7 --min-obs 5
+
+    from correlation_cube import read_cube
+    grades = read_cube(level="grade", term="log(gdp)", window="rolling10")
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from atomic_io import write_parquet_atomic
+from country_names import load_country_index
+from fixed_effects import term_values
+
+analysis_parquet_path = "data/02-analysis_data/04-analysis/analysis.parquet"
+cube_path = "data/02-analysis_data/04-analysis/correlation_cube.parquet"
+
+OUTCOME = "log(dn)"
+DEFAULT_TERMS = ("log(gdp)", "log(population)", "manufacturingsharegdp")
+DEFAULT_WINDOWS = (5, 10)
+
+# Fewest observations for a window statistic
+MIN_OBS = 3
+
+# Moments accumulated per (country, year): count, sum x, sum y, sum xx, sum yy, sum xy
+N, SX, SY, SXX, SYY, SXY = range(6)
+
+CUBE_SCHEMA = pa.schema([
+    ("level", pa.dictionary(pa.int8(), pa.string())),
+    ("group", pa.dictionary(pa.int16(), pa.string())),
+    ("term", pa.dictionary(pa.int8(), pa.string())),
+    ("window", pa.dictionary(pa.int8(), pa.string())),
+    ("year_start", pa.int16()),
+    ("year_end", pa.int16()),
+    ("n", pa.int32()),
+    ("n_countries", pa.int16()),
+    ("corr", pa.float64()),
+    ("elasticity", pa.float64()),
+    ("corr_within", pa.float64()),
+    ("elasticity_within", pa.float64()),
+])
+
+
+def grid_moments(country, year, x, y, n_countries, n_years):
+    """
+    Moments of (x, y) per (country, year) cell, shape (countries, years, 6). The values are
+    shifted by each country's mean first, which keeps the sums of squares well conditioned;
+    the shifts are returned to restore the means.
+    """
+    shift_x = np.bincount(country, weights=x, minlength=n_countries)
+    shift_y = np.bincount(country, weights=y, minlength=n_countries)
+    counts = np.bincount(country, minlength=n_countries)
+    shift_x = np.divide(shift_x, counts, out=np.zeros(n_countries), where=counts > 0)
+    shift_y = np.divide(shift_y, counts, out=np.zeros(n_countries), where=counts > 0)
+    dx, dy = x - shift_x[country], y - shift_y[country]
+
+    cell = country * n_years + year
+    size = n_countries * n_years
+    moments = np.stack([
+        np.bincount(cell, minlength=size).astype("float64"),
+        np.bincount(cell, weights=dx, minlength=size),
+        np.bincount(cell, weights=dy, minlength=size),
+        np.bincount(cell, weights=dx * dx, minlength=size),
+        np.bincount(cell, weights=dy * dy, minlength=size),
+        np.bincount(cell, weights=dx * dy, minlength=size),
+    ], axis=-1)
+    return moments.reshape(n_countries, n_years, 6), shift_x, shift_y
+
+
+def window_moments(cumulative, width):
+    """Moments of the windows ending in each year: rolling over `width` years, or expanding when None."""
+    n_years = cumulative.shape[1] - 1
+    end = np.arange(1, n_years + 1)
+    start = np.zeros(n_years, dtype="int64") if width is None else np.maximum(end - width, 0)
+    return cumulative[:, end] - cumulative[:, start]
+
+
+def centered(moments, shift_x, shift_y):
+    """Count, means and centered (co)variance sums of window moments (countries x years)."""
+    n = moments[..., N]
+    mean_dx = np.divide(moments[..., SX], n, out=np.zeros_like(n), where=n > 0)
+    mean_dy = np.divide(moments[..., SY], n, out=np.zeros_like(n), where=n > 0)
+    sxx = moments[..., SXX] - n * mean_dx ** 2
+    syy = moments[..., SYY] - n * mean_dy ** 2
+    sxy = moments[..., SXY] - n * mean_dx * mean_dy
+    return n, mean_dx + shift_x[:, None], mean_dy + shift_y[:, None], sxx, syy, sxy
+
+
+def statistics(sxx, syy, sxy, n, min_obs):
+    """Correlation and slope of y on x from centered sums; NaN for short or degenerate windows."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        corr = sxy / np.sqrt(sxx * syy)
+        slope = sxy / sxx
+    short = (n < min_obs) | (sxx <= 0)
+    corr[short | (syy <= 0)] = np.nan
+    slope[short] = np.nan
+    return corr, slope
+
+
+def pool(country_stats, membership, n_groups):
+    """
+    Pool the per-country window statistics into groups (`membership`: group code of each
+    country, -1 for none). Returns the count, number of countries and the pooled and
+    within-country centered sums per (group, year).
+    """
+    n, mean_x, mean_y, sxx, syy, sxy = country_stats
+    keep = membership >= 0
+    n, mean_x, mean_y = n[keep], mean_x[keep], mean_y[keep]
+    sxx, syy, sxy = sxx[keep], syy[keep], sxy[keep]
+    groups = membership[keep]
+    n_years = n.shape[1]
+
+    def group_sum(values):
+        result = np.zeros((n_groups, n_years))
+        np.add.at(result, groups, values)
+        return result
+
+    total = group_sum(n)
+    countries = group_sum((n > 0).astype("float64"))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        group_x = group_sum(n * mean_x) / total
+        group_y = group_sum(n * mean_y) / total
+    within = (group_sum(sxx), group_sum(syy), group_sum(sxy))
+
+    # Between-country part of the pooled sums (countries without observations add nothing)
+    gap_x = np.where(n > 0, mean_x - group_x[groups], 0)
+    gap_y = np.where(n > 0, mean_y - group_y[groups], 0)
+    pooled = (within[0] + group_sum(n * gap_x ** 2), within[1] + group_sum(n * gap_y ** 2),
+              within[2] + group_sum(n * gap_x * gap_y))
+    return total, countries, pooled, within
+
+
+def level_frame(level, names, term, window, width, years, total, countries, pooled, within, min_obs):
+    """Long cube rows of one level, term and window, dropping empty windows."""
+    corr, slope = statistics(*pooled, total, min_obs)
+    corr_within, slope_within = statistics(*within, total, min_obs)
+    group, year = np.nonzero(total > 0)
+    year_end = years[year]
+    year_start = years[0] if width is None else np.maximum(year_end - width + 1, years[0])
+    return pd.DataFrame({
+        "level": level,
+        "group": np.asarray(names, dtype=object)[group],
+        "term": term,
+        "window": window,
+        "year_start": np.broadcast_to(year_start, year_end.shape),
+        "year_end": year_end,
+        "n": total[group, year].astype("int64"),
+        "n_countries": countries[group, year].astype("int64"),
+        "corr": corr[group, year],
+        "elasticity": slope[group, year],
+        "corr_within": corr_within[group, year],
+        "elasticity_within": slope_within[group, year],
+    })
+
+
+def build_cube(analysis, terms=DEFAULT_TERMS, windows=DEFAULT_WINDOWS, min_obs=MIN_OBS):
+    """Correlation cube of `analysis` for every level, term and window; see the module description."""
+    years_all = pd.to_numeric(analysis["year"], errors="coerce").to_numpy()
+    first, last = int(np.nanmin(years_all)), int(np.nanmax(years_all))
+    years = np.arange(first, last + 1)
+    country_codes, countries = pd.factorize(analysis["country"].astype(object), sort=True)
+    countries = np.asarray(countries, dtype=object)
+
+    # Group of each country at every level (grade and region are attributes of the country)
+    per_country = pd.DataFrame({"country": countries})
+    grades = analysis.assign(_code=country_codes).dropna(subset=["grade"]).groupby("_code")["grade"].first()
+    per_country["grade"] = grades.reindex(range(len(countries))).to_numpy(dtype=object)
+    per_country["region"] = load_country_index().region(per_country["country"]).replace("", np.nan)
+    levels = {"country": (np.arange(len(countries)), countries)}
+    for level in ("region", "grade"):
+        codes, names = pd.factorize(per_country[level], sort=True)
+        levels[level] = (codes, np.asarray(names, dtype=object))
+    levels["world"] = (np.zeros(len(countries), dtype="int64"), np.array(["World"], dtype=object))
+
+    y_all = term_values(analysis, OUTCOME)
+    frames = []
+    for term in terms:
+        x_all = term_values(analysis, term)
+        present = ~np.isnan(x_all) & ~np.isnan(y_all) & (country_codes >= 0) & ~np.isnan(years_all)
+        moments, shift_x, shift_y = grid_moments(
+            country_codes[present], (years_all[present] - first).astype("int64"), x_all[present], y_all[present],
+            len(countries), len(years),
+        )
+        cumulative = np.concatenate([np.zeros((len(countries), 1, 6)), np.cumsum(moments, axis=1)], axis=1)
+
+        for width in list(windows) + [None]:
+            window = "expanding" if width is None else f"rolling{width}"
+            country_stats = centered(window_moments(cumulative, width), shift_x, shift_y)
+            for level, (membership, names) in levels.items():
+                if level == "country":
+                    n, _, _, sxx, syy, sxy = country_stats
+                    total, counts, pooled = n, (n > 0).astype("float64"), (sxx, syy, sxy)
+                    within = pooled
+                else:
+                    total, counts, pooled, within = pool(country_stats, membership, len(names))
+                frames.append(level_frame(level, names, term, window, width, years, total, counts, pooled, within,
+                                          min_obs))
+
+    cube = pd.concat(frames, ignore_index=True)
+    return cube.sort_values(["level", "term", "window", "group", "year_end"], ignore_index=True)
+
+
+def write_cube(cube, path=cube_path):
+    """Write the cube as one Parquet file with dictionary-encoded keys."""
+    write_parquet_atomic(cube, path, schema=CUBE_SCHEMA)
+
+
+def read_cube(path=cube_path, level=None, group=None, term=None, window=None, columns=None):
+    """Read a slice of the cube; the filters are pushed down to the Parquet reader."""
+    filters = [(column, "==", value) for column, value in
+               (("level", level), ("group", group), ("term", term), ("window", window)) if value is not None]
+    table = pq.read_table(path, columns=columns, filters=filters or None)
+    return table.to_pandas()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the rolling/expanding-window NTL correlation cube.")
+    parser.add_argument("--input", default=analysis_parquet_path, help="Analysis dataset (Parquet).")
+    parser.add_argument("--output", default=cube_path, help="Cube to write (Parquet).")
+    parser.add_argument("--terms", nargs="+", default=list(DEFAULT_TERMS), help="Indicator terms to correlate with log(dn).")
+    parser.add_argument("--windows", nargs="+", type=int, default=list(DEFAULT_WINDOWS),
+                        help="Rolling window widths in years (an expanding window is always included).")
+    parser.add_argument("--min-obs", type=int, default=MIN_OBS, help="Fewest observations for a window statistic.")
+    args = parser.parse_args()
+
+    cube = build_cube(pd.read_parquet(args.input), args.terms, args.windows, args.min_obs)
+    write_cube(cube, args.output)
+    print(f"Wrote {len(cube)} cube rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
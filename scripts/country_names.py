@@ -0,0 +1,138 @@
+"""
+Script Name: country_names.py
+
+Description:
+    Single country-name normalization index shared by every stage of the pipeline. It is built
+    from one canonical table, `data/01-raw_data/05-countryreference/countries.csv`, with one row
+    per known spelling (alias) of a country or territory:
+    - alias: a name as it appears in the shapefile, the World Bank tables, the SPI data or the
+      plotting scripts (e.g. 'Czechia', 'Korea, Rep.', 'Turkey', "Côte d'Ivoire").
+    - country: the canonical name used throughout the analysis data (the shapefile name).
+    - iso3: the ISO 3166-1 alpha-3 code (World Bank code) of the canonical country, used as
+      the join key between tables.
+    - region: the SDG region used for the figures (empty for Antarctica).
+    - ntl_country: the country whose NTL totals include this area. Overseas territories roll up
+      into their sovereign country; an empty value means the area is excluded.
+
+    Lookups are vectorized: the values are converted to a categorical, each distinct category
+    is looked up once, and rows are mapped through their integer category codes.
+
+Author:
+    Shamayla Durrin Islam
+    shamayla.islam@mail.utoronto.ca
+
+Date:
+    Created: October 17, 2026
+
+Dependencies:
+    - Python 3.8 or higher
+    - numpy
+    - pandas >= 1.3
+
+Usage:
+    from country_names import load_country_index
+
+    index = load_country_index()
+    df["country"] = index.canonical(df["country"])
+    df["country_code"] = index.iso3(df["country"])
+"""
+
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# The reference table lives in the data tree, next to the other raw inputs
+reference_path = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "data", "01-raw_data", "05-countryreference",
+    "countries.csv",
+)
+
+
+class CountryIndex:
+    """Alias -> canonical country -> ISO3 / region / NTL country lookups over one reference table."""
+
+    def __init__(self, table):
+        table = table.fillna("")
+
+        duplicated = table["alias"][table["alias"].duplicated()]
+        if len(duplicated):
+            raise ValueError(f"Aliases listed more than once: {', '.join(sorted(duplicated))}")
+
+        # Every canonical country must have exactly one code, region and NTL country
+        self.countries = table.drop(columns="alias").drop_duplicates()
+        conflicting = self.countries["country"][self.countries["country"].duplicated()]
+        if len(conflicting):
+            raise ValueError(f"Countries with conflicting attributes: {', '.join(sorted(conflicting))}")
+        self.countries = self.countries.set_index("country")
+
+        self.alias_to_country = dict(zip(table["alias"], table["country"]))
+        self.alias_attributes = {
+            column: dict(zip(table["alias"], table[column]))
+            for column in ("iso3", "region", "ntl_country")
+        }
+
+        # ISO3 -> canonical country, for tables keyed by code. Territories that roll up into another
+        # country (e.g. Azores, which shares Portugal's code) never own their code, and codes
+        # still shared by several areas (e.g. the French Southern Territories) are ambiguous.
+        owners = self.countries[(self.countries["ntl_country"] == "") |
+                                (self.countries["ntl_country"] == self.countries.index)]
+        owners = owners[~owners["iso3"].duplicated(keep=False) & (owners["iso3"] != "")]
+        self.iso3_to_country = dict(zip(owners["iso3"], owners.index))
+
+    def map_values(self, values, mapping):
+        """Map `values` through `mapping` one distinct value at a time; unmapped values become NaN."""
+        index = values.index if isinstance(values, pd.Series) else None
+        if isinstance(getattr(values, "dtype", None), pd.CategoricalDtype):
+            codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+        else:
+            codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+        mapped = np.array([mapping.get(value, np.nan) for value in uniques], dtype=object)
+        result = np.full(len(codes), np.nan, dtype=object)
+        present = codes >= 0
+        result[present] = mapped[codes[present]]
+        return pd.Series(result, index=index, dtype=object)
+
+    def canonical(self, values, keep_unknown=True):
+        """Canonical country name for each alias; unknown names are kept as-is or set to NaN."""
+        result = self.map_values(values, self.alias_to_country)
+        if keep_unknown:
+            result = result.fillna(pd.Series(np.asarray(values, dtype=object), index=result.index))
+        return result
+
+    def attribute(self, values, column):
+        """Look up a column of the reference table for each alias (NaN for unknown names)."""
+        return self.map_values(values, self.alias_attributes[column])
+
+    def iso3(self, values):
+        """ISO3 code of each alias."""
+        return self.attribute(values, "iso3")
+
+    def region(self, values):
+        """SDG region of each alias."""
+        return self.attribute(values, "region")
+
+    def ntl_country(self, values, keep_unknown=True):
+        """
+        Country whose NTL totals include each area ('' for excluded areas); unknown names are
+        kept as-is or set to NaN.
+        """
+        result = self.attribute(values, "ntl_country")
+        if keep_unknown:
+            result = result.fillna(pd.Series(np.asarray(values, dtype=object), index=result.index))
+        return result
+
+    def from_iso3(self, codes):
+        """Canonical country for each ISO3 code (NaN for codes such as World Bank aggregates)."""
+        return self.map_values(codes, self.iso3_to_country)
+
+    def unknown(self, values):
+        """Distinct values that are not a known alias."""
+        return sorted(set(pd.Series(values).dropna().unique()) - set(self.alias_to_country))
+
+
+@lru_cache(maxsize=None)
+def load_country_index(path=reference_path):
+    """Load (once per process) the country index from the reference table."""
+    return CountryIndex(pd.read_csv(path, keep_default_na=False, dtype=str))
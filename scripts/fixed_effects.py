@@ -0,0 +1,595 @@
+"""
+Script Name: fixed_effects.py
+
+Description:
+    Fixed-effects panel regressions for the NTL models (`04-model_data.R`), without dummy
+    columns. A model such as `lm(log(dn) ~ log(gdp) + factor(country) + factor(year))` is
+    written as the formula "log(dn) ~ log(gdp) | country + year" and fitted by:
+    1. Absorbing the fixed effects with the within transformation: the (weighted) group means
+       of every fixed effect are subtracted from the outcome and the regressors in turn
+       (alternating projections) until they no longer change. This costs a few `np.bincount`
+       passes over the data, whatever the number of countries, regions or years.
+    2. Solving the normal equations of the demeaned regressors, which only have as many
+       columns as there are slope coefficients.
+    3. Computing standard errors clustered by a column (CR1, the usual small-sample corrected
+       sandwich), or the classical ones when no cluster is given.
+
+    Subsets (e.g. the grade A-F models) are fitted in one batched call: the fixed effects are
+    interacted with the subset, so a single demeaning pass gives every subset its own country
+    and year effects, and the per-subset normal equations are solved as one stacked system.
+    The estimates are identical to fitting each subset separately.
+
+    Observations alone in a fixed-effect group (singletons) are perfectly fitted by their
+    effect and carry no information on the slopes; they are dropped, as `fixest` does.
+    Non-finite transformed values (e.g. the log of a zero DN) are treated as missing.
+
+    Fits are saved as compact JSON artifacts: the coefficients, their covariance matrix and
+    the fit statistics, not the model frame.
+
+Author:
+    Shamayla Durrin Islam
+    shamayla.islam@mail.utoronto.ca
+
+Date:
+    Created: October 17, 2026
+
+Dependencies:
+    - Python 3.8 or higher
+    - numpy
+    - pandas >= 1.3
+
+Usage:
+    from fixed_effects import fit, fit_by, save_fits
+
+    model1 = fit(analysis, "log(dn) ~ log(gdp) | country + year", cluster="country")
+    by_grade = fit_by(analysis, "log(dn) ~ log(gdp) | country + year", by="grade", cluster="country")
+    save_fits({"model1": model1, **by_grade}, "models/fixed_effects.json")
+"""
+
+import json
+import re
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from atomic_io import atomic_path
+
+# Convergence of the alternating projections: largest group mean still removed, relative to
+# the scale of the column
+DEMEAN_TOL = 1e-10
+DEMEAN_MAX_ITER = 10_000
+
+TRANSFORMS = {"log": np.log}
+
+TERM = re.compile(r"^(?:(\w+)\((\w+)\)|(\w+))$")
+
+
+class Formula:
+    """A parsed "outcome ~ regressors | fixed effects" formula."""
+
+    def __init__(self, text):
+        self.text = " ".join(text.split())
+        lhs, _, rhs = self.text.partition("~")
+        regressors, _, fixed_effects = rhs.partition("|")
+        self.outcome = lhs.strip()
+        self.regressors = [term.strip() for term in regressors.split("+") if term.strip()]
+        self.fixed_effects = [term.strip() for term in fixed_effects.split("+") if term.strip()]
+        if not self.outcome or not self.regressors:
+            raise ValueError(f"Formula {text!r} needs an outcome and at least one regressor.")
+
+        for term in [self.outcome] + self.regressors:
+            for part in term.split(":"):
+                parse_term(part)
+
+    def variables(self):
+        """Data columns the formula uses."""
+        columns = []
+        for term in [self.outcome] + self.regressors + self.fixed_effects:
+            for part in term.split(":"):
+                column = parse_term(part)[1]
+                if column not in columns:
+                    columns.append(column)
+        return columns
+
+    def __str__(self):
+        return self.text
+
+
+def parse_term(term):
+    """Split a term such as 'log(gdp)' into its transform ('log', or None) and column ('gdp')."""
+    match = TERM.match(term.strip())
+    if match is None or (match.group(1) and match.group(1) not in TRANSFORMS):
+        raise ValueError(f"Unsupported term {term!r}: use a column or {'/'.join(TRANSFORMS)}(column).")
+    if match.group(3):
+        return None, match.group(3)
+    return match.group(1), match.group(2)
+
+
+def term_values(data, term):
+    """Numeric values of a term; non-finite results (e.g. the log of zero) become NaN."""
+    transform, column = parse_term(term)
+    values = np.array(pd.to_numeric(data[column], errors="coerce").to_numpy(dtype="float64", na_value=np.nan))
+    if transform is not None:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = TRANSFORMS[transform](values)
+    values[~np.isfinite(values)] = np.nan
+    return values
+
+
+def term_design(data, term):
+    """
+    Columns and names of one regressor term. An interaction such as 'log(gdp):grade' gets
+    one slope column per level of the categorical column (zero elsewhere), like R's
+    `log(gdp):grade`; rows where that column is missing become NaN.
+    """
+    numeric, _, factor = term.partition(":")
+    values = term_values(data, numeric)
+    if not factor:
+        return values[:, None], [term]
+
+    codes, levels = pd.factorize(data[factor], sort=True)
+    columns = np.where(codes[:, None] == np.arange(len(levels)), values[:, None], 0.0)
+    columns[codes < 0] = np.nan
+    return columns, [f"{numeric}:{factor}{level}" for level in levels]
+
+
+def design(data, formula):
+    """Outcome vector, regressor matrix and column names of a formula."""
+    y = term_values(data, formula.outcome)
+    columns, names = zip(*(term_design(data, term) for term in formula.regressors))
+    return y, np.column_stack(columns), [name for term_names in names for name in term_names]
+
+
+def factor_codes(*arrays):
+    """Integer codes (0..levels-1) of the combinations of one or more key arrays (missing keys are a level)."""
+    codes = None
+    for array in arrays:
+        array_codes, uniques = pd.factorize(np.asarray(array))
+        array_codes = array_codes.astype("int64") + 1
+        # Combine with the codes so far, then renumber to keep the codes small
+        codes = array_codes if codes is None else pd.factorize(codes * (len(uniques) + 1) + array_codes)[0]
+    return pd.factorize(codes)[0].astype("int64")
+
+
+def demean(values, groups, weights=None, tol=DEMEAN_TOL, max_iter=DEMEAN_MAX_ITER):
+    """
+    Within transformation of the columns of `values` (n x k, or a vector): remove the
+    (weighted) means of every fixed effect, given as integer codes in `groups`, by
+    alternating projections until the removed means fall below `tol` (relative to each
+    column's scale). Observations with zero weight do not contribute to the means.
+    """
+    values = np.array(values, dtype="float64", copy=True)
+    vector = values.ndim == 1
+    if vector:
+        values = values[:, None]
+    if not groups:
+        return values[:, 0] if vector else values
+
+    weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype="float64")
+    group_weights = [np.bincount(codes, weights=weights) for codes in groups]
+    scale = np.maximum(np.abs(values).max(axis=0, initial=0), 1.0)
+
+    for _ in range(max_iter):
+        change = np.zeros(values.shape[1])
+        for codes, total in zip(groups, group_weights):
+            for j in range(values.shape[1]):
+                sums = np.bincount(codes, weights=weights * values[:, j], minlength=len(total))
+                means = np.divide(sums, total, out=np.zeros_like(sums), where=total > 0)
+                values[:, j] -= means[codes]
+                change[j] = max(change[j], np.abs(means).max(initial=0))
+        # A single fixed effect is removed exactly in one pass
+        if len(groups) == 1 or np.all(change <= tol * scale):
+            break
+    else:
+        warnings.warn(f"Fixed-effect demeaning did not converge in {max_iter} iterations.")
+
+    return values[:, 0] if vector else values
+
+
+def recover_effects(residuals, groups, weights=None, tol=DEMEAN_TOL, max_iter=DEMEAN_MAX_ITER):
+    """
+    Fixed effects of the regression residuals `residuals` (outcome minus the fitted slopes):
+    one array of effects per entry of `groups`, found by the same alternating projections as
+    `demean`. Only their sum is identified; the later effects are centered and the first
+    one carries the intercept.
+    """
+    remaining = np.array(residuals, dtype="float64", copy=True)
+    weights = np.ones(len(remaining)) if weights is None else np.asarray(weights, dtype="float64")
+    group_weights = [np.bincount(codes, weights=weights) for codes in groups]
+    effects = [np.zeros(len(total)) for total in group_weights]
+    scale = max(np.abs(remaining).max(initial=0), 1.0)
+
+    for _ in range(max_iter):
+        change = 0.0
+        for effect, codes, total in zip(effects, groups, group_weights):
+            sums = np.bincount(codes, weights=weights * remaining, minlength=len(total))
+            means = np.divide(sums, total, out=np.zeros_like(sums), where=total > 0)
+            effect += means
+            remaining -= means[codes]
+            change = max(change, np.abs(means).max(initial=0))
+        if len(groups) == 1 or change <= tol * scale:
+            break
+
+    for effect, codes in zip(effects[1:], groups[1:]):
+        center = np.average(effect[codes], weights=weights)
+        effect -= center
+        effects[0] += center
+    return effects
+
+
+def singletons(groups):
+    """Mask of the observations to drop because they are alone in a fixed-effect group (iterated)."""
+    n = len(groups[0]) if groups else 0
+    drop = np.zeros(n, dtype=bool)
+    while groups:
+        found = np.zeros(n, dtype=bool)
+        for codes in groups:
+            # minlength: the highest levels may only have dropped observations left
+            counts = np.bincount(codes[~drop], minlength=codes.max(initial=-1) + 1)
+            found |= ~drop & (counts[codes] == 1)
+        if not found.any():
+            break
+        drop |= found
+    return drop
+
+
+def components(first, second):
+    """Connected-component label of each observation in the graph linking the levels of two fixed effects."""
+    offset = first.max(initial=-1) + 1
+    labels = np.arange(offset + second.max(initial=-1) + 1)
+    while True:
+        linked = np.minimum(labels[first], labels[second + offset])
+        updated = labels.copy()
+        np.minimum.at(updated, first, linked)
+        np.minimum.at(updated, second + offset, linked)
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            return labels[first]
+        labels = updated
+
+
+def nested(codes, cluster):
+    """Whether every level of a fixed effect lies within a single cluster."""
+    pairs = factor_codes(codes, cluster)
+    return pairs.max(initial=-1) + 1 == codes.max(initial=-1) + 1
+
+
+def fixed_effect_dof(groups, subset, n_subsets, cluster=None):
+    """
+    Degrees of freedom absorbed by the fixed effects in each subset: their levels, less one
+    per connected component of the first two effects and one per further effect. With
+    clustering, effects nested in the clusters are not counted (like `fixest` and `reghdfe`),
+    and each other effect loses one redundant level when another effect is present.
+    Returns the (all effects, non-nested effects) degrees of freedom per subset.
+    """
+    total = np.zeros(n_subsets)
+    counted = np.zeros(n_subsets)
+    for i, codes in enumerate(groups):
+        # Levels are interacted with the subset, so each level belongs to one subset
+        level_subset = np.zeros(codes.max(initial=-1) + 1, dtype="int64")
+        level_subset[codes] = subset
+        levels = np.bincount(level_subset, minlength=n_subsets)
+        total += levels
+        if cluster is None or not nested(codes, cluster):
+            counted += levels - (1 if len(groups) > 1 else 0)
+
+    if len(groups) >= 2:
+        labels = components(groups[0], groups[1])
+        first_label = pd.Series(subset).groupby(labels).first()
+        total -= np.bincount(first_label.to_numpy(), minlength=n_subsets)
+        total -= len(groups) - 2
+    return total, counted
+
+
+class FixedEffectsFit:
+    """Coefficients, covariance and fit statistics of one fixed-effects regression."""
+
+    def __init__(self, formula, terms, coef, vcov, nobs, df_resid, r2, r2_within, rss,
+                 cluster=None, n_clusters=None, singletons_dropped=0, subset=None, effects=None, centers=None):
+        self.formula = str(formula)
+        self.terms = list(terms)
+        self.coef = np.asarray(coef, dtype="float64")
+        self.vcov = np.asarray(vcov, dtype="float64")
+        self.nobs = int(nobs)
+        self.df_resid = int(df_resid)
+        self.r2 = float(r2)
+        self.r2_within = float(r2_within)
+        self.rss = float(rss)
+        self.cluster = cluster
+        self.n_clusters = None if n_clusters is None else int(n_clusters)
+        self.singletons_dropped = int(singletons_dropped)
+        self.subset = subset
+        # Estimated fixed effects, {column: {level: effect}}, and the regressor means per level of
+        # the first fixed effect, {column: {level: [means]}}, when requested
+        self.effects = effects
+        self.centers = centers
+
+    @property
+    def se(self):
+        return np.sqrt(np.diag(self.vcov))
+
+    @property
+    def sigma(self):
+        """Residual standard deviation."""
+        return np.sqrt(self.rss / self.df_resid) if self.df_resid > 0 else np.nan
+
+    def tidy(self):
+        """One row per coefficient: term, estimate, std_error and t statistic."""
+        return pd.DataFrame({
+            "term": self.terms,
+            "estimate": self.coef,
+            "std_error": self.se,
+            "statistic": self.coef / self.se,
+        })
+
+    def to_dict(self):
+        return {
+            "formula": self.formula,
+            "subset": self.subset,
+            "terms": self.terms,
+            "coef": self.coef.tolist(),
+            "vcov": self.vcov.tolist(),
+            "nobs": self.nobs,
+            "df_resid": self.df_resid,
+            "r2": self.r2,
+            "r2_within": self.r2_within,
+            "rss": self.rss,
+            "cluster": self.cluster,
+            "n_clusters": self.n_clusters,
+            "singletons_dropped": self.singletons_dropped,
+            "effects": self.effects,
+            "centers": self.centers,
+        }
+
+    @classmethod
+    def from_dict(cls, record):
+        return cls(**record)
+
+    def __repr__(self):
+        estimates = ", ".join(f"{term}={coef:.4g} ({se:.3g})" for term, coef, se in zip(self.terms, self.coef, self.se))
+        return f"FixedEffectsFit({self.formula!r}, {estimates}, nobs={self.nobs})"
+
+
+class Absorbed:
+    """
+    Columns of one sample with the fixed effects absorbed (per subset), ready to fit any
+    regression among them; see `absorb`.
+    """
+
+    def __init__(self, values, demeaned, groups, subset, n_subsets, weights, keep, singletons_dropped):
+        self.values = values
+        self.demeaned = demeaned
+        self.groups = groups
+        self.subset = subset
+        self.n_subsets = n_subsets
+        self.weights = weights
+        self.keep = keep
+        self.singletons_dropped = singletons_dropped
+        # Fixed-effect degrees of freedom, per cluster assignment
+        self.dof = {}
+
+
+def absorb(values, groups, subset=None, weights=None, drop_singletons=True):
+    """
+    Demean the columns of `values` (n x k) by the fixed effects `groups` (integer codes),
+    separately in each subset (integer codes 0..S-1; None for a single sample). Rows with
+    missing values must already be removed. The demeaning is shared by every regression
+    fitted with `solve` among these columns.
+    """
+    values = np.asarray(values, dtype="float64")
+    n = len(values)
+    subset = np.zeros(n, dtype="int64") if subset is None else np.asarray(subset, dtype="int64")
+    n_subsets = subset.max(initial=-1) + 1
+    weights = np.ones(n) if weights is None else np.asarray(weights, dtype="float64")
+
+    # Each subset gets its own levels of every fixed effect (a constant, i.e. an intercept, if there are none)
+    groups = [factor_codes(subset, codes) for codes in groups] if groups else [subset]
+
+    dropped = singletons(groups) if drop_singletons else np.zeros(n, dtype=bool)
+    singletons_dropped = np.bincount(subset[dropped], minlength=n_subsets)
+    keep = ~dropped
+    if dropped.any():
+        values, subset, weights = values[keep], subset[keep], weights[keep]
+        groups = [factor_codes(codes[keep]) for codes in groups]
+
+    return Absorbed(values, demean(values, groups, weights), groups, subset, n_subsets, weights, keep,
+                    singletons_dropped)
+
+
+def solve(absorbed, y_column, x_columns, cluster=None):
+    """
+    Fit column `y_column` on the columns `x_columns` of an absorbed sample, with CR1 standard
+    errors clustered by `cluster` (integer codes for the rows passed to `absorb`) or classical
+    ones. Returns a dict of per-subset arrays.
+    """
+    x_columns = list(x_columns)
+    subset, weights, n_subsets = absorbed.subset, absorbed.weights, absorbed.n_subsets
+    y = absorbed.values[:, y_column]
+    yd, Xd = absorbed.demeaned[:, y_column], absorbed.demeaned[:, x_columns]
+    k = len(x_columns)
+    if cluster is not None:
+        cluster = np.asarray(cluster, dtype="int64")[absorbed.keep]
+
+    # Stack the per-subset normal equations
+    order = np.argsort(subset, kind="stable")
+    starts = np.flatnonzero(np.diff(subset[order], prepend=-1))
+    present = subset[order][starts]
+    Xw = Xd * weights[:, None]
+    xtx = np.zeros((n_subsets, k, k))
+    xty = np.zeros((n_subsets, k))
+    if len(order):
+        xtx[present] = np.add.reduceat((Xw[:, :, None] * Xd[:, None, :])[order], starts)
+        xty[present] = np.add.reduceat((Xw * yd[:, None])[order], starts)
+
+    coef = np.full((n_subsets, k), np.nan)
+    bread = np.full((n_subsets, k, k), np.nan)
+    ranks = np.linalg.matrix_rank(xtx) if n_subsets else np.array([], dtype="int64")
+    solvable = ranks == k
+    if not solvable.all():
+        warnings.warn(f"{int((~solvable).sum())} subset(s) have collinear regressors; their coefficients are NaN.")
+    bread[solvable] = np.linalg.inv(xtx[solvable])
+    coef[solvable] = np.einsum("gij,gj->gi", bread[solvable], xty[solvable])
+
+    residuals = yd - np.einsum("ni,ni->n", Xd, coef[subset])
+    nobs = np.bincount(subset, minlength=n_subsets)
+    rss = np.bincount(subset, weights=weights * residuals ** 2, minlength=n_subsets)
+    tss_within = np.bincount(subset, weights=weights * yd ** 2, minlength=n_subsets)
+    total_weight = np.bincount(subset, weights=weights, minlength=n_subsets)
+    mean_y = np.bincount(subset, weights=weights * y, minlength=n_subsets) / np.maximum(total_weight, 1e-300)
+    tss = np.bincount(subset, weights=weights * (y - mean_y[subset]) ** 2, minlength=n_subsets)
+
+    dof_key = None if cluster is None else cluster.tobytes()
+    if dof_key not in absorbed.dof:
+        absorbed.dof[dof_key] = fixed_effect_dof(absorbed.groups, subset, n_subsets, cluster)
+    fe_dof, fe_dof_counted = absorbed.dof[dof_key]
+    df_resid = nobs - k - fe_dof
+
+    if cluster is None:
+        sigma2 = rss / np.maximum(df_resid, 1)
+        vcov = bread * sigma2[:, None, None]
+        n_clusters = None
+    else:
+        # Scores summed within each (subset, cluster), then the sandwich per subset
+        cluster_codes = factor_codes(subset, cluster)
+        scores = Xd * (weights * residuals)[:, None]
+        cluster_scores = np.stack([np.bincount(cluster_codes, weights=scores[:, j]) for j in range(k)], axis=1)
+        cluster_subset = np.zeros(len(cluster_scores), dtype="int64")
+        cluster_subset[cluster_codes] = subset
+        meat = np.zeros((n_subsets, k, k))
+        np.add.at(meat, cluster_subset, cluster_scores[:, :, None] * cluster_scores[:, None, :])
+
+        n_clusters = np.bincount(cluster_subset, minlength=n_subsets)
+        K = k + fe_dof_counted
+        correction = (n_clusters / np.maximum(n_clusters - 1, 1)) * ((nobs - 1) / np.maximum(nobs - K, 1))
+        vcov = bread @ meat @ bread * correction[:, None, None]
+
+    return {
+        "coef": coef, "vcov": vcov, "nobs": nobs, "df_resid": df_resid, "rss": rss,
+        "r2": 1 - rss / np.where(tss > 0, tss, np.nan),
+        "r2_within": 1 - rss / np.where(tss_within > 0, tss_within, np.nan),
+        "n_clusters": n_clusters, "singletons_dropped": absorbed.singletons_dropped,
+    }
+
+
+def fit_arrays(y, X, groups, subset=None, cluster=None, weights=None, drop_singletons=True):
+    """
+    Fit `y ~ X` absorbing the fixed effects `groups` (integer codes) separately in each
+    subset (integer codes 0..S-1; None for a single fit), with CR1 standard errors clustered
+    by `cluster` (integer codes) or classical ones. Rows with missing values must already be
+    removed. Returns a dict of per-subset arrays.
+    """
+    absorbed = absorb(np.column_stack([y, X]), groups, subset, weights, drop_singletons)
+    return solve(absorbed, 0, range(1, X.shape[1] + 1), cluster)
+
+
+def sample(data, formula, columns=()):
+    """Design of a formula restricted to the rows where every term and extra column is present."""
+    formula = formula if isinstance(formula, Formula) else Formula(formula)
+    y, X, terms = design(data, formula)
+    complete = ~np.isnan(y) & ~np.isnan(X).any(axis=1)
+    for column in list(formula.fixed_effects) + [column for column in columns if column is not None]:
+        complete &= data[column].notna().to_numpy()
+    return formula, y[complete], X[complete], terms, complete
+
+
+def fixed_effect_values(rows, formula, y, X, coef, subset, weights):
+    """
+    Estimated fixed effects of each subset, [{column: {level: effect}}], from the residuals
+    of the fitted slopes (every complete row, including singletons, whose effect is exact),
+    and the (weighted) regressor means per level of the first fixed effect,
+    [{column: {level: [means]}}].
+    """
+    n_subsets = len(coef)
+    subset = np.zeros(len(y), dtype="int64") if subset is None else np.asarray(subset, dtype="int64")
+    residuals = y - np.einsum("ni,ni->n", X, coef[subset])
+    weights = np.ones(len(y)) if weights is None else weights
+    columns = list(formula.fixed_effects)
+    groups = [factor_codes(subset, rows[column]) for column in columns]
+
+    usable = ~np.isnan(residuals)
+    effects = [{column: {} for column in columns} if not np.isnan(coef[i]).any() else None for i in range(n_subsets)]
+    centers = [{column: {} for column in columns[:1]} if effect is not None else None for effect in effects]
+    if not usable.any():
+        return effects, centers
+    subset, X, weights = subset[usable], X[usable], weights[usable]
+    groups = [factor_codes(codes[usable]) for codes in groups] if groups else [subset]
+    values = recover_effects(residuals[usable], groups, weights)
+    if not columns:
+        # No fixed effects: the intercept of each subset
+        for code, row in enumerate(np.unique(groups[0], return_index=True)[1]):
+            effects[subset[row]] = {"(intercept)": {"": float(values[0][code])}}
+        return effects, centers
+
+    for i, (column, codes, effect) in enumerate(zip(columns, groups, values)):
+        first = np.unique(codes, return_index=True)[1]
+        levels = rows[column].to_numpy()[usable][first]
+        if i == 0:
+            total = np.bincount(codes, weights=weights)
+            means = np.stack([np.bincount(codes, weights=weights * X[:, j]) for j in range(X.shape[1])], axis=1)
+            means /= total[:, None]
+        for code, row in enumerate(first):
+            if effects[subset[row]] is None:
+                continue
+            level = levels[code]
+            level = str(level.item() if hasattr(level, "item") else level)
+            effects[subset[row]][column][level] = float(effect[code])
+            if i == 0:
+                centers[subset[row]][column][level] = means[code].tolist()
+    return effects, centers
+
+
+def fit_by(data, formula, by=None, cluster=None, weights=None, drop_singletons=True, effects=False):
+    """
+    Fit `formula` (e.g. "log(dn) ~ log(gdp) | country + year") to `data` separately for each
+    level of the `by` column, in one batched call. Returns {level: FixedEffectsFit}, or
+    {None: fit} without `by`. Standard errors are clustered by the `cluster` column. With
+    `effects`, the estimated fixed effects are kept as well (e.g. for predictions).
+    """
+    formula, y, X, terms, complete = sample(data, formula, [by, cluster, weights])
+    rows = data[complete]
+
+    if by is None:
+        subset, levels = None, [None]
+    else:
+        subset, levels = pd.factorize(rows[by], sort=True)
+    groups = [factor_codes(rows[column]) for column in formula.fixed_effects]
+    cluster_codes = None if cluster is None else factor_codes(rows[cluster])
+    weight_values = None if weights is None else rows[weights].to_numpy(dtype="float64")
+
+    result = fit_arrays(y, X, groups, subset, cluster_codes, weight_values, drop_singletons)
+    estimated, centers = (fixed_effect_values(rows, formula, y, X, result["coef"], subset, weight_values)
+                          if effects else ([None] * len(levels), [None] * len(levels)))
+    fits = {}
+    for i, level in enumerate(levels):
+        level = level.item() if hasattr(level, "item") else level
+        fits[level] = FixedEffectsFit(
+            formula, terms, result["coef"][i], result["vcov"][i], result["nobs"][i],
+            result["df_resid"][i], result["r2"][i], result["r2_within"][i], result["rss"][i],
+            cluster=cluster, n_clusters=None if result["n_clusters"] is None else result["n_clusters"][i],
+            singletons_dropped=result["singletons_dropped"][i],
+            subset=None if by is None else {by: level}, effects=estimated[i], centers=centers[i],
+        )
+    return fits
+
+
+def fit(data, formula, cluster=None, weights=None, drop_singletons=True, effects=False):
+    """Fit `formula` to all of `data`; see `fit_by`."""
+    return fit_by(data, formula, None, cluster, weights, drop_singletons, effects)[None]
+
+
+def save_fits(fits, path):
+    """Write {name: FixedEffectsFit} as one JSON artifact."""
+    records = {name: fit.to_dict() for name, fit in fits.items()}
+
+    def write(tmp_path):
+        with open(tmp_path, "w") as f:
+            json.dump(records, f, indent=1)
+
+    atomic_path(path, write)
+
+
+def load_fits(path):
+    """Read the {name: FixedEffectsFit} artifact written by `save_fits`."""
+    with open(path) as f:
+        return {name: FixedEffectsFit.from_dict(record) for name, record in json.load(f).items()}
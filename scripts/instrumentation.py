@@ -0,0 +1,448 @@
+"""
+Script Name: instrumentation.py
+
+Description:
+    Pipeline-wide instrumentation: timing spans, counters, live progress and metrics export,
+    shared by `01-data_extraction.py` and `02-data_cleaning.py`.
+
+    - `span(name, **fields)` times a stage (e.g. `span("extract", year=2019)`): wall and CPU
+      time, resident memory at the end and peak resident memory, and the bytes the process
+      read and wrote meanwhile (from /proc/self/io, so files read through a memory map are not
+      counted). Spans nest; every span is written as one JSON line when it ends.
+    - `timed(name)` accumulates the time spent in a phase (e.g. "read", "label", "reduce",
+      "write") into the innermost open span, so the per-window phases of a raster show up as
+      totals in the year's span instead of one line per window.
+    - `count(pixels=..., rows=...)` adds to the counters of the innermost open span. The span
+      record reports each counter and its rate per second (pixels/s, rows/s).
+    - `progress(name, total, unit)` reports live progress with the rate and an ETA, at most
+      every `interval` seconds, on stderr (and as JSON lines).
+    - With a profiler, the spans named in `profile` are profiled with cProfile (one .prof
+      file per span) or sampled with py-spy (one flame graph per span).
+
+    Spans are opened from one thread; `timed` and `count` can be called from any thread (e.g.
+    the windows reduced by `map_windows`) and add to the span that is open in the process.
+
+    Nothing is recorded until `configure` is called: the module-level functions then return
+    shared no-op objects, so instrumented code costs one function call per span or window.
+    Worker processes are configured with the parent's `settings()` and append to the same
+    metrics file; every line carries the run ID and the process ID.
+
+Author:
+    Shamayla Durrin Islam
+    shamayla.islam@mail.utoronto.ca
+
+Date:
+    Created: October 17, 2026
+
+Dependencies:
+    - Python 3.8 or higher
+    - py-spy (only for `--profiler py-spy`)
+
+Usage:
+    from instrumentation import add_arguments, configure_from_args, count, progress, span, timed
+
+    configure_from_args(args)  # After parser.parse_args(), with add_arguments(parser) before
+    with span("extract", year=2019):
+        with timed("read"):
+            band = dataset.read(1)
+        count(pixels=band.size)
+
+    Metrics of a run, and the time per phase of every year:
+        python scripts/01-data_extraction.py --progress --metrics others/metrics/metrics.jsonl
+    Profile the concatenation stage:
+        python scripts/02-data_cleaning.py --force --profile concatenate --profile-dir others/profiles
+"""
+
+import cProfile
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Windows: no getrusage, the peak memory is not reported
+    resource = None
+
+# Default file for the metrics of `--metrics` given without a value
+metrics_path = "others/metrics/metrics.jsonl"
+profile_dir = "others/profiles"
+
+# Seconds between two progress reports
+PROGRESS_INTERVAL = 5.0
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_mb():
+    """Current resident memory of the process in MB (None where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as handle:
+            return int(handle.read().split()[1]) * PAGE_SIZE / 1024 ** 2
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss_mb():
+    """Peak resident memory of the process so far in MB (None where getrusage is unavailable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+def io_bytes():
+    """Bytes read and written by the process so far, (read, written), or None without /proc/self/io."""
+    try:
+        with open("/proc/self/io") as handle:
+            fields = dict(line.split(":") for line in handle if ":" in line)
+        return int(fields["rchar"]), int(fields["wchar"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def format_duration(seconds):
+    """Seconds as e.g. `42s`, `3m05s` or `1h02m`."""
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+
+
+def format_count(value):
+    """A count or rate with a K/M/G suffix."""
+    for suffix, scale in (("G", 1e9), ("M", 1e6), ("K", 1e3)):
+        if abs(value) >= scale:
+            return f"{value / scale:.1f}{suffix}"
+    return f"{value:.0f}" if float(value).is_integer() else f"{value:.1f}"
+
+
+class NullSpan:
+    """No-op stand-in for spans, timers and progress when instrumentation is disabled."""
+
+    def add(self, **counters):
+        pass
+
+    def advance(self, n=1):
+        pass
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+NULL = NullSpan()
+
+
+class Timer:
+    """Adds the time spent in a `with` block to a phase of a span."""
+
+    __slots__ = ("span", "name", "start")
+
+    def __init__(self, span, name):
+        self.span = span
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.span.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Span:
+    """A timed stage: wall and CPU time, memory, I/O, counters and time per phase."""
+
+    def __init__(self, recorder, name, fields):
+        self.recorder = recorder
+        self.name = name
+        self.fields = fields
+        self.parent = None
+        self.counters = {}
+        self.timers = {}
+        self.lock = threading.Lock()
+        self.profiler = None
+
+    def add(self, **counters):
+        """Add to the span's counters (e.g. `pixels=...`, `rows=...`)."""
+        with self.lock:
+            for key, value in counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+
+    def add_time(self, name, seconds):
+        """Add the time spent in a phase."""
+        with self.lock:
+            self.timers[name] = self.timers.get(name, 0.0) + seconds
+
+    def __enter__(self):
+        stack = self.recorder.stack
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self.profiler = self.recorder.start_profile(self)
+        self.io = io_bytes()
+        self.cpu = time.process_time()
+        self.start = time.perf_counter()
+        self.started = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        wall = time.perf_counter() - self.start
+        cpu = time.process_time() - self.cpu
+        io = io_bytes()
+        if self.profiler is not None:
+            self.recorder.stop_profile(self.profiler)
+        self.recorder.stack.remove(self)
+
+        record = {
+            "event": "span",
+            "name": self.name,
+            **({"fields": self.fields} if self.fields else {}),
+            "parent": self.parent,
+            "started": datetime.fromtimestamp(self.started, timezone.utc).isoformat(timespec="milliseconds"),
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            "rss_mb": rss_mb(),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        if io is not None and self.io is not None:
+            record["read_bytes"] = io[0] - self.io[0]
+            record["written_bytes"] = io[1] - self.io[1]
+        if self.counters:
+            record["counters"] = self.counters
+            record["rates"] = {f"{key}_per_s": value / wall if wall > 0 else None
+                               for key, value in self.counters.items()}
+        if self.timers:
+            record["timers"] = {key: round(value, 6) for key, value in sorted(self.timers.items())}
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        self.recorder.emit(record)
+        return False
+
+
+class Progress:
+    """Live progress of `total` items of some unit, with rate and ETA, reported every `interval` s."""
+
+    def __init__(self, recorder, name, total, unit):
+        self.recorder = recorder
+        self.name = name
+        self.total = total
+        self.unit = unit
+        self.done = 0
+        self.start = time.perf_counter()
+        self.last_report = self.start
+        self.lock = threading.Lock()
+
+    def advance(self, n=1):
+        """Mark `n` more items as done, reporting when the interval has elapsed."""
+        with self.lock:
+            self.done += n
+            now = time.perf_counter()
+            if now - self.last_report < self.recorder.interval:
+                return
+            self.last_report = now
+        self.report(now)
+
+    def close(self):
+        """Report the final state if anything was reported before (long-running work only)."""
+        if self.last_report > self.start:
+            self.report(time.perf_counter())
+
+    def report(self, now):
+        elapsed = now - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        remaining = (self.total - self.done) / rate if rate > 0 and self.total else None
+        record = {"event": "progress", "name": self.name, "done": self.done, "total": self.total,
+                  "unit": self.unit, "elapsed_s": round(elapsed, 3), "rate_per_s": rate,
+                  "eta_s": None if remaining is None else round(remaining, 1)}
+        self.recorder.emit(record)
+
+        if self.recorder.show_progress:
+            share = f" ({100 * self.done / self.total:.0f}%)" if self.total else ""
+            eta = f", ETA {format_duration(remaining)}" if remaining is not None else ""
+            print(f"{self.name}: {format_count(self.done)}/{format_count(self.total or 0)} {self.unit}{share}, "
+                  f"{format_count(rate)} {self.unit}/s{eta}", file=sys.stderr, flush=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+        return False
+
+
+class CProfileHook:
+    """cProfile of one span, dumped to a .prof file (readable with pstats or snakeviz)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+        self.profile.dump_stats(self.path)
+
+
+class PySpyHook:
+    """py-spy sampling of this process during one span, written as a flame graph (SVG)."""
+
+    def __init__(self, path):
+        executable = shutil.which("py-spy")
+        if executable is None:
+            raise RuntimeError("--profiler py-spy needs py-spy on the PATH (pip install py-spy).")
+        self.path = path
+        self.process = subprocess.Popen([executable, "record", "--pid", str(os.getpid()), "--output", path,
+                                         "--threads", "--nonblocking"],
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def stop(self):
+        # py-spy writes the flame graph when interrupted
+        self.process.send_signal(signal.SIGINT)
+        self.process.wait()
+
+
+PROFILERS = {"cprofile": (CProfileHook, ".prof"), "py-spy": (PySpyHook, ".svg")}
+
+
+class Recorder:
+    """Collects the spans and progress of a process and writes them as JSON lines."""
+
+    def __init__(self, run_id=None, metrics=None, show_progress=False, profile=(), profiler="cprofile",
+                 profile_dir=profile_dir, interval=PROGRESS_INTERVAL):
+        self.run_id = run_id or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S") + f"-{os.getpid()}"
+        self.metrics = metrics
+        self.show_progress = show_progress
+        self.profile = set(profile)
+        self.profiler = profiler
+        self.profile_dir = profile_dir
+        self.interval = interval
+        self.stack = []
+        self.fd = None
+        self.write_lock = threading.Lock()
+        self.profiling = False
+
+    def settings(self):
+        """Keyword arguments of `configure` that give a worker process the same instrumentation."""
+        return {"run_id": self.run_id, "metrics": self.metrics, "show_progress": self.show_progress,
+                "profile": sorted(self.profile), "profiler": self.profiler, "profile_dir": self.profile_dir,
+                "interval": self.interval}
+
+    def current(self):
+        return self.stack[-1] if self.stack else None
+
+    def start_profile(self, span):
+        """Profiler hook of a span named in `profile`, unless a profile of this process is already running."""
+        if span.name not in self.profile or self.profiling:
+            return None
+        suffix = "".join(f"-{value}" for value in span.fields.values())
+        hook, extension = PROFILERS[self.profiler]
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f"{span.name.replace('/', '-')}{suffix}-{os.getpid()}{extension}")
+        self.profiling = True
+        return hook(path)
+
+    def stop_profile(self, hook):
+        hook.stop()
+        self.profiling = False
+        print(f"Saved the profile to {hook.path}", file=sys.stderr)
+
+    def emit(self, record):
+        """Append one record to the metrics file, if any (one write per line, so processes can share it)."""
+        if self.metrics is None:
+            return
+        record = {"run": self.run_id, "pid": os.getpid(), "time": round(time.time(), 3), **record}
+        line = (json.dumps(record, default=str) + "\n").encode()
+        with self.write_lock:
+            if self.fd is None:
+                os.makedirs(os.path.dirname(self.metrics) or ".", exist_ok=True)
+                self.fd = os.open(self.metrics, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            os.write(self.fd, line)
+
+
+# The recorder of this process; None until `configure` is called
+recorder = None
+
+
+def configure(**settings):
+    """Enable instrumentation in this process (see `Recorder` for the settings) and return the recorder."""
+    global recorder
+    recorder = Recorder(**settings)
+    return recorder
+
+
+def settings():
+    """The settings to `configure` worker processes with, or None when instrumentation is disabled."""
+    return None if recorder is None else recorder.settings()
+
+
+def configure_worker(worker_settings):
+    """Process pool initializer: enable the parent's instrumentation in a worker."""
+    if worker_settings is not None:
+        configure(**worker_settings)
+
+
+def span(name, **fields):
+    """A timed stage, used as a context manager; a no-op when instrumentation is disabled."""
+    if recorder is None:
+        return NULL
+    return Span(recorder, name, fields)
+
+
+def timed(name):
+    """Time a phase into the innermost open span."""
+    current = None if recorder is None else recorder.current()
+    if current is None:
+        return NULL
+    return Timer(current, name)
+
+
+def count(**counters):
+    """Add to the counters of the innermost open span."""
+    current = None if recorder is None else recorder.current()
+    if current is not None:
+        current.add(**counters)
+
+
+def progress(name, total, unit="items"):
+    """Live progress over `total` items, used as a context manager; call `advance(n)` as they are done."""
+    if recorder is None or (not recorder.show_progress and recorder.metrics is None):
+        return NULL
+    return Progress(recorder, name, total, unit)
+
+
+def add_arguments(parser):
+    """Add the instrumentation options to a script's argument parser."""
+    group = parser.add_argument_group("instrumentation")
+    group.add_argument("--progress", action="store_true", help="Report live progress with the rate and ETA.")
+    group.add_argument("--metrics", nargs="?", const=metrics_path,
+                       help="Append the timing, memory and I/O of every stage as JSON lines to this file "
+                            f"(default when given without a value: {metrics_path}).")
+    group.add_argument("--profile", action="append", default=[], metavar="STAGE",
+                       help="Profile this stage (span name, e.g. extract or concatenate). Can be repeated.")
+    group.add_argument("--profiler", choices=sorted(PROFILERS), default="cprofile",
+                       help="Profiler used for --profile.")
+    group.add_argument("--profile-dir", default=profile_dir, help="Directory for the profiles.")
+    return group
+
+
+def configure_from_args(args):
+    """Enable instrumentation when any of the options of `add_arguments` is given."""
+    if args.progress or args.metrics or args.profile:
+        return configure(metrics=args.metrics, show_progress=args.progress, profile=args.profile,
+                         profiler=args.profiler, profile_dir=args.profile_dir)
+    return None
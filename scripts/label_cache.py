@@ -0,0 +1,209 @@
+"""
+Script Name: label_cache.py
+
+Description:
+    On-disk cache of country label rasters. All NTL years share one grid, so the country
+    assignment only has to be computed once per (raster transform, shape, CRS, shapefile
+    content, name field). Each entry is stored as a directory holding:
+    - labels.npy: the uint16 country-ID label raster, memory-mapped when read back.
+    - countries.csv: the ID -> country table (ID 0 is reserved for "no country").
+    - meta.json: the grid, shapefile hash and name field the entry was built from.
+
+    The entry directory is named after a hash of its key, so a changed shapefile or a new grid
+    simply maps to a new entry. Entries that no longer match their metadata, are incomplete, or
+    were built from an older version of the same shapefile on the same grid are removed and
+    rebuilt automatically.
+
+Author:
+    Shamayla Durrin Islam
+    shamayla.islam@mail.utoronto.ca
+
+Date:
+    Created: October 17, 2026
+
+Dependencies:
+    - Python 3.8 or higher
+    - numpy
+    - pandas >= 1.3
+    - rasterio >= 1.2
+
+Usage:
+    from label_cache import load_label_raster
+
+    with rasterio.open(tif_path) as dataset:
+        labels, names = load_label_raster(dataset, shapefile_path, get_countries, cache_dir)
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from ntl_extraction import country_ids, grid_key, iter_windows, window_labels
+
+# Sidecar files that define a shapefile's content
+SHAPEFILE_EXTENSIONS = (".shp", ".shx", ".dbf", ".prj", ".cpg")
+
+# Bump when the layout of a cache entry changes so older entries are rebuilt
+CACHE_VERSION = 1
+
+# Side of the square tiles rasterized while building an entry, to keep memory bounded
+BUILD_TILE_SIZE = 4096
+
+
+def shapefile_files(shapefile_path):
+    """List the files making up a shapefile, given the .shp file or its directory."""
+    if os.path.isdir(shapefile_path):
+        directory = shapefile_path
+        stems = None
+    else:
+        directory = os.path.dirname(shapefile_path) or "."
+        stems = {os.path.splitext(os.path.basename(shapefile_path))[0]}
+
+    files = []
+    for file_name in sorted(os.listdir(directory)):
+        stem, extension = os.path.splitext(file_name)
+        if extension.lower() in SHAPEFILE_EXTENSIONS and (stems is None or stem in stems):
+            files.append(os.path.join(directory, file_name))
+    return files
+
+
+def shapefile_hash(shapefile_path):
+    """SHA-256 of the content of every file making up the shapefile."""
+    digest = hashlib.sha256()
+    for file_path in shapefile_files(shapefile_path):
+        digest.update(os.path.basename(file_path).encode())
+        with open(file_path, "rb") as handle:
+            for chunk in iter(lambda: handle.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def entry_metadata(dataset, shapefile_path, name_field):
+    """Everything a cache entry depends on, as stored in its meta.json."""
+    transform, shape, crs = grid_key(dataset)
+    return {
+        "version": CACHE_VERSION,
+        "transform": list(transform),
+        "shape": list(shape),
+        "crs": crs,
+        "shapefile": os.path.abspath(shapefile_path),
+        "shapefile_sha256": shapefile_hash(shapefile_path),
+        "name_field": name_field,
+    }
+
+
+def entry_key(meta):
+    """Directory name of the cache entry for the given metadata."""
+    fields = {field: value for field, value in meta.items() if field != "shapefile"}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()[:20]
+
+
+def read_entry(entry_dir, meta):
+    """Memory-map a cache entry, or return None if it is missing, incomplete or stale."""
+    try:
+        with open(os.path.join(entry_dir, "meta.json")) as handle:
+            stored = json.load(handle)
+        if {field: value for field, value in stored.items() if field != "shapefile"} != \
+                {field: value for field, value in meta.items() if field != "shapefile"}:
+            return None
+
+        labels = np.load(os.path.join(entry_dir, "labels.npy"), mmap_mode="r")
+        table = pd.read_csv(os.path.join(entry_dir, "countries.csv"), keep_default_na=False)
+    except (OSError, ValueError):
+        return None
+
+    if labels.dtype != np.uint16 or list(labels.shape) != meta["shape"]:
+        return None
+
+    names = np.empty(len(table) + 1, dtype=object)
+    names[table["id"].to_numpy()] = table["country"].to_numpy()
+    return labels, names
+
+
+def remove_superseded(cache_dir, meta, keep):
+    """Delete entries built on the same grid from an older version of the same shapefile."""
+    for entry in os.listdir(cache_dir):
+        entry_dir = os.path.join(cache_dir, entry)
+        if entry == keep or not os.path.isdir(entry_dir) or entry.startswith(".tmp-"):
+            continue
+        try:
+            with open(os.path.join(entry_dir, "meta.json")) as handle:
+                stored = json.load(handle)
+        except (OSError, ValueError):
+            continue
+
+        same_source = all(
+            stored.get(field) == meta[field]
+            for field in ("transform", "shape", "crs", "shapefile", "name_field")
+        )
+        if same_source:
+            print(f"Removing stale label raster {entry_dir}")
+            shutil.rmtree(entry_dir, ignore_errors=True)
+
+
+def build_entry(dataset, countries, meta, cache_dir, entry_dir, name_field):
+    """Rasterize the countries tile by tile into a new entry, then move it into place."""
+    tmp_dir = tempfile.mkdtemp(dir=cache_dir, prefix=".tmp-")
+    try:
+        name_to_id, names = country_ids(countries, name_field)
+        if len(names) > np.iinfo(np.uint16).max:
+            raise ValueError(f"{len(names) - 1} countries do not fit in a uint16 label raster.")
+
+        labels = np.lib.format.open_memmap(
+            os.path.join(tmp_dir, "labels.npy"), mode="w+", dtype=np.uint16,
+            shape=(dataset.height, dataset.width),
+        )
+        for window in iter_windows(dataset, BUILD_TILE_SIZE):
+            rows, cols = window.toslices()
+            labels[rows, cols] = window_labels(dataset, window, countries, name_to_id, name_field)
+        labels.flush()
+        del labels
+
+        pd.DataFrame({"id": np.arange(1, len(names)), "country": names[1:]}).to_csv(
+            os.path.join(tmp_dir, "countries.csv"), index=False
+        )
+        # meta.json is written last: an entry without it is treated as incomplete
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as handle:
+            json.dump(meta, handle, indent=2)
+
+        if read_entry(entry_dir, meta) is not None:
+            # Another worker finished the same entry first; keep theirs
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmp_dir, entry_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def load_label_raster(dataset, shapefile_path, get_countries, cache_dir, name_field="COUNTRY"):
+    """
+    Return the memory-mapped label raster and ID -> country names for `dataset`'s grid.
+
+    `get_countries` is only called (to read and reproject the shapefile) when the entry has
+    to be built.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    meta = entry_metadata(dataset, shapefile_path, name_field)
+    key = entry_key(meta)
+    entry_dir = os.path.join(cache_dir, key)
+
+    cached = read_entry(entry_dir, meta)
+    if cached is not None:
+        return cached
+
+    print(f"Building label raster {entry_dir}...")
+    remove_superseded(cache_dir, meta, keep=key)
+    build_entry(dataset, get_countries(), meta, cache_dir, entry_dir, name_field)
+
+    cached = read_entry(entry_dir, meta)
+    if cached is None:
+        raise RuntimeError(f"Label raster cache entry {entry_dir} could not be read back.")
+    return cached
@@ -0,0 +1,361 @@
+"""
+Script Name: monthly_composite.py
+
+Description:
+    Builds annual or seasonal composites from monthly VIIRS DNB rasters and aggregates them by
+    country. Each month has an average radiance raster (`*.avg_rade9h.tif`) and, usually, a
+    cloud-free observation count raster (`*.cf_cvg.tif`), named as distributed by the Earth
+    Observation Group, e.g.
+
+        SVDNB_npp_20190101-20190131_75N060W_vcmcfg_v10_c201905191000.avg_rade9h.tif
+        SVDNB_npp_20190101-20190131_75N060W_vcmcfg_v10_c201905191000.cf_cvg.tif
+
+    The months of a period (a year, or a season: DJF with the previous December, MAM, JJA,
+    SON) are streamed as a stack, one window at a time: the same window is read from every
+    month, pixel-months without a cloud-free observation (or NaN / nodata) are masked, and the
+    window's composites are computed:
+    - mean: the mean radiance over the valid months
+    - median: the median radiance over the valid months
+    - weighted: the mean weighted by the number of cloud-free observations of each month
+    The composite windows go through the same per-country reduction as the annual GeoTIFFs
+    (`ntl_extraction.py`), and the partial sums are merged, so only one window of the stack is
+    in memory at a time and every raster is read once: the work grows linearly with the number
+    of months. The tiles of a month (e.g. the six 75N060W ... 00N180W tiles) are processed in
+    turn and added up.
+
+    The output is one `country,dn` table per statistic and period, in the format of the
+    yearly aggregates, so the annual composites can be fed to `02-data_cleaning.py` like the
+    output of `01-data_extraction.py`.
+
+Author:
+    Shamayla Durrin Islam
+    shamayla.islam@mail.utoronto.ca
+
+Date:
+    Created: October 17, 2026
+
+Dependencies:
+    - Python 3.8 or higher
+    - numpy
+    - pandas >= 1.3
+    - geopandas >= 0.9
+    - rasterio >= 1.2
+
+Usage:
+    Annual composites of every year in data/01-raw_data/08-monthlytiffiles:
+        python scripts/monthly_composite.py
+    Seasonal median composites through bounded memory, keeping seasons with 2 of 3 months:
+        python scripts/monthly_composite.py --period seasonal --statistics median \
+            --min-months 2 --max-memory 512M
+    The annual tables of one statistic are yearly aggregates:
+        data/02-analysis_data/06-monthlycomposites/<statistic>/<year>.csv
+"""
+
+import argparse
+import os
+import re
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import rasterio
+
+from atomic_io import write_csv_atomic
+from label_cache import load_label_raster
+from ntl_extraction import (
+    WINDOW_BYTES_PER_PIXEL,
+    grid_key,
+    iter_windows,
+    load_countries,
+    parse_size,
+    reduce_window,
+    row_areas,
+    totals_frame,
+)
+from raster_cache import open_raster
+from zonal_stats import ZoneLayer
+
+# Define default file paths
+input_dir = "data/01-raw_data/08-monthlytiffiles"  # Directory with the monthly radiance and cloud-free rasters
+shapefile_path = "data/01-raw_data/02-shapefile"  # Shapefile path
+output_dir = "data/02-analysis_data/06-monthlycomposites"  # Directory for the per-period CSV files
+label_cache_dir = "data/01-raw_data/06-labelcache"  # Directory for the cached label rasters
+raster_cache_dir = "data/01-raw_data/09-rastercache"  # Directory for the decoded, memory-mapped rasters
+
+# Monthly VIIRS DNB files: SVDNB_npp_<start>-<end>_<tile>_<config>_<version>.<avg_rade9h|cf_cvg>.tif
+MONTHLY_PATTERN = re.compile(
+    r"^SVDNB_npp_(?P<year>\d{4})(?P<month>\d{2})\d{2}-\d{8}_(?P<tile>[^_.]+)_[^.]*"
+    r"\.(?P<kind>avg_rade9h?|cf_cvg)\.tif$"
+)
+
+STATISTICS = ("mean", "median", "weighted")
+
+# Meteorological seasons; December counts towards the DJF of the following year
+SEASONS = {"DJF": (12, 1, 2), "MAM": (3, 4, 5), "JJA": (6, 7, 8), "SON": (9, 10, 11)}
+PERIOD_MONTHS = {"annual": 12, "seasonal": 3}
+
+# Bytes held per pixel of a window on top of the stack: the running sums, counts and weights,
+# the composite and the valid mask
+ACCUMULATOR_BYTES_PER_PIXEL = 5 * 8 + 1
+
+
+def discover_months(input_dir):
+    """Map each (tile, year, month) to its `radiance` raster and, when present, its `cloud_free` count raster."""
+    months = {}
+    for file_name in sorted(os.listdir(input_dir)):
+        match = MONTHLY_PATTERN.match(file_name)
+        if match is None:
+            continue
+
+        key = (match.group("tile"), int(match.group("year")), int(match.group("month")))
+        kind = "cloud_free" if match.group("kind") == "cf_cvg" else "radiance"
+        files = months.setdefault(key, {})
+        if kind in files:
+            raise ValueError(f"Found more than one {kind} raster for {key}: {files[kind]} and {file_name}.")
+        files[kind] = os.path.join(input_dir, file_name)
+
+    for key in [key for key, files in months.items() if "radiance" not in files]:
+        print(f"Skipping {key}: cloud-free counts without a radiance raster.")
+        del months[key]
+    return months
+
+
+def period_label(year, month, period):
+    """Composite period of a month: '<year>' for annual composites, '<year>-<season>' for seasonal ones."""
+    if period == "annual":
+        return str(year)
+    season = next(season for season, months in SEASONS.items() if month in months)
+    return f"{year + 1 if month == 12 else year}-{season}"
+
+
+def group_periods(months, period, min_months=None):
+    """
+    Group the discovered months into composite periods, {label: {tile: [files, ...]}}, keeping
+    the periods with at least `min_months` months (default: complete periods only).
+    """
+    min_months = PERIOD_MONTHS[period] if min_months is None else min_months
+    periods = {}
+    for (tile, year, month), files in sorted(months.items()):
+        periods.setdefault(period_label(year, month, period), {}).setdefault(tile, []).append(files)
+
+    complete = {}
+    for label, tiles in sorted(periods.items()):
+        n_months = max(len(tile_months) for tile_months in tiles.values())
+        if n_months < min_months:
+            print(f"Skipping {label}: {n_months} of {PERIOD_MONTHS[period]} months.")
+            continue
+        complete[label] = tiles
+    return complete
+
+
+def stack_tile_size(max_memory, n_months, median):
+    """Largest square window whose working set (the month stack when needed, and the accumulators) fits `max_memory`."""
+    bytes_per_pixel = (n_months * 4 if median else 4) + ACCUMULATOR_BYTES_PER_PIXEL + WINDOW_BYTES_PER_PIXEL
+    side = int(np.sqrt(max_memory / bytes_per_pixel))
+    if side < 1:
+        raise ValueError(f"A memory budget of {max_memory} bytes is too small for a single pixel.")
+    return side
+
+
+def read_window(dataset, window):
+    """One window of a monthly raster as float32, with the nodata value as NaN."""
+    band = dataset.read(1, window=window, out_dtype="float32")
+    if dataset.nodata is not None and not np.isnan(dataset.nodata):
+        band = np.where(band == dataset.nodata, np.float32(np.nan), band)
+    return band
+
+
+class WindowComposite:
+    """Running composites of one window over the months of a period."""
+
+    def __init__(self, shape, n_months, statistics):
+        self.statistics = statistics
+        self.total = np.zeros(shape)
+        self.count = np.zeros(shape)
+        self.weighted_total = np.zeros(shape)
+        self.weight = np.zeros(shape)
+        # The median needs every month of the window; the means only need running sums
+        self.stack = np.full((n_months,) + shape, np.nan, dtype="float32") if "median" in statistics else None
+
+    def add(self, month, radiance, cloud_free=None, min_cloud_free=1):
+        """Add one month of radiance, masking pixels with fewer than `min_cloud_free` cloud-free observations."""
+        valid = ~np.isnan(radiance)
+        if cloud_free is not None:
+            valid &= cloud_free >= min_cloud_free
+        values = np.where(valid, radiance, 0)
+        self.total += values
+        self.count += valid
+
+        # Without cloud-free counts every valid month weighs one
+        weight = valid if cloud_free is None else np.where(valid, cloud_free, 0)
+        self.weighted_total += values * weight
+        self.weight += weight
+        if self.stack is not None:
+            self.stack[month] = np.where(valid, radiance, np.nan)
+
+    def composite(self, statistic):
+        """Composite of the window; NaN where no month was valid."""
+        if statistic == "median":
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)  # All-NaN pixels
+                return np.nanmedian(self.stack, axis=0)
+        total, count = (self.total, self.count) if statistic == "mean" else (self.weighted_total, self.weight)
+        return np.divide(total, count, out=np.full(total.shape, np.nan), where=count > 0)
+
+
+def composite_tile(month_files, layer, n_labels, statistics, tile_size=None, max_memory=None,
+                   min_cloud_free=1, area_weighted=False, raster_cache_dir=None):
+    """
+    Composite the months of one tile window by window and reduce each composite by country.
+    Returns {statistic: (sums, counts, areas, dn_areas)} over the labels of `layer`.
+    """
+    radiance = [open_raster(files["radiance"], raster_cache_dir) for files in month_files]
+    cloud_free = [open_raster(files["cloud_free"], raster_cache_dir) if "cloud_free" in files else None
+                  for files in month_files]
+    try:
+        reference = radiance[0]
+        for dataset in radiance[1:] + [dataset for dataset in cloud_free if dataset is not None]:
+            if grid_key(dataset) != grid_key(reference):
+                raise ValueError(f"{dataset.name} is not on the grid of {reference.name}.")
+        if area_weighted and not reference.crs.is_geographic:
+            raise ValueError(f"Area weighting needs a geographic CRS, {reference.name} uses {reference.crs}.")
+        if max_memory is not None and tile_size is None:
+            tile_size = stack_tile_size(max_memory, len(month_files), "median" in statistics)
+
+        totals = {statistic: [np.zeros(n_labels), np.zeros(n_labels, dtype="int64"),
+                              np.zeros(n_labels) if area_weighted else None,
+                              np.zeros(n_labels) if area_weighted else None]
+                  for statistic in statistics}
+        for window in iter_windows(reference, tile_size):
+            shape = (int(window.height), int(window.width))
+            composite = WindowComposite(shape, len(month_files), statistics)
+            for month, (radiance_dataset, cloud_free_dataset) in enumerate(zip(radiance, cloud_free)):
+                counts = None if cloud_free_dataset is None else read_window(cloud_free_dataset, window)
+                composite.add(month, read_window(radiance_dataset, window), counts, min_cloud_free)
+
+            labels = layer.labels(reference, window)
+            row_area = row_areas(reference.transform, int(window.row_off), shape[0]) if area_weighted else None
+            for statistic in statistics:
+                partial = reduce_window(composite.composite(statistic), labels, n_labels,
+                                        reference.window_transform(window), row_area)
+                for total, value in zip(totals[statistic], partial):
+                    if total is not None:
+                        total += value
+    finally:
+        for dataset in radiance + cloud_free:
+            if dataset is not None:
+                dataset.close()
+    return totals
+
+
+def composite_period(tiles, shapefile_path, statistics, cache_dir=None, tile_size=None, max_memory=None,
+                     min_cloud_free=1, area_weighted=False, name_field="COUNTRY", raster_cache_dir=None):
+    """Country tables ({statistic: DataFrame}) of one period's composites, summed over its tiles."""
+    countries = None
+    totals, names = None, None
+    for tile, month_files in sorted(tiles.items()):
+        with rasterio.open(month_files[0]["radiance"]) as dataset:
+            if cache_dir is not None:
+                label_raster, tile_names = load_label_raster(
+                    dataset, shapefile_path, lambda: load_countries(shapefile_path, name_field), cache_dir, name_field,
+                )
+                layer = ZoneLayer("country", tile_names, label_raster=label_raster)
+            else:
+                countries = countries if countries is not None else load_countries(shapefile_path, name_field)
+                layer = ZoneLayer("country", zones=countries, name_field=name_field)
+        if names is not None and list(layer.names) != list(names):
+            raise ValueError(f"Tile {tile} was labelled with a different set of countries.")
+        names = layer.names
+
+        tile_totals = composite_tile(month_files, layer, len(names), statistics, tile_size, max_memory,
+                                     min_cloud_free, area_weighted, raster_cache_dir)
+        if totals is None:
+            totals = tile_totals
+        else:
+            for statistic in statistics:
+                for total, value in zip(totals[statistic], tile_totals[statistic]):
+                    if total is not None:
+                        total += value
+
+    return {statistic: totals_frame(sums, counts, names, np.dtype("float32"), areas, dn_areas)
+            for statistic, (sums, counts, areas, dn_areas) in totals.items()}
+
+
+def composite_job(label, tiles, output_paths, shapefile_path, statistics, cache_dir, tile_size, max_memory,
+                  min_cloud_free, area_weighted, raster_cache_dir=None):
+    """Composite one period and write its table for every statistic atomically."""
+    tables = composite_period(tiles, shapefile_path, statistics, cache_dir, tile_size, max_memory,
+                              min_cloud_free, area_weighted, raster_cache_dir=raster_cache_dir)
+    for statistic, table in tables.items():
+        write_csv_atomic(table, output_paths[statistic])
+    return label, max(len(tile_months) for tile_months in tiles.values()), len(tables[statistics[0]])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Composite monthly VIIRS rasters and aggregate them by country.")
+    parser.add_argument("--input-dir", default=input_dir,
+                        help="Directory containing the monthly *.avg_rade9h.tif and *.cf_cvg.tif files.")
+    parser.add_argument("--shapefile", default=shapefile_path, help="Country boundary shapefile.")
+    parser.add_argument("--output-dir", default=output_dir,
+                        help="Directory for the <statistic>/<period>.csv tables.")
+    parser.add_argument("--period", choices=sorted(PERIOD_MONTHS), default="annual",
+                        help="Composite the months of each year or of each season.")
+    parser.add_argument("--statistics", nargs="+", choices=STATISTICS, default=list(STATISTICS),
+                        help="Composites to compute.")
+    parser.add_argument("--min-months", type=int,
+                        help="Fewest months for a period to be composited (default: complete periods only).")
+    parser.add_argument("--min-cloud-free", type=int, default=1,
+                        help="Fewest cloud-free observations for a pixel-month to be used.")
+    parser.add_argument("--area-weighted", action="store_true",
+                        help="Also write each country's area, area-weighted DN sum and light density.")
+    parser.add_argument("--label-cache-dir", default=label_cache_dir,
+                        help="Directory for the cached country label rasters.")
+    parser.add_argument("--no-label-cache", action="store_true",
+                        help="Label each window from the shapefile instead of using the label raster cache.")
+    parser.add_argument("--raster-cache-dir", nargs="?", const=raster_cache_dir,
+                        help="Read the monthly rasters from their decoded, memory-mapped copies in this directory "
+                             f"(default when given without a value: {raster_cache_dir}).")
+    parser.add_argument("--years", type=int, nargs="+", help="Only composite the periods of these years.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of periods processed concurrently.")
+    parser.add_argument("--overwrite", action="store_true", help="Redo periods whose output already exists.")
+    parser.add_argument("--tile-size", type=int, help="Read the monthly stacks in square windows of this many pixels.")
+    parser.add_argument("--max-memory", type=parse_size,
+                        help="Size the windows so the stack fits this memory budget (per worker), e.g. 512M.")
+    args = parser.parse_args()
+    statistics = list(dict.fromkeys(args.statistics))
+
+    periods = group_periods(discover_months(args.input_dir), args.period, args.min_months)
+    if args.years:
+        periods = {label: tiles for label, tiles in periods.items() if int(label[:4]) in args.years}
+
+    # Skip periods that were already composited by a previous (possibly interrupted) run
+    jobs = []
+    for label, tiles in periods.items():
+        output_paths = {statistic: os.path.join(args.output_dir, statistic, f"{label}.csv")
+                        for statistic in statistics}
+        if all(os.path.exists(path) for path in output_paths.values()) and not args.overwrite:
+            print(f"Skipping {label}: already composited.")
+            continue
+        jobs.append((label, tiles, output_paths))
+
+    if not jobs:
+        print("Nothing to composite.")
+        return
+
+    workers = max(1, min(args.workers, len(jobs)))
+    print(f"Compositing {len(jobs)} period(s) with {workers} worker(s)...")
+    cache_dir = None if args.no_label_cache else args.label_cache_dir
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(composite_job, label, tiles, output_paths, args.shapefile, statistics, cache_dir,
+                        args.tile_size, args.max_memory, args.min_cloud_free, args.area_weighted,
+                        args.raster_cache_dir)
+            for label, tiles, output_paths in jobs
+        ]
+        for future in as_completed(futures):
+            label, n_months, n_countries = future.result()
+            print(f"Saved {label}: composites of {n_months} month(s) for {n_countries} countries.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,470 @@
+"""
+Script Name: ntl.py
+
+Description:
+    Single entry point for the whole pipeline. Instead of running the numbered scripts by hand,
+    the workflow is a DAG of nodes, each one a run of an existing script on part of the data:
+
+        extract/<year>  ->  aggregate  ->  concat  --+
+        indicators/<name> (gdp, manufacturing, ...) -+->  merge  ->  plotting
+        spi  ----------------------------------------+            models/fixed_effects
+                                                                  models/lm
+
+    - extract/<year>: 01-data_extraction.py for one year's GeoTIFF.
+    - aggregate, concat, indicators/<name>, spi, merge: the stages of 02-data_cleaning.py
+      (`--stage`), each World Bank indicator ingested separately.
+    - plotting: 03-prepareplottingdata.py.
+    - models/fixed_effects: 06-fit_fixed_effects.py; models/lm: 04-model_data.R (with Rscript).
+
+    Independent nodes run concurrently on a local pool of `--jobs` workers (one process per
+    node), and ready nodes are started in order of their critical path (the longest chain of
+    remaining work below them, timed from the previous runs), so a full rebuild takes about as
+    long as the slowest chain of nodes rather than the sum of all of them.
+
+    Every node is tracked in a manifest (`<data-dir>/.ntl/manifest.json`, see
+    `pipeline_manifest.py`) with the content hashes of its inputs, its outputs and its command.
+    A node whose inputs, command and outputs are unchanged is skipped without starting its
+    script; when a node rewrites its outputs with identical content, the nodes below it are
+    skipped as well. The scripts keep their own incremental logic (e.g. 02-data_cleaning.py
+    only re-merges the years that changed).
+
+    All paths come from one configuration rooted at the repository's `data/` tree: the
+    defaults below, optionally overridden by a JSON file (`--config`) and the command line.
+    The layout below the root is the one the scripts use, and the models are written to the
+    `models/` directory next to the root (or `--models-dir`). Each node's output is written to
+    `<data-dir>/.ntl/logs/<node>.log`, and its last lines are shown when it fails.
+
+Author:
+    Shamayla Durrin Islam
+    shamayla.islam@mail.utoronto.ca
+
+Date:
+    Created: October 17, 2026
+
+Dependencies:
+    - Python 3.8 or higher
+    - The dependencies of the scripts it runs
+    - R with Rscript on the PATH (only for the models/lm node, see `--no-r`)
+
+Usage:
+    From the repository root, rebuild whatever is out of date with one worker per CPU:
+        python scripts/ntl.py
+    Show the nodes and which ones would run:
+        python scripts/ntl.py --dry-run
+    Only the analysis dataset (and what it depends on), for two years, with 4 workers:
+        python scripts/ntl.py merge --years 2019 2020 --jobs 4
+    Recompute everything, without the R stages, with streamed extraction:
+        python scripts/ntl.py --force --no-r --config ntl.json
+
+    Configuration file (every key optional):
+        {"data_dir": "data", "years": [2019, 2020], "jobs": 8, "r": true,
+         "extract_args": ["--stream", "--tile-size", "2048"]}
+"""
+
+import argparse
+import importlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from country_names import reference_path
+from label_cache import shapefile_files
+from ntl_extraction import discover_tiffs
+from pipeline_manifest import Manifest
+from wdi_ingest import partition_dir
+
+cleaning = importlib.import_module("02-data_cleaning")
+plotting = importlib.import_module("03-prepareplottingdata")
+
+scripts_dir = os.path.dirname(os.path.abspath(__file__))
+repo_dir = os.path.dirname(scripts_dir)
+
+# Defaults of the configuration; paths are relative to the repository root
+default_config = {
+    "data_dir": "data",  # Root of the data/ tree
+    "years": None,  # Extract only these years (every GeoTIFF by default)
+    "jobs": None,  # Nodes run concurrently (default: the number of CPUs)
+    "r": True,  # Run the R node (lm models)
+    "models_dir": None,  # Directory of the fitted models (default: models/ next to the data/ tree)
+    "extract_args": [],  # Extra options of 01-data_extraction.py, e.g. ["--stream", "--tile-size", "2048"]
+}
+
+# Layout of the data/ tree, relative to its root (as used by the scripts)
+layout = {
+    "tiff_dir": "01-raw_data/01-tiffiles",
+    "shapefile": "01-raw_data/02-shapefile",
+    "legacy_dir": "01-raw_data/03-extracted",
+    "worldbank_dir": "01-raw_data/04-worldbankdata",
+    "label_cache_dir": "01-raw_data/06-labelcache",
+    "aggregated_dir": "02-analysis_data/01-aggregatedbycountry",
+    "concatenated": "02-analysis_data/02-concatenated/concatenated.csv",
+    "processed_dir": "02-analysis_data/03-worldbankdataprocessed",
+    "analysis_csv": "02-analysis_data/04-analysis/analysis.csv",
+    "analysis_parquet": "02-analysis_data/04-analysis/analysis.parquet",
+    "plotting_dir": "03-plotting_data",
+    "state_dir": ".ntl",
+}
+
+# Outputs of the models, relative to the models directory
+fixed_effects_file = "fixed_effects.json"
+lm_models = ["model1", "model2", "model3", "model4", "model_a", "model_b", "model_c", "model_d", "model_f"]
+
+# Expected duration in seconds of a node that never ran, for the critical path
+DEFAULT_SECONDS = {"extract": 60.0}
+
+# Lines of a failed node's log shown
+LOG_TAIL = 20
+
+
+class Node:
+    """One step of the pipeline: a command, the nodes it depends on, its inputs and outputs."""
+
+    def __init__(self, name, command, deps=(), inputs=list, outputs=(), env=None, instrumentation=()):
+        self.name = name
+        self.command = command + list(instrumentation)
+        self.deps = list(deps)
+        self.inputs = inputs  # Called when the node is ready, after its dependencies ran
+        self.outputs = list(outputs)
+        self.env = env or {}
+        # What the node's outputs depend on besides its inputs (the metrics options do not count)
+        self.params = {"command": command, "env": self.env}
+
+
+def files_in(directory, extensions=None):
+    """Every file below `directory` (with one of `extensions`), sorted; empty if it does not exist."""
+    files = []
+    for root, dirs, file_names in os.walk(directory):
+        dirs.sort()
+        files.extend(os.path.join(root, file_name) for file_name in sorted(file_names)
+                     if not file_name.startswith(".") and (extensions is None or file_name.lower().endswith(extensions)))
+    return files
+
+
+def load_config(config_path=None, **overrides):
+    """The default configuration, updated by a JSON file and by the non-None `overrides`."""
+    config = dict(default_config)
+    if config_path is not None:
+        with open(config_path) as handle:
+            loaded = json.load(handle)
+        unknown = set(loaded) - set(default_config)
+        if unknown:
+            raise ValueError(f"Unknown key(s) in {config_path}: {', '.join(sorted(unknown))}.")
+        config.update(loaded)
+    config.update({key: value for key, value in overrides.items() if value is not None})
+    return config
+
+
+def data_paths(data_dir):
+    """Absolute path of every entry of the layout below `data_dir`."""
+    root = os.path.join(repo_dir, data_dir)
+    return {key: os.path.normpath(os.path.join(root, path)) for key, path in layout.items()}
+
+
+def models_dir(config):
+    """Absolute path of the directory the models are written to."""
+    if config["models_dir"] is not None:
+        return os.path.normpath(os.path.join(repo_dir, config["models_dir"]))
+    return os.path.normpath(os.path.join(repo_dir, config["data_dir"], os.pardir, "models"))
+
+
+def build_dag(config, metrics=None):
+    """The nodes of the pipeline for a configuration, by name, in dependency order."""
+    paths = data_paths(config["data_dir"])
+    python = [sys.executable]
+    instrumentation = ["--metrics", metrics] if metrics else []
+    nodes = {}
+
+    def add(node):
+        nodes[node.name] = node
+
+    def script(file_name):
+        return os.path.join(scripts_dir, file_name)
+
+    # One extraction per year
+    tiffs = discover_tiffs(paths["tiff_dir"]) if os.path.isdir(paths["tiff_dir"]) else {}
+    if config["years"]:
+        tiffs = {year: path for year, path in tiffs.items() if year in set(config["years"])}
+    for year, tif_path in sorted(tiffs.items()):
+        add(Node(
+            f"extract/{year}",
+            python + [script("01-data_extraction.py"), "--years", str(year), "--overwrite",
+                      "--input-dir", paths["tiff_dir"], "--shapefile", paths["shapefile"],
+                      "--output-dir", paths["aggregated_dir"], "--label-cache-dir", paths["label_cache_dir"],
+                      *config["extract_args"]],
+            inputs=lambda tif_path=tif_path: [tif_path] + shapefile_files(paths["shapefile"]),
+            outputs=[os.path.join(paths["aggregated_dir"], f"{year}.csv")],
+            instrumentation=instrumentation,
+        ))
+    extracts = list(nodes)
+
+    # The stages of 02-data_cleaning.py
+    clean = python + [script("02-data_cleaning.py"), "--data-dir", os.path.join(repo_dir, config["data_dir"])]
+    reference = reference_path
+    add(Node("aggregate", clean + ["--stage", "aggregate"], deps=extracts,
+             inputs=lambda: files_in(paths["legacy_dir"], ".csv"), instrumentation=instrumentation))
+    add(Node("concat", clean + ["--stage", "concatenate"], deps=["aggregate"],
+             inputs=lambda: files_in(paths["aggregated_dir"], ".csv") + [reference],
+             outputs=[paths["concatenated"]], instrumentation=instrumentation))
+
+    raw_tables = []
+    for name, raw_file in cleaning.world_bank_indicators.items():
+        raw_path = os.path.join(paths["worldbank_dir"], raw_file)
+        raw_tables.append(raw_path)
+        add(Node(f"indicators/{name}", clean + ["--stage", "worldbank", "--indicator", name],
+                 inputs=lambda raw_path=raw_path: [raw_path, reference],
+                 outputs=[partition_dir(os.path.join(paths["processed_dir"], "indicators"), name)],
+                 instrumentation=instrumentation))
+    rating_path = os.path.join(paths["processed_dir"], "ratingonSPI.csv")
+    add(Node("spi", clean + ["--stage", "spi"],
+             inputs=lambda: [os.path.join(paths["worldbank_dir"], "SPI.csv"), reference], outputs=[rating_path],
+             instrumentation=instrumentation))
+
+    add(Node("merge", clean + ["--stage", "merge"],
+             deps=["concat", "spi"] + [f"indicators/{name}" for name in cleaning.world_bank_indicators],
+             inputs=lambda: [paths["concatenated"], *raw_tables, rating_path, reference],
+             outputs=[paths["analysis_csv"], paths["analysis_parquet"]], instrumentation=instrumentation))
+
+    # Plotting data and models, all from the analysis dataset
+    analysis = [paths["analysis_parquet"]]
+    model_dir = models_dir(config)
+    r_env = {"NTL_DATA_DIR": os.path.join(repo_dir, config["data_dir"]), "NTL_MODELS_DIR": model_dir}
+    add(Node("models/fixed_effects",
+             python + [script("06-fit_fixed_effects.py"), "--input", paths["analysis_parquet"],
+                       "--output", os.path.join(model_dir, fixed_effects_file)],
+             deps=["merge"], inputs=lambda: analysis, outputs=[os.path.join(model_dir, fixed_effects_file)]))
+    add(Node("plotting",
+             python + [script("03-prepareplottingdata.py"), "--input", paths["analysis_parquet"],
+                       "--output-dir", paths["plotting_dir"]],
+             deps=["merge"], inputs=lambda: analysis + [reference],
+             outputs=list(plotting.table_paths(paths["plotting_dir"]).values())))
+    if config["r"]:
+        add(Node("models/lm", ["Rscript", script("04-model_data.R")], deps=["merge"], inputs=lambda: analysis,
+                 outputs=[os.path.join(model_dir, f"{model}.rds") for model in lm_models], env=r_env))
+    return nodes
+
+
+def select(nodes, targets):
+    """Names of the nodes named (or prefixed, e.g. `extract`) by `targets` and of all their dependencies."""
+    if not targets:
+        return set(nodes)
+
+    selected = set()
+    for target in targets:
+        matches = [name for name in nodes if name == target or name.startswith(target.rstrip("/") + "/")]
+        if not matches:
+            raise ValueError(f"Unknown node '{target}'. Nodes: {', '.join(nodes)}.")
+        selected.update(matches)
+
+    stack = list(selected)
+    while stack:
+        for dep in nodes[stack.pop()].deps:
+            if dep not in selected:
+                selected.add(dep)
+                stack.append(dep)
+    return selected
+
+
+def critical_paths(nodes, selected, manifest):
+    """
+    For every selected node, the expected seconds of the longest chain of nodes starting with
+    it, from the durations recorded in the manifest.
+    """
+    children = {name: [] for name in selected}
+    for name in selected:
+        for dep in nodes[name].deps:
+            children[dep].append(name)
+
+    lengths = {}
+
+    def length(name):
+        if name not in lengths:
+            seconds = manifest.extra(name).get("seconds", DEFAULT_SECONDS.get(name.split("/")[0], 1.0))
+            lengths[name] = seconds + max((length(child) for child in children[name]), default=0.0)
+        return lengths[name]
+
+    for name in selected:
+        length(name)
+    return lengths
+
+
+def run_node(node, manifest, force, log_dir):
+    """
+    Run one node unless its inputs, command and outputs are unchanged. Returns (status, inputs,
+    seconds): status is "cached", "done" or "failed".
+    """
+    inputs = node.inputs()
+    log_path = os.path.join(log_dir, node.name.replace("/", "-") + ".log")
+    missing = [path for path in inputs if not os.path.exists(path)]
+    if missing:
+        with open(log_path, "w") as log:
+            log.write(f"ntl: missing input(s) {', '.join(missing)}\n")
+        return "failed", inputs, 0.0
+
+    if not force and not manifest.is_stale(node.name, inputs, node.outputs, node.params):
+        return "cached", inputs, 0.0
+
+    start = time.perf_counter()
+    with open(log_path, "w") as log:
+        returncode = subprocess.call(node.command, cwd=repo_dir, env={**os.environ, **node.env},
+                                     stdout=log, stderr=subprocess.STDOUT)
+    seconds = time.perf_counter() - start
+    if returncode != 0:
+        return "failed", inputs, seconds
+
+    missing = [path for path in node.outputs if not os.path.exists(path)]
+    if missing:
+        with open(log_path, "a") as log:
+            log.write(f"\nntl: the node did not write {', '.join(missing)}\n")
+        return "failed", inputs, seconds
+    return "done", inputs, seconds
+
+
+def show_log_tail(node, log_dir):
+    """Print the last lines of a node's log."""
+    log_path = os.path.join(log_dir, node.name.replace("/", "-") + ".log")
+    with open(log_path, errors="replace") as handle:
+        lines = handle.readlines()[-LOG_TAIL:]
+    print(f"--- last lines of {log_path} ---")
+    print("".join(lines).rstrip())
+    print("---")
+
+
+def run(nodes, selected, manifest, jobs, force=False, keep_going=False, log_dir=None, recorder=None):
+    """
+    Run the selected nodes, each once all its dependencies succeeded, up to `jobs` at a time
+    and the ready node with the longest critical path first. The inputs of the nodes are
+    hashed from the pool threads, the manifest is only written from this one. Returns the
+    names of the nodes that failed or did not run (because a dependency failed).
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    priority = critical_paths(nodes, selected, manifest)
+    waiting = {name: {dep for dep in nodes[name].deps if dep in selected} for name in selected}
+    ready = [name for name, deps in waiting.items() if not deps]
+    succeeded = set()
+    failed = False
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while ready or running:
+            ready.sort(key=lambda name: priority[name])
+            while ready and len(running) < jobs and (keep_going or not failed):
+                name = ready.pop()
+                running[pool.submit(run_node, nodes[name], manifest, force, log_dir)] = name
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                node = nodes[name]
+                status, inputs, seconds = future.result()
+                progress = f"[{len(succeeded) + 1}/{len(selected)}]"
+
+                if status == "failed":
+                    failed = True
+                    print(f"{progress} {name} failed after {seconds:.1f}s")
+                    show_log_tail(node, log_dir)
+                else:
+                    if status == "done":
+                        manifest.record(name, inputs, node.outputs, node.params,
+                                        extra={"seconds": round(seconds, 3)})
+                        print(f"{progress} {name} done in {seconds:.1f}s")
+                    else:
+                        print(f"{progress} {name} up to date")
+                    succeeded.add(name)
+                    for child, deps in waiting.items():
+                        if name in deps:
+                            deps.discard(name)
+                            if not deps:
+                                ready.append(child)
+
+                if recorder is not None:
+                    recorder.emit({"event": "node", "name": name, "status": status, "wall_s": round(seconds, 6)})
+
+    return selected - succeeded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the pipeline as a DAG of cached, concurrent nodes.")
+    parser.add_argument("targets", nargs="*",
+                        help="Nodes to bring up to date, with their dependencies (e.g. merge, extract, models); "
+                             "all by default.")
+    parser.add_argument("--config", help="JSON configuration file (see the defaults in this script).")
+    parser.add_argument("--data-dir", help="Root of the data/ tree, relative to the repository.")
+    parser.add_argument("--models-dir", help="Directory of the fitted models, relative to the repository "
+                                             "(default: models/ next to the data/ tree).")
+    parser.add_argument("--years", type=int, nargs="+", help="Only extract these years.")
+    parser.add_argument("--jobs", type=int, help="Nodes run concurrently (default: the number of CPUs).")
+    parser.add_argument("--no-r", action="store_true", help="Leave out the R node (models/lm).")
+    parser.add_argument("--force", action="store_true", help="Run every selected node, even if up to date.")
+    parser.add_argument("--keep-going", action="store_true",
+                        help="After a node fails, keep running the nodes that do not depend on it.")
+    parser.add_argument("--dry-run", action="store_true", help="List the selected nodes and whether they would run.")
+    parser.add_argument("--metrics", nargs="?", const=os.path.join("others", "metrics", "ntl.jsonl"),
+                        help="Append the metrics of every node (and of the Python scripts' stages) to this JSON "
+                             "lines file.")
+    args = parser.parse_args()
+
+    config = load_config(args.config, data_dir=args.data_dir, models_dir=args.models_dir, years=args.years,
+                         jobs=args.jobs, r=False if args.no_r else None)
+    if config["r"] and shutil.which("Rscript") is None:
+        print("Rscript was not found: leaving out the R node (models/lm).")
+        config["r"] = False
+
+    metrics = os.path.join(repo_dir, args.metrics) if args.metrics else None
+    nodes = build_dag(config, metrics)
+    try:
+        selected = select(nodes, args.targets)
+    except ValueError as error:
+        parser.error(str(error))
+
+    paths = data_paths(config["data_dir"])
+    manifest = Manifest(os.path.join(paths["state_dir"], "manifest.json"))
+
+    if args.dry_run:
+        will_run = set()
+        for name in (name for name in nodes if name in selected):
+            node = nodes[name]
+            deps = [dep for dep in node.deps if dep in selected]
+            inputs = node.inputs()
+            missing = [path for path in inputs if not os.path.exists(path)]
+            if missing and not will_run & set(deps):
+                # Nothing upstream will write them: the node would fail
+                status = "missing"
+            elif args.force or missing or manifest.is_stale(name, inputs, node.outputs, node.params):
+                will_run.add(name)
+                status = "run"
+            elif will_run & set(deps):
+                # Runs only if a dependency changes its outputs
+                will_run.add(name)
+                status = "maybe"
+            else:
+                status = "up to date"
+            print(f"{status:>10}  {name}" + (f"  <- {', '.join(deps)}" if deps else "")
+                  + (f"  (missing {', '.join(missing)})" if status == "missing" else ""))
+        return
+
+    recorder = None
+    if metrics:
+        from instrumentation import configure
+
+        recorder = configure(metrics=metrics)
+
+    jobs = max(1, config["jobs"] or os.cpu_count() or 1)
+    print(f"Running {len(selected)} node(s) with {jobs} worker(s)...")
+    start = time.perf_counter()
+    not_run = run(nodes, selected, manifest, jobs, force=args.force, keep_going=args.keep_going,
+                 log_dir=os.path.join(paths["state_dir"], "logs"), recorder=recorder)
+    elapsed = time.perf_counter() - start
+
+    if not_run:
+        sys.exit(f"{len(not_run)} node(s) failed or were not run: {', '.join(sorted(not_run))} ({elapsed:.1f}s).")
+    print(f"Pipeline up to date in {elapsed:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
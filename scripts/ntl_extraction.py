@@ -0,0 +1,391 @@
+"""
+Script Name: ntl_extraction.py
+
+Description:
+    Vectorized extraction engine used by `01-data_extraction.py`. Instead of walking every
+    pixel of a GeoTIFF and spatially joining one point per lit pixel, the country shapefile
+    is rasterized once onto the raster grid to give a country-ID label raster. The DN values
+    are then reduced by country with `np.bincount` over the label array.
+
+    A pixel is assigned to the country whose polygon contains its centre, which is the same
+    rule as the point-in-polygon spatial join used previously. As before, pixels with a DN
+    of 0 or NaN are ignored and pixels outside every polygon are dropped.
+
+    In streaming mode the raster is read one window at a time (its native blocks or square
+    tiles of a configurable size). Each window is labelled and reduced to per-country partial
+    sums and counts, which are merged at the end, so peak memory depends on the window size
+    and not on the size of the raster.
+
+    Optionally the totals are also area-weighted. An EPSG:4326 pixel covers less ground the
+    further it is from the equator, so the area of every raster row is computed once on the
+    sphere (R^2 * dlon * (sin(lat_top) - sin(lat_bottom))) and broadcast over the row. This
+    gives each country's area (area_km2), its area-weighted DN sum (dn_area, in DN x km2) and
+    its light density (dn_density = dn_area / area_km2, the DN per km2 of country).
+
+Author:
+    Shamayla Durrin Islam
+    shamayla.islam@mail.utoronto.ca
+
+Date:
+    Created: October 17, 2026
+
+Dependencies:
+    - Python 3.8 or higher
+    - numpy
+    - pandas >= 1.3
+    - geopandas >= 0.9
+    - rasterio >= 1.2
+
+Usage:
+    from ntl_extraction import load_countries, extract_country_totals
+
+    countries = load_countries("data/01-raw_data/02-shapefile")
+    totals = extract_country_totals("Harmonized_DN_NTL_2019_simVIIRS.tif", countries)
+
+    # Bounded-memory variant reading 2048 x 2048 tiles
+    totals = extract_country_totals(
+        "Harmonized_DN_NTL_2019_simVIIRS.tif", countries, stream=True, tile_size=2048
+    )
+
+    # Reading the decoded copy from the raster cache, four windows at a time
+    totals = extract_country_totals(
+        "Harmonized_DN_NTL_2019_simVIIRS.tif", countries, stream=True,
+        raster_cache_dir="data/01-raw_data/09-rastercache", threads=4
+    )
+"""
+
+import os
+import re
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from rasterio.features import rasterize
+from rasterio.windows import Window, bounds as window_bounds
+from shapely.geometry import box
+
+from instrumentation import count, progress, timed
+from raster_cache import map_windows, open_raster
+
+# Approximate bytes held per pixel of a window while it is reduced: the label array (uint16),
+# the lit mask, the gathered label indices (int64) and the gathered weights (float64),
+# on top of the DN values themselves.
+WINDOW_BYTES_PER_PIXEL = 2 + 1 + 8 + 8
+
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+
+# Mean Earth radius (IUGG), used for the pixel areas
+EARTH_RADIUS_KM = 6371.0088
+
+# Harmonized NTL files are named e.g. Harmonized_DN_NTL_2019_simVIIRS.tif
+TIFF_PATTERN = re.compile(r"^Harmonized_DN_NTL_(\d{4})_.*\.tif$")
+
+
+def load_countries(shapefile_path, name_field="COUNTRY"):
+    """Read the boundary shapefile, reprojected to EPSG:4326, keeping only name and geometry."""
+    shapefile = gpd.read_file(shapefile_path)
+
+    # Reproject the shapefile to EPSG:4326 if necessary
+    if shapefile.crs.to_epsg() != 4326:
+        print("Reprojecting shapefile to EPSG:4326...")
+        shapefile = shapefile.to_crs(epsg=4326)
+    else:
+        print("Shapefile is already in EPSG:4326.")
+
+    return shapefile[[name_field, "geometry"]]
+
+
+def country_ids(countries, name_field="COUNTRY"):
+    """
+    Assign one label per distinct country name.
+
+    Returns the name -> label lookup and the array of country names indexed by label. Label 0
+    is reserved for pixels outside every polygon.
+    """
+    # One ID per distinct country name so that the bincount directly gives country totals
+    names = np.array(sorted(countries[name_field].dropna().unique()), dtype=object)
+    name_to_id = {name: i + 1 for i, name in enumerate(names)}
+    return name_to_id, np.concatenate([[None], names])
+
+
+def rasterize_labels(countries, name_to_id, transform, shape, name_field="COUNTRY"):
+    """Burn the country polygons onto a grid as a uint16 label array."""
+    shapes = [
+        (geometry, name_to_id[name])
+        for geometry, name in zip(countries.geometry, countries[name_field])
+        if geometry is not None and name in name_to_id
+    ]
+    if not shapes:
+        return np.zeros(shape, dtype="uint16")
+
+    return rasterize(
+        shapes,
+        out_shape=shape,
+        transform=transform,
+        fill=0,
+        dtype="uint16",
+        all_touched=False,  # Pixel centre inside the polygon, as with the point join
+    )
+
+
+def build_label_raster(countries, transform, shape, name_field="COUNTRY"):
+    """
+    Burn the country polygons onto the raster grid.
+
+    Returns a uint16 label array of the given shape and the array of country names indexed by
+    label. Label 0 is reserved for pixels outside every polygon.
+    """
+    name_to_id, names = country_ids(countries, name_field)
+    labels = rasterize_labels(countries, name_to_id, transform, shape, name_field)
+    return labels, names
+
+
+def window_labels(dataset, window, countries, name_to_id, name_field="COUNTRY"):
+    """Label the pixels of one raster window, burning only the polygons that overlap it."""
+    extent = box(*window_bounds(window, dataset.transform))
+    overlapping = countries.iloc[countries.sindex.query(extent, predicate="intersects")]
+    return rasterize_labels(
+        overlapping,
+        name_to_id,
+        dataset.window_transform(window),
+        (int(window.height), int(window.width)),
+        name_field,
+    )
+
+
+def parse_size(text):
+    """Parse a memory size such as `512M`, `2G` or `1048576` into bytes."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMG]?)i?B?\s*", str(text).upper())
+    if match is None:
+        raise ValueError(f"Unable to parse memory size '{text}'.")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2)])
+
+
+def tile_size_for_memory(max_memory, dtype):
+    """Largest square tile side whose working set stays within `max_memory` bytes."""
+    bytes_per_pixel = np.dtype(dtype).itemsize + WINDOW_BYTES_PER_PIXEL
+    side = int(np.sqrt(max_memory / bytes_per_pixel))
+    if side < 1:
+        raise ValueError(f"A memory budget of {max_memory} bytes is too small for a single pixel.")
+    return side
+
+
+def iter_windows(dataset, tile_size=None):
+    """Yield the raster's native block windows, or square tiles of `tile_size` pixels."""
+    if tile_size is None:
+        for _, window in dataset.block_windows(1):
+            yield window
+        return
+
+    for row_off in range(0, dataset.height, tile_size):
+        for col_off in range(0, dataset.width, tile_size):
+            yield Window(
+                col_off,
+                row_off,
+                min(tile_size, dataset.width - col_off),
+                min(tile_size, dataset.height - row_off),
+            )
+
+
+def discover_tiffs(input_dir):
+    """Map each year to its `Harmonized_DN_NTL_<year>_*.tif` file in `input_dir`."""
+    tiffs = {}
+    for file_name in sorted(os.listdir(input_dir)):
+        match = TIFF_PATTERN.match(file_name)
+        if match is None:
+            continue
+
+        year = int(match.group(1))
+        if year in tiffs:
+            raise ValueError(f"Found more than one GeoTIFF for {year}: {tiffs[year]} and {file_name}.")
+        tiffs[year] = os.path.join(input_dir, file_name)
+    return tiffs
+
+
+def lit_mask(band):
+    """Pixels with a valid, non-zero DN (NaN and 0 are skipped, as in the original pixel loop)."""
+    if np.issubdtype(band.dtype, np.floating):
+        return ~np.isnan(band) & (band != 0)
+    return band != 0
+
+
+def reduce_by_label(band, labels, n_labels):
+    """Sum the lit DN values and count the lit pixels of `band` for every label."""
+    labels = labels.ravel()
+    band = band.ravel()
+    lit = lit_mask(band)
+
+    sums = np.bincount(labels[lit], weights=band[lit], minlength=n_labels)
+    counts = np.bincount(labels[lit], minlength=n_labels)
+    return sums, counts
+
+
+def row_areas(transform, row_off, height):
+    """Area in km2 of one pixel of each of `height` rows starting at `row_off`, on an EPSG:4326 grid."""
+    if transform.b != 0 or transform.d != 0:
+        raise ValueError("Pixel areas need a north-up raster grid (no rotation).")
+    edges = np.radians(transform.f + transform.e * np.arange(row_off, row_off + height + 1))
+    return EARTH_RADIUS_KM ** 2 * np.radians(abs(transform.a)) * np.abs(np.diff(np.sin(edges)))
+
+
+def reduce_area_by_label(band, labels, n_labels, row_area):
+    """Area of every label and area-weighted sum of its lit DN values, given each row's pixel area."""
+    pixel_area = np.broadcast_to(row_area[:, None], band.shape).ravel()
+    labels = labels.ravel()
+    band = band.ravel()
+    lit = lit_mask(band)
+
+    areas = np.bincount(labels, weights=pixel_area, minlength=n_labels)
+    dn_areas = np.bincount(labels[lit], weights=band[lit] * pixel_area[lit], minlength=n_labels)
+    return areas, dn_areas
+
+
+def reduce_window(band, labels, n_labels, transform, row_area=None, coverage=None):
+    """
+    Per-label DN sums and lit pixel counts of one window, plus the areas and area-weighted DN
+    sums when `row_area` is given. With a `coverage` (see `border_coverage.py`) the boundary
+    pixels are split between countries by their coverage fractions instead of their centre.
+    """
+    if coverage is not None:
+        return coverage.reduce(band, labels, n_labels, transform, row_area)
+
+    sums, counts = reduce_by_label(band, labels, n_labels)
+    if row_area is None:
+        return sums, counts, None, None
+    areas, dn_areas = reduce_area_by_label(band, labels, n_labels, row_area)
+    return sums, counts, areas, dn_areas
+
+
+def totals_frame(sums, counts, names, dtype, areas=None, dn_areas=None):
+    """
+    Turn per-label sums into the `country,dn` aggregate table written for each year, with the
+    area-weighted columns when `areas` and `dn_areas` are given.
+    """
+    # Drop label 0 (no country) and countries without a single lit pixel
+    keep = counts > 0
+    keep[0] = False
+
+    dn = sums[keep]
+    if np.issubdtype(dtype, np.integer) and np.issubdtype(counts.dtype, np.integer):
+        # Whole pixels only: integer rasters sum to integers (fractional coverage does not)
+        dn = np.rint(dn).astype("int64")
+
+    result = pd.DataFrame({"country": names[keep], "dn": dn})
+    if areas is not None:
+        result["area_km2"] = areas[keep]
+        result["dn_area"] = dn_areas[keep]
+        result["dn_density"] = dn_areas[keep] / areas[keep]
+    return result.sort_values("country", ignore_index=True)
+
+
+def grid_key(dataset):
+    """Hashable description of a raster grid: its transform, shape and CRS."""
+    return tuple(dataset.transform)[:6], (dataset.height, dataset.width), dataset.crs.to_string()
+
+
+def extract_country_totals(file_path, countries, name_field="COUNTRY", stream=False, tile_size=None,
+                           labels=None, pixel_writer=None, zonal=None, area_weighted=False, coverage=None,
+                           raster_cache_dir=None, threads=None):
+    """
+    Aggregate the first band of a GeoTIFF into total DN per country.
+
+    With `stream=True` the band is read and reduced window by window (native blocks, or
+    `tile_size` x `tile_size` tiles) instead of being loaded whole. `labels` can be a
+    precomputed `(label_raster, names)` pair covering the raster grid, e.g. one memory-mapped
+    from `label_cache.py` or shared between years; otherwise the labels are rasterized from
+    `countries`.
+
+    The per-country totals are computed directly from the raster; no pixel-level table is
+    built. If a `pixel_writer` (see `pixel_export.py`) is given, the lit pixels of every
+    window are also handed to it for export, and if `zonal` statistics (see `zonal_stats.py`)
+    are given, every window is also added to them in the same pass.
+
+    With `area_weighted=True` the table also gets each country's area, area-weighted DN sum
+    and light density; the raster must be on a geographic (longitude/latitude) grid. With a
+    `coverage` (see `border_coverage.py`) pixels straddling a border are split between the
+    countries they overlap; the pixel export and zonal statistics keep the centre labels.
+
+    With a `raster_cache_dir` the GeoTIFF is read from its decoded, memory-mapped copy (see
+    `raster_cache.py`), decoding it on first use; in streaming mode the windows of a cached
+    raster are then read and reduced by `threads` threads.
+
+    The time spent reading, labelling and reducing the windows (and exporting the pixels and
+    updating the zonal statistics) and the number of pixels are added to the open
+    instrumentation span (see `instrumentation.py`), and streaming reports its progress.
+    """
+    with open_raster(file_path, raster_cache_dir) as dataset:
+        dtype = np.dtype(dataset.dtypes[0])
+        if area_weighted and not dataset.crs.is_geographic:
+            raise ValueError(f"Area weighting needs a geographic CRS, {file_path} uses {dataset.crs}.")
+
+        if not stream:
+            with timed("read"):
+                band = dataset.read(1)
+            with timed("label"):
+                if labels is None:
+                    labels = build_label_raster(countries, dataset.transform, band.shape, name_field)
+                label_raster, names = labels
+                label_raster = np.asarray(label_raster)
+            if pixel_writer is not None:
+                with timed("pixel_export"):
+                    pixel_writer.write(band, label_raster, dataset.transform)
+            if zonal is not None:
+                with timed("zonal"):
+                    zonal.update(band, dataset, primary_labels=label_raster)
+
+            with timed("reduce"):
+                row_area = row_areas(dataset.transform, 0, dataset.height) if area_weighted else None
+                sums, counts, areas, dn_areas = reduce_window(band, label_raster, len(names), dataset.transform,
+                                                              row_area, coverage)
+            count(pixels=band.size)
+            return totals_frame(sums, counts, names, dtype, areas, dn_areas)
+
+        if labels is None:
+            name_to_id, names = country_ids(countries, name_field)
+            countries.sindex  # Build the spatial index before windows are labelled (possibly from threads)
+        else:
+            label_raster, names = labels
+        sums = np.zeros(len(names))
+        counts = np.zeros(len(names), dtype="int64" if coverage is None else "float64")
+        areas = np.zeros(len(names)) if area_weighted else None
+        dn_areas = np.zeros(len(names)) if area_weighted else None
+
+        def read_and_reduce(window):
+            with timed("read"):
+                band = dataset.read(1, window=window)
+            with timed("label"):
+                if labels is None:
+                    window_label = window_labels(dataset, window, countries, name_to_id, name_field)
+                else:
+                    rows, cols = window.toslices()
+                    window_label = np.asarray(label_raster[rows, cols])
+            with timed("reduce"):
+                row_area = (row_areas(dataset.transform, int(window.row_off), int(window.height))
+                            if area_weighted else None)
+                partial = reduce_window(band, window_label, len(names), dataset.window_transform(window), row_area,
+                                        coverage)
+            return window, band, window_label, partial
+
+        # Only rasters read from the cache can be read from several threads
+        threads = threads if getattr(dataset, "thread_safe", False) else None
+        windows = map_windows(read_and_reduce, iter_windows(dataset, tile_size), threads)
+        with progress(os.path.basename(file_path), dataset.width * dataset.height, "px") as report:
+            for window, band, window_label, partial in windows:
+                if pixel_writer is not None:
+                    with timed("pixel_export"):
+                        pixel_writer.write(band, window_label, dataset.window_transform(window))
+                if zonal is not None:
+                    with timed("zonal"):
+                        zonal.update(band, dataset, window, primary_labels=window_label)
+
+                # Merge this window's partial sums and counts into the running totals (in window order)
+                window_sums, window_counts, window_areas, window_dn_areas = partial
+                sums += window_sums
+                counts += window_counts
+                if area_weighted:
+                    areas += window_areas
+                    dn_areas += window_dn_areas
+                count(pixels=band.size)
+                report.advance(band.size)
+
+    return totals_frame(sums, counts, names, dtype, areas, dn_areas)
@@ -0,0 +1,187 @@
+"""
+Script Name: pipeline_manifest.py
+
+Description:
+    Dependency tracking for incremental rebuilds. A manifest (a JSON file) records, for every
+    stage of a script, the fingerprint of each input file, the outputs it produced, a hash of
+    the parameters it ran with, and any extra state the stage wants to keep (e.g. per-year row
+    hashes). On the next run a stage is only recomputed when one of its outputs is missing, its
+    parameters changed, or one of its inputs changed.
+
+    Input fingerprints use the file size and modification time as a fast path. When those
+    change, the SHA-256 of the content is compared against the recorded one, so a file that
+    was merely touched or rewritten with identical content does not trigger a rebuild.
+
+    Several processes can share a manifest (e.g. stages run concurrently by `ntl.py`): saving
+    re-reads the file under a lock and only replaces the stages this process recorded or
+    forgot, so the records of the others are kept.
+
+Author:
+    Shamayla Durrin Islam
+    shamayla.islam@mail.utoronto.ca
+
+Date:
+    Created: October 17, 2026
+
+Dependencies:
+    - Python 3.8 or higher
+
+Usage:
+    from pipeline_manifest import Manifest
+
+    manifest = Manifest("data/02-analysis_data/.manifest.json")
+    if manifest.is_stale("spi", [spi_path], [rating_path]):
+        ...  # rebuild
+        manifest.record("spi", [spi_path], [rating_path])
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows: no lock, a manifest is then written by one process at a time
+    fcntl = None
+
+from atomic_io import atomic_path
+
+
+def file_sha256(path):
+    """SHA-256 of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def params_hash(params):
+    """Stable hash of a stage's JSON-serializable parameters."""
+    return hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+
+@contextlib.contextmanager
+def file_lock(path):
+    """Exclusive lock on `path` (created if needed) for the duration of the block."""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "a") as handle:
+        fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+class Manifest:
+    """Per-stage record of input fingerprints, outputs and parameters, stored as JSON."""
+
+    def __init__(self, path, force=False):
+        self.path = path
+        self.stages = {}
+        # Stages recorded or forgotten by this process, the only ones it writes back
+        self.updated = set()
+        self.forgotten = set()
+        # Fingerprints computed in this run, so an input that changed is hashed once by
+        # `is_stale` and reused by `record`
+        self.hashed = {}
+        if not force:
+            self.stages = self.read()
+
+    def read(self):
+        """The stages saved in the manifest file."""
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path) as handle:
+            return json.load(handle)
+
+    def fingerprint(self, path, previous=None):
+        """Size, mtime and content hash of `path`, reusing `previous` when size and mtime match."""
+        stat = os.stat(path)
+        for known in (previous, self.hashed.get(path)):
+            if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+                return known
+        self.hashed[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": file_sha256(path)}
+        return self.hashed[path]
+
+    def changed_inputs(self, stage, inputs):
+        """
+        Inputs of `stage` that are new or whose content changed since it was recorded, and
+        recorded inputs that no longer exist.
+        """
+        recorded = self.stages.get(stage, {}).get("inputs", {})
+        changed = []
+        for path in inputs:
+            previous = recorded.get(path)
+            if previous is None:
+                changed.append(path)
+                continue
+
+            current = self.fingerprint(path, previous)
+            if current["sha256"] != previous["sha256"]:
+                changed.append(path)
+            else:
+                # Same content with a new mtime: remember it to skip re-hashing next time
+                recorded[path] = current
+        removed = [path for path in recorded if path not in inputs]
+        return changed, removed
+
+    def is_stale(self, stage, inputs, outputs, params=None):
+        """True when `stage` has to be recomputed."""
+        entry = self.stages.get(stage)
+        if entry is None:
+            return True
+        if entry.get("params") != params_hash(params):
+            return True
+        if any(not os.path.exists(path) for path in outputs):
+            return True
+
+        changed, removed = self.changed_inputs(stage, inputs)
+        return bool(changed or removed)
+
+    def params_changed(self, stage, params=None):
+        """True when `stage` is unknown or last ran with different parameters."""
+        entry = self.stages.get(stage)
+        return entry is None or entry.get("params") != params_hash(params)
+
+    def extra(self, stage):
+        """Extra state stored with `stage` by `record`, or an empty dict."""
+        return self.stages.get(stage, {}).get("extra", {})
+
+    def record(self, stage, inputs, outputs, params=None, extra=None):
+        """Record that `stage` was (re)computed from `inputs`, and save the manifest."""
+        recorded = self.stages.get(stage, {}).get("inputs", {})
+        self.stages[stage] = {
+            "inputs": {path: self.fingerprint(path, recorded.get(path)) for path in inputs},
+            "outputs": list(outputs),
+            "params": params_hash(params),
+            "extra": extra or {},
+        }
+        self.updated.add(stage)
+        self.forgotten.discard(stage)
+        self.save()
+
+    def forget(self, stage):
+        """Drop the record of a stage, e.g. one whose input was removed."""
+        if self.stages.pop(stage, None) is not None:
+            self.updated.discard(stage)
+            self.forgotten.add(stage)
+            self.save()
+
+    def save(self):
+        """Write this process's stages into the manifest, keeping the stages saved by other processes."""
+        with file_lock(self.path + ".lock"):
+            stages = self.read()
+            for stage in self.forgotten:
+                stages.pop(stage, None)
+            stages.update({stage: self.stages[stage] for stage in self.updated})
+
+            def write(tmp_path):
+                with open(tmp_path, "w") as handle:
+                    json.dump(stages, handle, indent=1, sort_keys=True)
+
+            atomic_path(self.path, write)
@@ -0,0 +1,107 @@
+"""
+Script Name: pixel_export.py
+
+Description:
+    Optional pixel-level export for `01-data_extraction.py`. The extraction itself only emits
+    per-country yearly aggregates; users who need the pixel detail can ask for every lit
+    pixel's latitude, longitude, DN and country to be written to a Parquet file instead of
+    the huge CSVs produced previously. The columns are stored compactly:
+    - latitude, longitude: float32 (pixel centres)
+    - dn: uint8 for 8-bit rasters (such as the harmonized DN files), float32 otherwise
+    - country: dictionary-encoded string, null for pixels outside every country
+
+    Pixels are written window by window as separate row groups, so the export streams with
+    the extraction and never holds the whole table in memory.
+
+Author:
+    Shamayla Durrin Islam
+    shamayla.islam@mail.utoronto.ca
+
+Date:
+    Created: October 17, 2026
+
+Dependencies:
+    - Python 3.8 or higher
+    - numpy
+    - pyarrow
+
+Usage:
+    from pixel_export import PixelWriter
+
+    with PixelWriter("data/01-raw_data/03-extracted/2019.parquet", names, band_dtype) as writer:
+        totals = extract_country_totals(tif_path, countries, labels=labels, pixel_writer=writer)
+"""
+
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from atomic_io import replace, temp_path
+from ntl_extraction import lit_mask
+
+
+class PixelWriter:
+    """Stream the lit pixels of successive raster windows into one Parquet file."""
+
+    def __init__(self, output_path, names, band_dtype):
+        self.output_path = output_path
+        self.names = pa.array(names[1:], type=pa.string())  # Label 0 means "no country"
+        self.dn_type = np.dtype("uint8") if np.dtype(band_dtype) == np.uint8 else np.dtype("float32")
+        self.schema = pa.schema([
+            ("latitude", pa.float32()),
+            ("longitude", pa.float32()),
+            ("dn", pa.from_numpy_dtype(self.dn_type)),
+            ("country", pa.dictionary(pa.int32(), pa.string())),
+        ])
+
+        self.tmp_path = temp_path(output_path)
+        self.writer = pq.ParquetWriter(self.tmp_path, self.schema, compression="zstd")
+
+    def write(self, band, labels, transform):
+        """Append the lit pixels of one window, given its DN values, labels and affine transform."""
+        rows, cols = np.nonzero(lit_mask(band))
+        if len(rows) == 0:
+            return
+
+        # Pixel centres from the affine transform, without a per-pixel call
+        rows_c = rows + 0.5
+        cols_c = cols + 0.5
+        longitude = transform.a * cols_c + transform.b * rows_c + transform.c
+        latitude = transform.d * cols_c + transform.e * rows_c + transform.f
+
+        codes = labels[rows, cols].astype("int32") - 1
+        country = pa.DictionaryArray.from_arrays(
+            pa.array(codes, mask=codes < 0), self.names
+        )
+
+        table = pa.Table.from_arrays(
+            [
+                pa.array(latitude.astype("float32")),
+                pa.array(longitude.astype("float32")),
+                pa.array(band[rows, cols].astype(self.dn_type)),
+                country,
+            ],
+            schema=self.schema,
+        )
+        self.writer.write_table(table)
+
+    def close(self):
+        """Finish the file and move it into place."""
+        self.writer.close()
+        replace(self.tmp_path, self.output_path)
+
+    def abort(self):
+        """Discard a partially written file."""
+        self.writer.close()
+        os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -0,0 +1,245 @@
+"""
+Script Name: predict_gdp.py
+
+Description:
+    Estimates GDP from night-time lights by inverting the fitted fixed-effects relationship
+    log(dn) = beta * log(gdp) + country effect + year effect (`06-fit_fixed_effects.py`), e.g.
+    for the country-years where the World Bank GDP is missing:
+
+        log(gdp) = (log(dn) - country effect - year effect) / beta
+
+    Written around the country's mean log GDP in the fitted sample, m, this is
+    log(gdp) = m + (log(dn) - country level - year effect) / beta, where the country level
+    (effect + beta * m) is the country's mean log DN net of the year effects and hardly
+    depends on beta. The interval comes from the delta method: the variance of the estimate
+    is ((log(gdp) - m)^2 * Var(beta) + sigma^2) / beta^2, i.e. the uncertainty of the slope
+    for the distance from the country's mean plus the residual noise of log(dn); the
+    effects are taken as given. GDP is the exponential of the estimate and of the interval
+    bounds.
+
+    Each country is predicted with the model of its SPI grade (model_a ... model_f) when it
+    was fitted there, and with the pooled model (model1) otherwise. Countries or years
+    without an estimated effect get no prediction.
+
+    The models are loaded once into an in-memory cache (`ModelCache`) holding the slopes and
+    effect lookups. The cache checks the modification time and size of the model artifact on
+    every request and reloads it when the models are refitted. Queries are answered in
+    batches with array operations, so a long-running process (`--serve`, JSON lines on stdin)
+    serves thousands of queries per second.
+
+Author:
+    Shamayla Durrin Islam
+    shamayla.islam@mail.utoronto.ca
+
+Date:
+    Created: October 17, 2026
+
+Dependencies:
+    - Python 3.8 or higher
+    - numpy
+    - pandas >= 1.3
+    - pyarrow (to read the analysis dataset)
+
+Usage:
+    Predict a CSV of queries (columns country, year, dn):
+        python scripts/predict_gdp.py --queries queries.csv --output predictions.csv
+    Predict GDP for every analysis row where it is missing:
+        python scripts/predict_gdp.py --fill-missing
+    Serve JSON lines on stdin ({"country": ..., "year": ..., "dn": ...} or a list of them per line):
+        python scripts/predict_gdp.py --serve
+
+    from predict_gdp import ModelCache
+    cache = ModelCache()
+    predictions = cache.predict(["Chad", "Niger"], [2015, 2016], [5000, 7000])
+"""
+
+import argparse
+import json
+import os
+import sys
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from atomic_io import write_csv_atomic
+from country_names import load_country_index
+from fixed_effects import load_fits
+
+models_path = "models/fixed_effects.json"
+analysis_parquet_path = "data/02-analysis_data/04-analysis/analysis.parquet"
+predictions_path = "data/02-analysis_data/04-analysis/gdp_predictions.csv"
+
+POOLED_MODEL = "model1"
+GRADE_MODEL_PREFIX = "model_"
+OUTCOME, REGRESSOR = "log(dn)", "log(gdp)"
+
+PREDICTION_COLUMNS = ["country", "year", "dn", "model", "gdp", "gdp_low", "gdp_high", "log_gdp", "log_gdp_se"]
+
+
+class InverseModel:
+    """Slope, its variance, the residual variance and the effect lookups of one fitted model."""
+
+    def __init__(self, name, fit):
+        self.name = name
+        self.beta = fit.coef[0]
+        self.var_beta = fit.vcov[0, 0]
+        self.sigma2 = fit.sigma ** 2
+        self.year_effects = fit.effects["year"]
+        # Country mean log GDP and level (mean log DN net of the year effects)
+        self.country_means = {country: means[0] for country, means in fit.centers["country"].items()}
+        self.country_levels = {country: effect + self.beta * self.country_means[country]
+                               for country, effect in fit.effects["country"].items()}
+
+    @staticmethod
+    def usable(fit):
+        """Whether a fit is log(dn) ~ log(gdp) with saved country and year effects."""
+        outcome = fit.formula.split("~")[0].strip()
+        return (outcome == OUTCOME and fit.terms == [REGRESSOR] and fit.effects is not None
+                and {"country", "year"} <= set(fit.effects) and "country" in (fit.centers or {})
+                and np.isfinite(fit.coef[0]))
+
+    def predict(self, countries, years, log_dn):
+        """Log GDP estimates and standard errors (NaN where an effect is unknown)."""
+        level = np.array([self.country_levels.get(country, np.nan) for country in countries])
+        mean = np.array([self.country_means.get(country, np.nan) for country in countries])
+        year_effect = np.array([self.year_effects.get(year, np.nan) for year in years])
+        deviation = (log_dn - level - year_effect) / self.beta
+        se = np.sqrt(deviation ** 2 * self.var_beta + self.sigma2) / abs(self.beta)
+        return mean + deviation, se
+
+
+class ModelCache:
+    """The fitted models of one artifact, reloaded whenever the artifact changes on disk."""
+
+    def __init__(self, path=models_path, use_grades=True):
+        self.path = path
+        self.use_grades = use_grades
+        self.key = None
+        self.pooled = None
+        self.by_country = {}
+        self.aliases = load_country_index().alias_to_country
+
+    def refresh(self):
+        """Reload the models if the artifact's modification time or size changed."""
+        stat = os.stat(self.path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        if key == self.key:
+            return
+        fits = load_fits(self.path)
+        if POOLED_MODEL not in fits or not InverseModel.usable(fits[POOLED_MODEL]):
+            raise ValueError(f"{self.path} has no {POOLED_MODEL} with country and year effects; "
+                             f"refit it with 06-fit_fixed_effects.py.")
+        self.pooled = InverseModel(POOLED_MODEL, fits[POOLED_MODEL])
+
+        # Countries fitted in a grade model are predicted with it
+        self.by_country = {}
+        if self.use_grades:
+            for name, fit in sorted(fits.items()):
+                if name.startswith(GRADE_MODEL_PREFIX) and InverseModel.usable(fit):
+                    model = InverseModel(name, fit)
+                    self.by_country.update({country: model for country in model.country_levels})
+        self.key = key
+
+    def predict(self, countries, years, dn, level=0.95):
+        """
+        GDP estimates with `level` intervals for batches of (country, year, dn) queries.
+        Returns a dict of arrays keyed like `PREDICTION_COLUMNS`.
+        """
+        self.refresh()
+        countries = [self.aliases.get(country, country) for country in countries]
+        year_keys = [str(int(year)) for year in years]
+        dn = np.asarray(dn, dtype="float64")
+        with np.errstate(divide="ignore", invalid="ignore"):
+            log_dn = np.where(dn > 0, np.log(dn), np.nan)
+        z = NormalDist().inv_cdf((1 + level) / 2)
+
+        models = [self.by_country.get(country, self.pooled) for country in countries]
+        log_gdp = np.full(len(dn), np.nan)
+        se = np.full(len(dn), np.nan)
+        for model in set(models):
+            rows = np.array([i for i, chosen in enumerate(models) if chosen is model], dtype="int64")
+            log_gdp[rows], se[rows] = model.predict([countries[i] for i in rows], [year_keys[i] for i in rows],
+                                                    log_dn[rows])
+
+        return {
+            "country": countries,
+            "year": [int(year) for year in years],
+            "dn": dn,
+            "model": [model.name for model in models],
+            "gdp": np.exp(log_gdp),
+            "gdp_low": np.exp(log_gdp - z * se),
+            "gdp_high": np.exp(log_gdp + z * se),
+            "log_gdp": log_gdp,
+            "log_gdp_se": se,
+        }
+
+    def predict_frame(self, queries, level=0.95):
+        """Predictions for a DataFrame of queries with columns country, year and dn."""
+        result = self.predict(queries["country"].tolist(), queries["year"].tolist(), queries["dn"].to_numpy(), level)
+        return pd.DataFrame(result, columns=PREDICTION_COLUMNS)
+
+
+def json_records(predictions):
+    """Predictions as JSON-serializable records (NaN becomes null)."""
+    columns = [[None if value != value else value for value in np.asarray(predictions[column]).tolist()]
+               for column in PREDICTION_COLUMNS]
+    return [dict(zip(PREDICTION_COLUMNS, values)) for values in zip(*columns)]
+
+
+def serve(cache, level, source=sys.stdin, sink=sys.stdout):
+    """Answer JSON-lines queries: one object or a list of objects per line, one answer line each."""
+    for line in source:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+            queries = request if isinstance(request, list) else [request]
+            predictions = cache.predict([query["country"] for query in queries],
+                                        [query["year"] for query in queries],
+                                        [query["dn"] for query in queries], level)
+            records = json_records(predictions)
+            answer = records if isinstance(request, list) else records[0]
+        except (KeyError, TypeError, ValueError) as error:
+            answer = {"error": str(error)}
+        sink.write(json.dumps(answer) + "\n")
+        sink.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate GDP from night-time lights with the fitted models.")
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--queries", help="CSV with columns country, year and dn.")
+    mode.add_argument("--fill-missing", action="store_true", help="Predict GDP for the analysis rows without GDP.")
+    mode.add_argument("--serve", action="store_true", help="Answer JSON-lines queries on stdin.")
+    parser.add_argument("--input", default=analysis_parquet_path, help="Analysis dataset (with --fill-missing).")
+    parser.add_argument("--models", default=models_path, help="Model artifact written by 06-fit_fixed_effects.py.")
+    parser.add_argument("--output", help="CSV to write (default: stdout, or the analysis folder with --fill-missing).")
+    parser.add_argument("--level", type=float, default=0.95, help="Confidence level of the intervals.")
+    parser.add_argument("--pooled-only", action="store_true", help="Use the pooled model for every country.")
+    args = parser.parse_args()
+
+    cache = ModelCache(args.models, use_grades=not args.pooled_only)
+    if args.serve:
+        serve(cache, args.level)
+        return
+
+    if args.fill_missing:
+        analysis = pd.read_parquet(args.input)
+        queries = analysis[analysis["gdp"].isna() & (analysis["dn"] > 0)]
+        output = args.output or predictions_path
+    else:
+        queries = pd.read_csv(args.queries)
+        output = args.output
+
+    predictions = cache.predict_frame(queries, args.level)
+    if output:
+        write_csv_atomic(predictions, output)
+        print(f"Wrote {len(predictions)} predictions ({predictions['gdp'].notna().sum()} estimated) to {output}")
+    else:
+        predictions.to_csv(sys.stdout, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""
+Script Name: raster_cache.py
+
+Description:
+    On-disk cache of decoded rasters. The source GeoTIFFs are compressed, so every extraction
+    run used to spend most of its time decompressing the same files again. Each source is
+    decoded once into an analysis-ready entry, stored as a directory holding:
+    - bands.npy: the uncompressed (bands, rows, columns) array, memory-mapped when read back.
+    - meta.json: the grid (transform, shape, CRS), dtype, nodata and the source's SHA-256.
+
+    Entries are keyed by the SHA-256 of the source file's content, so an edited or replaced
+    source maps to a new entry, and a renamed or copied one reuses its entry. Hashing a large
+    file is not free, so the hash of every source is remembered in an index (hashes.json) with
+    its modification time and size, and only recomputed when those change.
+
+    `CachedRaster` reads an entry with the subset of the rasterio dataset interface the
+    extraction uses (`read`, `block_windows`, `window_transform`, `transform`, `crs`, ...), so
+    it can be passed wherever a rasterio dataset is expected. A windowed read returns a view
+    of the memory map (zero-copy: only the pages touched are read from disk) and holds no
+    shared file position, so windows can be read and reduced concurrently from threads (see
+    `map_windows`). Its native blocks are full-width strips, the contiguous layout of the
+    array on disk.
+
+    An uncompressed array rather than a tiled COG is used because zero-copy reads need the
+    raw pixels on disk; the price is disk space (a global 15 arc-second float32 band takes
+    about 2.9 GB).
+
+Author:
+    Shamayla Durrin Islam
+    shamayla.islam@mail.utoronto.ca
+
+Date:
+    Created: October 17, 2026
+
+Dependencies:
+    - Python 3.8 or higher
+    - numpy
+    - rasterio >= 1.2
+
+Usage:
+    Decode every GeoTIFF of the input directory into the cache:
+        python scripts/raster_cache.py
+        python scripts/raster_cache.py --input-dir data/01-raw_data/08-monthlytiffiles --prune
+
+    from raster_cache import open_raster
+
+    with open_raster(tif_path, cache_dir) as dataset:
+        band = dataset.read(1, window=window)
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import rasterio
+from affine import Affine
+from rasterio.crs import CRS
+from rasterio.errors import NotGeoreferencedWarning
+from rasterio.windows import Window, transform as window_transform
+
+from atomic_io import atomic_path
+from pipeline_manifest import file_sha256
+
+# Define default file paths
+input_dir = "data/01-raw_data/01-tiffiles"  # Directory with the source GeoTIFF files
+raster_cache_dir = "data/01-raw_data/09-rastercache"  # Directory for the decoded rasters
+
+# Bump when the layout of a cache entry changes so older entries are rebuilt
+CACHE_VERSION = 1
+
+# Bytes per native block (full-width strip) of a cached raster
+BLOCK_BYTES = 16 * 1024 ** 2
+
+INDEX_FILE = "hashes.json"
+
+
+def read_index(cache_dir):
+    """The remembered source hashes, {absolute path: {mtime_ns, size, sha256}}."""
+    try:
+        with open(os.path.join(cache_dir, INDEX_FILE)) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return {}
+
+
+def source_hash(file_path, cache_dir):
+    """SHA-256 of a source file, from the index when its modification time and size are unchanged."""
+    path = os.path.abspath(file_path)
+    stat = os.stat(path)
+    index = read_index(cache_dir)
+    known = index.get(path)
+    if known is not None and known["mtime_ns"] == stat.st_mtime_ns and known["size"] == stat.st_size:
+        return known["sha256"]
+
+    digest = file_sha256(path)
+    # Re-read before writing: another worker may have added its own sources meanwhile
+    index = read_index(cache_dir)
+    index[path] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": digest}
+
+    def write(tmp_path):
+        with open(tmp_path, "w") as handle:
+            json.dump(index, handle, indent=2, sort_keys=True)
+
+    atomic_path(os.path.join(cache_dir, INDEX_FILE), write)
+    return digest
+
+
+def entry_dir_for(cache_dir, digest):
+    """Directory of the cache entry of a source with the given hash."""
+    return os.path.join(cache_dir, f"v{CACHE_VERSION}-{digest[:20]}")
+
+
+class CachedRaster:
+    """A decoded raster, memory-mapped from a cache entry, read like a rasterio dataset."""
+
+    thread_safe = True
+
+    def __init__(self, entry_dir):
+        with open(os.path.join(entry_dir, "meta.json")) as handle:
+            self.meta = json.load(handle)
+        self.bands = np.load(os.path.join(entry_dir, "bands.npy"), mmap_mode="r")
+        if list(self.bands.shape) != [self.meta["count"], self.meta["height"], self.meta["width"]] or \
+                self.bands.dtype != np.dtype(self.meta["dtype"]):
+            raise ValueError(f"Raster cache entry {entry_dir} does not match its metadata.")
+
+        self.name = self.meta["source"]
+        self.count, self.height, self.width = self.bands.shape
+        self.dtypes = (self.meta["dtype"],) * self.count
+        self.nodata = self.meta["nodata"]
+        self.transform = Affine(*self.meta["transform"])
+        self.crs = CRS.from_string(self.meta["crs"])
+        self.block_rows = max(1, BLOCK_BYTES // max(1, self.width * self.bands.dtype.itemsize))
+
+    def read(self, indexes=1, window=None, out_dtype=None):
+        """
+        Band `indexes` (1-based) of the raster or of a window, as a read-only view of the
+        memory map; a copy only when `out_dtype` differs from the raster's dtype.
+        """
+        band = self.bands[indexes - 1]
+        if window is not None:
+            rows, cols = window.toslices()
+            band = band[rows, cols]
+        if out_dtype is not None and np.dtype(out_dtype) != band.dtype:
+            return band.astype(out_dtype)
+        return band
+
+    def block_windows(self, bidx=1):
+        """Native blocks: full-width strips of about `BLOCK_BYTES`, as ((row, 0), window) pairs."""
+        for i, row_off in enumerate(range(0, self.height, self.block_rows)):
+            yield (i, 0), Window(0, row_off, self.width, min(self.block_rows, self.height - row_off))
+
+    def window_transform(self, window):
+        """Affine transform of a window."""
+        return window_transform(window, self.transform)
+
+    def close(self):
+        self.bands = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.close()
+
+
+def build_entry(file_path, digest, cache_dir, entry_dir):
+    """Decode a source GeoTIFF block by block into a new entry, then move it into place."""
+    tmp_dir = tempfile.mkdtemp(dir=cache_dir, prefix=".tmp-")
+    try:
+        with rasterio.open(file_path) as dataset:
+            if len(set(dataset.dtypes)) != 1:
+                raise ValueError(f"{file_path} mixes band dtypes {dataset.dtypes}.")
+            bands = np.lib.format.open_memmap(
+                os.path.join(tmp_dir, "bands.npy"), mode="w+", dtype=dataset.dtypes[0],
+                shape=(dataset.count, dataset.height, dataset.width),
+            )
+            for _, window in dataset.block_windows(1):
+                rows, cols = window.toslices()
+                bands[:, rows, cols] = dataset.read(window=window)
+            bands.flush()
+            del bands
+
+            meta = {
+                "version": CACHE_VERSION,
+                "source": os.path.abspath(file_path),
+                "source_sha256": digest,
+                "count": dataset.count,
+                "height": dataset.height,
+                "width": dataset.width,
+                "dtype": dataset.dtypes[0],
+                "nodata": dataset.nodata,
+                "transform": list(dataset.transform)[:6],
+                "crs": dataset.crs.to_string(),
+            }
+        # meta.json is written last: an entry without it is treated as incomplete
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as handle:
+            json.dump(meta, handle, indent=2)
+
+        if os.path.exists(os.path.join(entry_dir, "meta.json")):
+            # Another worker finished the same entry first; keep theirs
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            return
+
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(tmp_dir, entry_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+def load_raster(file_path, cache_dir):
+    """The cached, memory-mapped copy of a source GeoTIFF, decoding it first if needed."""
+    os.makedirs(cache_dir, exist_ok=True)
+    digest = source_hash(file_path, cache_dir)
+    entry_dir = entry_dir_for(cache_dir, digest)
+    try:
+        return CachedRaster(entry_dir)
+    except (OSError, ValueError, KeyError):
+        pass
+
+    print(f"Decoding {file_path} into {entry_dir}...")
+    build_entry(file_path, digest, cache_dir, entry_dir)
+    return CachedRaster(entry_dir)
+
+
+def open_raster(file_path, cache_dir=None):
+    """Open a GeoTIFF through the cache when `cache_dir` is given, directly with rasterio otherwise."""
+    if cache_dir is None:
+        return rasterio.open(file_path)
+    return load_raster(file_path, cache_dir)
+
+
+def map_windows(function, windows, threads=None):
+    """
+    `function(window)` for every window, in order, computed by `threads` threads with a
+    bounded number of windows in flight. Only for datasets that can be read concurrently
+    (`CachedRaster`); rasterio datasets must be read from one thread.
+    """
+    if not threads or threads <= 1:
+        yield from map(function, windows)
+        return
+
+    # GDAL flags the in-memory rasters `rasterize` burns into from worker threads as not
+    # georeferenced; the transform is applied all the same. The filter is set once around the
+    # pool rather than in each worker, since catch_warnings is not thread-safe
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", category=NotGeoreferencedWarning, module=r"rasterio\.features")
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            pending = []
+            for window in windows:
+                pending.append(executor.submit(function, window))
+                if len(pending) >= 2 * threads:
+                    yield pending.pop(0).result()
+            for future in pending:
+                yield future.result()
+
+
+def prune(cache_dir, keep):
+    """Delete the entries (and index records) of sources other than the `keep` hashes."""
+    keep_dirs = {os.path.basename(entry_dir_for(cache_dir, digest)) for digest in keep}
+    for entry in os.listdir(cache_dir):
+        entry_dir = os.path.join(cache_dir, entry)
+        if os.path.isdir(entry_dir) and entry not in keep_dirs and not entry.startswith(".tmp-"):
+            print(f"Removing unused raster {entry_dir}")
+            shutil.rmtree(entry_dir, ignore_errors=True)
+
+    index = {path: known for path, known in read_index(cache_dir).items() if known["sha256"] in keep}
+
+    def write(tmp_path):
+        with open(tmp_path, "w") as handle:
+            json.dump(index, handle, indent=2, sort_keys=True)
+
+    atomic_path(os.path.join(cache_dir, INDEX_FILE), write)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decode GeoTIFFs into the memory-mappable raster cache.")
+    parser.add_argument("--input-dir", default=input_dir, help="Directory containing the source GeoTIFF files.")
+    parser.add_argument("--cache-dir", default=raster_cache_dir, help="Directory for the decoded rasters.")
+    parser.add_argument("--prune", action="store_true",
+                        help="Also delete the cached rasters of sources that are not in the input directory.")
+    args = parser.parse_args()
+
+    sources = [os.path.join(args.input_dir, file_name) for file_name in sorted(os.listdir(args.input_dir))
+               if file_name.lower().endswith((".tif", ".tiff"))]
+    digests = set()
+    for file_path in sources:
+        with load_raster(file_path, args.cache_dir) as dataset:
+            digests.add(dataset.meta["source_sha256"])
+    print(f"Cached {len(sources)} raster(s) in {args.cache_dir}.")
+
+    if args.prune:
+        prune(args.cache_dir, digests)
+
+
+if __name__ == "__main__":
+    main()
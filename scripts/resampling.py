@@ -0,0 +1,289 @@
+"""
+Script Name: resampling.py
+
+Description:
+    Resampling inference for the fixed-effects NTL-GDP elasticity (`fixed_effects.py`), e.g.
+    "log(dn) ~ log(gdp) | country + year", without refitting the model replicate by
+    replicate:
+    - Cluster bootstrap: countries are drawn with replacement. A replicate is the weighted
+      regression with each country weighted by the number of times it was drawn, so the
+      replicates are a (replicates x clusters) matrix of draw counts. The fixed effects
+      nested in the clusters (country) are absorbed once, since a weight that is constant
+      within a country leaves its means unchanged. The other fixed effects (year) are kept
+      as dummy columns, whose weighted projection differs per replicate. The weighted normal
+      equations of every replicate are then the count matrix times the per-cluster
+      cross-products, i.e. one matrix product, solved as one stacked system.
+    - Permutation test: the tested regressor is permuted across countries within each year,
+      which breaks its link with the outcome but keeps its distribution per year. All the
+      permutations of a batch are residualized on the fixed effects and controls together,
+      as the columns of one matrix.
+
+    Replicates run in chunks, each with its own random generator spawned from one
+    `np.random.SeedSequence`, so a seed gives the same draws whatever the number of worker
+    processes the chunks are spread over.
+
+Author:
+    Shamayla Durrin Islam
+    shamayla.islam@mail.utoronto.ca
+
+Date:
+    Created: October 17, 2026
+
+Dependencies:
+    - Python 3.8 or higher
+    - numpy
+    - pandas >= 1.3
+    - pyarrow (to read the analysis dataset)
+
+Usage:
+    From the repository root:
+        python scripts/resampling.py --replicates 10000 --seed 2024
+        python scripts/resampling.py --formula "log(dn) ~ log(gdp) | country + year" --by grade --workers 4
+
+    from resampling import cluster_bootstrap, permutation_test
+    bootstrap = cluster_bootstrap(analysis, "log(dn) ~ log(gdp) | country + year", replicates=10000, seed=1)
+    low, high = bootstrap.confidence_interval(0.95)["log(gdp)"]
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from fixed_effects import demean, factor_codes, nested, sample
+
+analysis_parquet_path = "data/02-analysis_data/04-analysis/analysis.parquet"
+
+# Replicates solved per chunk (bounds the memory of the permutation matrices)
+CHUNK_REPLICATES = 500
+
+# Largest number of dummy columns for the fixed effects not nested in the clusters
+MAX_DUMMIES = 500
+
+
+class Design:
+    """
+    A fixed-effects regression reduced for resampling: the outcome and regressors demeaned by
+    the fixed effects nested in the clusters, and the other fixed effects as demeaned dummy
+    columns (`controls`).
+    """
+
+    def __init__(self, data, formula, cluster="country", within="year"):
+        formula, y, X, terms, complete = sample(data, formula, [cluster, within])
+        rows = data[complete]
+        self.formula = formula
+        self.terms = terms
+        self.cluster = factor_codes(rows[cluster])
+        self.n_clusters = self.cluster.max(initial=-1) + 1
+        self.within = None if within is None else factor_codes(rows[within])
+
+        groups = {column: factor_codes(rows[column]) for column in formula.fixed_effects}
+        absorbed = [codes for codes in groups.values() if nested(codes, self.cluster)]
+        dummies = [codes for codes in groups.values() if not nested(codes, self.cluster)]
+        if not absorbed:
+            # Without a nested effect, an intercept (constant within every cluster)
+            absorbed = [np.zeros(len(y), dtype="int64")]
+
+        # One dummy per level beyond the first of each remaining effect
+        columns = []
+        for codes in dummies:
+            levels = codes.max(initial=-1) + 1
+            if levels - 1 > MAX_DUMMIES:
+                raise ValueError(f"Fixed effects with {levels} levels are not nested in the clusters; "
+                                 f"at most {MAX_DUMMIES + 1} are supported.")
+            columns.append((codes[:, None] == np.arange(1, levels)).astype("float64"))
+        controls = np.column_stack(columns) if columns else np.empty((len(y), 0))
+
+        values = demean(np.column_stack([y, X, controls]), absorbed)
+        self.absorbed = absorbed
+        self.raw_X = X
+        self.y = values[:, 0]
+        self.X = values[:, 1:1 + X.shape[1]]
+        self.controls = values[:, 1 + X.shape[1]:]
+        self.nobs = len(y)
+
+    def regressors(self):
+        """Design matrix of the regressors followed by the control dummies."""
+        return np.column_stack([self.X, self.controls])
+
+    def cluster_sums(self):
+        """Per-cluster cross-products A'A and A'y of the design A, flattened: (clusters x m*m, clusters x m)."""
+        A = self.regressors()
+        m = A.shape[1]
+        xtx = np.zeros((self.n_clusters, m * m))
+        np.add.at(xtx, self.cluster, (A[:, :, None] * A[:, None, :]).reshape(len(A), m * m))
+        xty = np.zeros((self.n_clusters, m))
+        np.add.at(xty, self.cluster, A * self.y[:, None])
+        return xtx, xty
+
+    def estimate(self):
+        """Full-sample coefficients of the regressors."""
+        A = self.regressors()
+        return np.linalg.lstsq(A, self.y, rcond=None)[0][:self.X.shape[1]]
+
+
+def orthonormal_basis(columns):
+    """Orthonormal basis of the span of `columns` (dropping collinear ones)."""
+    if not columns.shape[1]:
+        return columns
+    u, singular, _ = np.linalg.svd(columns, full_matrices=False)
+    return u[:, singular > singular.max() * max(columns.shape) * np.finfo("float64").eps]
+
+
+def solve_stacked(xtx, xty):
+    """Solve a stack of normal equations; singular systems (e.g. a year never drawn) use the pseudo-inverse."""
+    try:
+        return np.linalg.solve(xtx, xty[..., None])[..., 0]
+    except np.linalg.LinAlgError:
+        return np.einsum("rij,rj->ri", np.linalg.pinv(xtx), xty)
+
+
+def bootstrap_chunk(args):
+    """Coefficients of one chunk of cluster bootstrap replicates."""
+    cluster_xtx, cluster_xty, n_regressors, size, seed = args
+    rng = np.random.default_rng(seed)
+    n_clusters = len(cluster_xty)
+    m = cluster_xty.shape[1]
+
+    # Replicate weights: how many times each cluster is drawn
+    counts = rng.multinomial(n_clusters, np.full(n_clusters, 1 / n_clusters), size=size).astype("float64")
+    xtx = (counts @ cluster_xtx).reshape(size, m, m)
+    xty = counts @ cluster_xty
+    return solve_stacked(xtx, xty)[:, :n_regressors]
+
+
+def permutation_chunk(args):
+    """Coefficient of the tested regressor for one chunk of within-group permutations."""
+    x, y, absorbed, basis, within, size, seed = args
+    rng = np.random.default_rng(seed)
+
+    # Sorting random keys offset by the group rank permutes the rows within each group
+    keys = within[:, None] + rng.random((len(x), size))
+    order = np.argsort(keys, axis=0)
+    group_order = np.argsort(within, kind="stable")
+    permuted = np.empty((len(x), size))
+    permuted[group_order] = x[order]
+
+    # Residualize every permutation on the fixed effects and controls at once (Frisch-Waugh-Lovell):
+    # demean by the absorbed effects, then project out `basis`, an orthonormal basis of the
+    # (demeaned) dummies of the other effects and the other regressors
+    permuted = demean(permuted, absorbed)
+    if basis.shape[1]:
+        permuted -= basis @ (basis.T @ permuted)
+    return (permuted.T @ y) / np.einsum("ij,ij->j", permuted, permuted)
+
+
+def spawn_chunks(replicates, seed=None, chunk_size=CHUNK_REPLICATES):
+    """Chunk sizes and independent seeds spawned from one `SeedSequence`."""
+    sizes = [chunk_size] * (replicates // chunk_size)
+    if replicates % chunk_size:
+        sizes.append(replicates % chunk_size)
+    return list(zip(sizes, np.random.SeedSequence(seed).spawn(len(sizes))))
+
+
+def run_chunks(function, tasks, workers=None):
+    """Run the chunks, in a process pool when `workers` > 1, and stack their results in order."""
+    workers = min(workers or 1, len(tasks))
+    if workers <= 1:
+        return np.concatenate([function(task) for task in tasks])
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return np.concatenate(list(executor.map(function, tasks)))
+
+
+class ResamplingResult:
+    """Full-sample estimates and the resampled replicates of the coefficients."""
+
+    def __init__(self, method, terms, estimate, replicates, nobs, n_clusters):
+        self.method = method
+        self.terms = list(terms)
+        self.estimate = np.asarray(estimate)
+        self.replicates = np.asarray(replicates)
+        self.nobs = nobs
+        self.n_clusters = n_clusters
+
+    @property
+    def se(self):
+        """Standard deviation of the replicates."""
+        return np.nanstd(self.replicates, axis=0, ddof=1)
+
+    def confidence_interval(self, level=0.95):
+        """Percentile interval of each coefficient: {term: (low, high)}."""
+        low, high = np.nanquantile(self.replicates, [(1 - level) / 2, (1 + level) / 2], axis=0)
+        return {term: (low[i], high[i]) for i, term in enumerate(self.terms)}
+
+    def p_value(self):
+        """Two-sided permutation p-value of each coefficient, (1 + #|replicate| >= |estimate|) / (1 + R)."""
+        extreme = (np.abs(self.replicates) >= np.abs(self.estimate)).sum(axis=0)
+        return (1 + extreme) / (1 + len(self.replicates))
+
+    def summary(self, level=0.95):
+        interval = self.confidence_interval(level)
+        result = pd.DataFrame({
+            "term": self.terms,
+            "estimate": self.estimate,
+            "replicates": len(self.replicates),
+        })
+        if self.method == "bootstrap":
+            result["bootstrap_se"] = self.se
+            result["ci_low"] = [interval[term][0] for term in self.terms]
+            result["ci_high"] = [interval[term][1] for term in self.terms]
+        else:
+            result["p_value"] = self.p_value()
+        return result
+
+
+def cluster_bootstrap(data, formula, cluster="country", replicates=10_000, seed=None, workers=None,
+                      chunk_size=CHUNK_REPLICATES):
+    """Cluster (pairs) bootstrap of the coefficients of a fixed-effects formula."""
+    design = Design(data, formula, cluster, within=None)
+    cluster_xtx, cluster_xty = design.cluster_sums()
+    n_regressors = design.X.shape[1]
+    tasks = [(cluster_xtx, cluster_xty, n_regressors, size, chunk_seed)
+             for size, chunk_seed in spawn_chunks(replicates, seed, chunk_size)]
+    draws = run_chunks(bootstrap_chunk, tasks, workers)
+    return ResamplingResult("bootstrap", design.terms, design.estimate(), draws, design.nobs, design.n_clusters)
+
+
+def permutation_test(data, formula, within="year", cluster="country", replicates=10_000, seed=None, workers=None,
+                     chunk_size=CHUNK_REPLICATES):
+    """
+    Permutation test of the first regressor of a fixed-effects formula: the regressor is
+    permuted within each level of `within`, the other regressors are kept as controls.
+    """
+    design = Design(data, formula, cluster, within=within)
+    basis = orthonormal_basis(np.column_stack([design.X[:, 1:], design.controls]))
+    tasks = [(design.raw_X[:, 0], design.y, design.absorbed, basis, design.within, size, chunk_seed)
+             for size, chunk_seed in spawn_chunks(replicates, seed, chunk_size)]
+    draws = run_chunks(permutation_chunk, tasks, workers)
+    estimate = design.estimate()[:1]
+    return ResamplingResult("permutation", design.terms[:1], estimate, draws[:, None], design.nobs, design.n_clusters)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bootstrap and permutation inference for the NTL-GDP elasticity.")
+    parser.add_argument("--input", default=analysis_parquet_path, help="Analysis dataset (Parquet).")
+    parser.add_argument("--formula", default="log(dn) ~ log(gdp) | country + year", help="Fixed-effects formula.")
+    parser.add_argument("--by", help="Run separately for each level of this column (e.g. grade).")
+    parser.add_argument("--cluster", default="country", help="Column to resample (bootstrap clusters).")
+    parser.add_argument("--within", default="year", help="Column to permute within (permutation test).")
+    parser.add_argument("--replicates", type=int, default=10_000, help="Bootstrap replicates and permutations.")
+    parser.add_argument("--seed", type=int, help="Seed of the random draws.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes.")
+    args = parser.parse_args()
+
+    analysis = pd.read_parquet(args.input)
+    subsets = [(None, analysis)] if args.by is None else list(analysis.groupby(args.by, sort=True, observed=True))
+    for level, data in subsets:
+        label = args.formula if level is None else f"{args.formula} [{args.by} = {level}]"
+        bootstrap = cluster_bootstrap(data, args.formula, args.cluster, args.replicates, args.seed, args.workers)
+        permutation = permutation_test(data, args.formula, args.within, args.cluster, args.replicates, args.seed,
+                                       args.workers)
+        print(f"{label} (N = {bootstrap.nobs}, {bootstrap.n_clusters} clusters)")
+        print(bootstrap.summary().merge(permutation.summary()[["term", "p_value"]], on="term", how="left")
+              .to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
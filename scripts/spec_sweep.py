@@ -0,0 +1,294 @@
+"""
+Script Name: spec_sweep.py
+
+Description:
+    Runs a declarative grid of fixed-effects specifications (see `fixed_effects.py`) over the
+    analysis dataset and collects every fit in one tidy table. The grid is the product of:
+    - formulas: e.g. "log(dn) ~ log(gdp) | country + year"
+    - subsets: "all" (the whole sample) or a column such as "grade" (one fit per level)
+    - years: (first, last) year windows, or null for every year
+    - lags: number of years the regressors are lagged by within each country (0 = none)
+    and the standard errors are clustered by one column (default: country).
+
+    The work is shared as much as the specifications allow:
+    1. Every term (e.g. log(gdp), or a lagged regressor) is computed once over the whole
+       dataset, however many specifications use it.
+    2. Specifications that end up on the same rows with the same fixed effects (e.g. the
+       same sample with different regressors of the same availability) are demeaned
+       together, once, and only the small normal equations are solved per specification.
+       The levels of a subset column are fitted in the same batched call.
+    3. These samples are farmed out to a process pool.
+
+    The result has one row per (specification, subset level, term) with the estimate, the
+    clustered standard error, the t statistic, R², within R² and N.
+
+Author:
+    Shamayla Durrin Islam
+    shamayla.islam@mail.utoronto.ca
+
+Date:
+    Created: October 17, 2026
+
+Dependencies:
+    - Python 3.8 or higher
+    - numpy
+    - pandas >= 1.3
+    - pyarrow
+
+Usage:
+    Run the default grid (the models of 04-model_data.R, by grade, over several year windows
+    and lags) from the repository root:
+        python scripts/spec_sweep.py
+    Run a grid from a JSON file with the keys formulas, subsets, years, lags and cluster:
+        python scripts/spec_sweep.py --grid grid.json --output models/spec_sweep.parquet --workers 8
+"""
+
+import argparse
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from atomic_io import write_csv_atomic, write_parquet_atomic
+from fixed_effects import Formula, absorb, factor_codes, parse_term, solve, term_design, term_values
+
+analysis_parquet_path = "data/02-analysis_data/04-analysis/analysis.parquet"
+output_path = "models/spec_sweep.parquet"
+
+DEFAULT_GRID = {
+    "formulas": [
+        "log(dn) ~ log(gdp) | country + year",
+        "log(dn) ~ log(population) | country + year",
+        "log(dn) ~ manufacturingsharegdp | country + year",
+        "log(dn) ~ log(gdp) + log(population) | country + year",
+    ],
+    "subsets": ["all", "grade"],
+    "years": [None, [1992, 2005], [2006, 2020]],
+    "lags": [0, 1, 2],
+    "cluster": "country",
+}
+
+# Panel keys used to lag the regressors
+UNIT_COLUMN = "country"
+TIME_COLUMN = "year"
+
+RESULT_COLUMNS = ["spec", "formula", "subset", "level", "year_start", "year_end", "lag", "term", "estimate",
+                  "std_error", "statistic", "r2", "r2_within", "nobs", "n_clusters"]
+
+
+class Spec:
+    """One specification of the grid."""
+
+    def __init__(self, spec_id, formula, subset, years, lag):
+        self.id = spec_id
+        self.formula = Formula(formula)
+        self.subset = None if subset in (None, "all") else subset
+        self.years = tuple(years) if years is not None else None
+        self.lag = int(lag)
+
+    def regressors(self):
+        """Regressor terms, on the lagged columns when the specification has a lag."""
+        if not self.lag:
+            return list(self.formula.regressors)
+        return [":".join(lagged_term(part, self.lag) if i == 0 else part for i, part in enumerate(term.split(":")))
+                for term in self.formula.regressors]
+
+
+def expand_grid(grid):
+    """All the specifications of a grid, in a stable order."""
+    product = itertools.product(grid["formulas"], grid.get("subsets", ["all"]), grid.get("years", [None]),
+                                grid.get("lags", [0]))
+    return [Spec(i, *values) for i, values in enumerate(product)]
+
+
+def lagged_term(term, lag):
+    """The term on the column lagged by `lag` years, e.g. 'log(gdp)' -> 'log(gdp_lag1)'."""
+    transform, column = parse_term(term)
+    lagged = f"{column}_lag{lag}"
+    return f"{transform}({lagged})" if transform else lagged
+
+
+def add_lags(data, specs):
+    """Add the lagged columns the specifications need, matched on (country, year - lag)."""
+    keys = pd.MultiIndex.from_arrays([data[UNIT_COLUMN], data[TIME_COLUMN]])
+    for lag in sorted({spec.lag for spec in specs if spec.lag}):
+        source = keys.get_indexer(pd.MultiIndex.from_arrays([data[UNIT_COLUMN], data[TIME_COLUMN] - lag]))
+        columns = {parse_term(term.split(":")[0])[1] for spec in specs if spec.lag == lag
+                   for term in spec.formula.regressors}
+        for column in columns:
+            values = pd.to_numeric(data[column], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+            data[f"{column}_lag{lag}"] = np.where(source >= 0, values[source], np.nan)
+    return data
+
+
+class TermCache:
+    """Transformed terms, computed once over the whole dataset."""
+
+    def __init__(self, data):
+        self.data = data
+        self.outcomes = {}
+        self.regressors = {}
+
+    def outcome(self, term):
+        if term not in self.outcomes:
+            self.outcomes[term] = term_values(self.data, term)
+        return self.outcomes[term]
+
+    def regressor(self, term):
+        if term not in self.regressors:
+            self.regressors[term] = term_design(self.data, term)
+        return self.regressors[term]
+
+
+def spec_mask(data, cache, spec, years, cluster):
+    """Rows of the dataset that a specification is fitted on."""
+    mask = ~np.isnan(cache.outcome(spec.formula.outcome))
+    for term in spec.regressors():
+        mask &= ~np.isnan(cache.regressor(term)[0]).any(axis=1)
+    for column in spec.formula.fixed_effects + [spec.subset, cluster]:
+        if column is not None:
+            mask &= data[column].notna().to_numpy()
+    if spec.years is not None:
+        mask &= (years >= spec.years[0]) & (years <= spec.years[1])
+    return mask
+
+
+def build_units(data, specs, cluster):
+    """
+    Group the specifications into units of work: one per distinct (rows, fixed effects,
+    subset) sample, holding the union of the columns its specifications use.
+    """
+    cache = TermCache(data)
+    years = pd.to_numeric(data[TIME_COLUMN], errors="coerce").to_numpy()
+    key_columns = {column for spec in specs for column in spec.formula.fixed_effects + [spec.subset, cluster]}
+    key_codes = {column: factor_codes(data[column]) for column in key_columns if column is not None}
+    samples = {}
+    for spec in specs:
+        mask = spec_mask(data, cache, spec, years, cluster)
+        key = (tuple(spec.formula.fixed_effects), spec.subset, np.packbits(mask).tobytes())
+        samples.setdefault(key, (mask, []))[1].append(spec)
+
+    units = []
+    for (fixed_effects, subset, _), (mask, sample_specs) in samples.items():
+        columns, names, index = [], [], {}
+
+        def column_indices(term, values, term_names):
+            if term not in index:
+                index[term] = list(range(len(names), len(names) + len(term_names)))
+                columns.append(values[mask])
+                names.extend(term_names)
+            return index[term]
+
+        fits = []
+        for spec in sample_specs:
+            y = column_indices(("y", spec.formula.outcome), cache.outcome(spec.formula.outcome)[:, None],
+                               [spec.formula.outcome])[0]
+            x, terms = [], []
+            for term in spec.regressors():
+                values, term_names = cache.regressor(term)
+                x += column_indices(("x", term), values, term_names)
+                terms += term_names
+            fits.append({"spec": spec, "y": y, "x": x, "terms": terms})
+
+        if subset is None:
+            subset_codes, levels = None, [None]
+        else:
+            subset_codes, levels = pd.factorize(data.loc[mask, subset], sort=True)
+        units.append({
+            "values": np.column_stack(columns) if columns else np.empty((0, 0)),
+            "groups": [factor_codes(key_codes[column][mask]) for column in fixed_effects],
+            "subset": subset_codes,
+            "levels": [level.item() if hasattr(level, "item") else level for level in levels],
+            "cluster": None if cluster is None else factor_codes(key_codes[cluster][mask]),
+            "cluster_name": cluster,
+            "fits": fits,
+        })
+    return units
+
+
+def fit_unit(unit):
+    """Demean one sample once and fit each of its specifications; returns the result rows."""
+    rows = []
+    if not len(unit["values"]):
+        return rows
+    absorbed = absorb(unit["values"], unit["groups"], unit["subset"])
+    for fit in unit["fits"]:
+        spec = fit["spec"]
+        result = solve(absorbed, fit["y"], fit["x"], unit["cluster"])
+        se = np.sqrt(np.diagonal(result["vcov"], axis1=1, axis2=2))
+        for i, level in enumerate(unit["levels"]):
+            for j, term in enumerate(fit["terms"]):
+                rows.append({
+                    "spec": spec.id,
+                    "formula": str(spec.formula),
+                    "subset": spec.subset or "all",
+                    "level": None if level is None else str(level),
+                    "year_start": spec.years[0] if spec.years else None,
+                    "year_end": spec.years[1] if spec.years else None,
+                    "lag": spec.lag,
+                    "term": term,
+                    "estimate": result["coef"][i, j],
+                    "std_error": se[i, j],
+                    "statistic": result["coef"][i, j] / se[i, j],
+                    "r2": result["r2"][i],
+                    "r2_within": result["r2_within"][i],
+                    "nobs": result["nobs"][i],
+                    "n_clusters": None if result["n_clusters"] is None else result["n_clusters"][i],
+                })
+    return rows
+
+
+def run_sweep(data, grid, workers=None):
+    """Fit every specification of `grid` to `data`; returns the tidy result table."""
+    specs = expand_grid(grid)
+    cluster = grid.get("cluster", "country")
+    data = data.copy()
+    data[TIME_COLUMN] = pd.to_numeric(data[TIME_COLUMN], errors="coerce")
+    data = add_lags(data, specs)
+    units = build_units(data, specs, cluster)
+
+    workers = min(workers or os.cpu_count() or 1, len(units))
+    if workers <= 1:
+        results = map(fit_unit, units)
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(fit_unit, units, chunksize=max(1, len(units) // (4 * workers)))
+
+    try:
+        rows = [row for unit_rows in results for row in unit_rows]
+    finally:
+        if workers > 1:
+            executor.shutdown()
+
+    result = pd.DataFrame(rows, columns=RESULT_COLUMNS)
+    for column in ["year_start", "year_end", "n_clusters"]:
+        result[column] = result[column].astype("Int64")
+    return result.sort_values(["spec", "level", "term"], ignore_index=True, na_position="first")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit a grid of fixed-effects specifications.")
+    parser.add_argument("--grid", help="JSON file with the grid (default: the models of 04-model_data.R).")
+    parser.add_argument("--input", default=analysis_parquet_path, help="Analysis dataset (Parquet).")
+    parser.add_argument("--output", default=output_path, help="Result table (.parquet or .csv).")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per CPU).")
+    args = parser.parse_args()
+
+    grid = DEFAULT_GRID
+    if args.grid:
+        with open(args.grid) as f:
+            grid = json.load(f)
+
+    result = run_sweep(pd.read_parquet(args.input), grid, args.workers)
+    if args.output.endswith(".csv"):
+        write_csv_atomic(result, args.output)
+    else:
+        write_parquet_atomic(result, args.output)
+    print(f"Fitted {result['spec'].nunique()} specifications ({len(result)} estimates) into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+Script Name: wdi_ingest.py
+
+Description:
+    Generic ingestion of World Bank (WDI) indicators into one long-format Parquet store. It
+    accepts either single-indicator downloads (one row per country, one column per year, as in
+    `data/01-raw_data/04-worldbankdata/GDP.csv`) or the full WDI bulk CSV (`WDIData.csv`, with
+    'Indicator Name' and 'Indicator Code' columns), and:
+    1. Streams the CSV in chunks, keeping only the requested indicators, so the bulk file is
+       never loaded in full.
+    2. Reshapes each chunk from wide to long in one vectorized step over the year columns
+       (missing values are dropped).
+    3. Names each country after its ISO3 code through the shared country reference table
+       (`country_names.py`); aggregates such as 'World' keep their World Bank name.
+    4. Writes a Hive-partitioned Parquet store, `<store>/indicator=<name>/year=<year>/*.parquet`,
+       with the columns country, country_code and value.
+
+    An indicator's partition is written to a temporary directory and swapped in when complete,
+    so re-ingesting an indicator replaces it without affecting the others. Readers select
+    indicators, years and columns with partition and column pushdown, so only the requested
+    files and columns are read.
+
+Author:
+    Shamayla Durrin Islam
+    shamayla.islam@mail.utoronto.ca
+
+Date:
+    Created: October 17, 2026
+
+Dependencies:
+    - Python 3.8 or higher
+    - numpy
+    - pandas >= 1.3
+    - pyarrow
+
+Usage:
+    Ingest single-indicator downloads (the indicator is named after the file unless given):
+        python scripts/wdi_ingest.py data/01-raw_data/04-worldbankdata/GDP.csv --indicator gdp
+    Ingest selected indicators from the WDI bulk CSV:
+        python scripts/wdi_ingest.py WDIData.csv --indicators NY.GDP.MKTP.CD SP.POP.TOTL
+
+    from wdi_ingest import indicator_panel
+    panel = indicator_panel(store_dir, ["gdp", "population"], years=(1992, 2020))
+"""
+
+import argparse
+import os
+import re
+import shutil
+import tempfile
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from country_names import load_country_index
+
+# Default location of the indicator store
+default_store_dir = "data/02-analysis_data/03-worldbankdataprocessed/indicators"
+
+# Header spellings of the key columns in the World Bank downloads
+NAME_COLUMNS = ("Country Name", "Country")
+CODE_COLUMNS = ("Country Code", "Country_Code")
+INDICATOR_COLUMN = "Indicator Code"
+
+YEAR_COLUMN = re.compile(r"^\d{4}$")
+
+# Rows read per chunk from the source CSV
+CHUNK_ROWS = 20_000
+
+# Long-format rows accumulated before they are written out as one batch of files
+FLUSH_ROWS = 5_000_000
+
+PARTITIONING = ds.partitioning(pa.schema([("indicator", pa.string()), ("year", pa.int16())]), flavor="hive")
+
+STORE_SCHEMA = pa.schema([
+    ("country", pa.string()),
+    ("country_code", pa.string()),
+    ("value", pa.float64()),
+    ("indicator", pa.string()),
+    ("year", pa.int16()),
+])
+
+
+def find_column(columns, candidates, file_path):
+    """Return the first of `candidates` present in `columns`."""
+    for candidate in candidates:
+        if candidate in columns:
+            return candidate
+    raise ValueError(f"{file_path} has none of the columns {', '.join(candidates)}.")
+
+
+def stack_chunk(chunk, name_column, code_column, year_columns, indicators):
+    """Reshape a wide chunk to long format (country, country_code, value, indicator, year), dropping missing values."""
+    values = chunk[year_columns].apply(pd.to_numeric, errors="coerce").to_numpy(dtype="float64")
+    rows, cols = np.nonzero(~np.isnan(values))
+    years = np.array([int(column) for column in year_columns], dtype="int16")
+
+    return pd.DataFrame({
+        "country": chunk[name_column].to_numpy(dtype=object)[rows],
+        "country_code": chunk[code_column].to_numpy(dtype=object)[rows],
+        "value": values[rows, cols],
+        "indicator": np.asarray(indicators, dtype=object)[rows],
+        "year": years[cols],
+    })
+
+
+def iter_long_chunks(file_path, indicator=None, indicators=None, chunksize=CHUNK_ROWS):
+    """
+    Stream a World Bank CSV as long-format chunks.
+
+    Single-indicator files are stored under `indicator` (default: the file name). For the
+    bulk WDI file each row's 'Indicator Code' is used, optionally restricted to `indicators`.
+    """
+    reader = pd.read_csv(
+        file_path, chunksize=chunksize, dtype=str, keep_default_na=False, na_values=[""],
+        encoding="utf-8-sig",
+    )
+    wanted = set(indicators) if indicators else None
+    for chunk in reader:
+        name_column = find_column(chunk.columns, NAME_COLUMNS, file_path)
+        code_column = find_column(chunk.columns, CODE_COLUMNS, file_path)
+        year_columns = [column for column in chunk.columns if YEAR_COLUMN.match(str(column))]
+
+        chunk = chunk.dropna(subset=[code_column])
+        if INDICATOR_COLUMN in chunk.columns:
+            if wanted is not None:
+                chunk = chunk[chunk[INDICATOR_COLUMN].isin(wanted)]
+            chunk_indicators = chunk[INDICATOR_COLUMN].to_numpy(dtype=object)
+        else:
+            name = indicator or os.path.splitext(os.path.basename(file_path))[0]
+            chunk_indicators = np.full(len(chunk), name, dtype=object)
+
+        if len(chunk):
+            yield stack_chunk(chunk, name_column, code_column, year_columns, chunk_indicators)
+
+
+def normalize_countries(long_df):
+    """Name each row's country after its ISO3 code; unknown codes keep the World Bank name."""
+    long_df["country"] = load_country_index().from_iso3(long_df["country_code"]).fillna(long_df["country"])
+    return long_df
+
+
+def write_batch(frames, root, batch):
+    """Write accumulated long-format chunks into the partitioned store under `root`."""
+    table = pa.Table.from_pandas(pd.concat(frames, ignore_index=True), schema=STORE_SCHEMA, preserve_index=False)
+    ds.write_dataset(
+        table, root, format="parquet", partitioning=PARTITIONING,
+        basename_template=f"part-{batch}-{{i}}.parquet", existing_data_behavior="overwrite_or_ignore",
+    )
+
+
+def ingest(file_path, store_dir=default_store_dir, indicator=None, indicators=None, chunksize=CHUNK_ROWS):
+    """
+    Ingest one World Bank CSV into the store, replacing the partitions of the indicators it
+    contains. Returns the names of the ingested indicators.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    tmp_root = tempfile.mkdtemp(dir=store_dir, prefix=".tmp-")
+    try:
+        frames, rows, batch = [], 0, 0
+        for long_df in iter_long_chunks(file_path, indicator, indicators, chunksize):
+            frames.append(normalize_countries(long_df))
+            rows += len(long_df)
+            if rows >= FLUSH_ROWS:
+                write_batch(frames, tmp_root, batch)
+                frames, rows, batch = [], 0, batch + 1
+        if frames:
+            write_batch(frames, tmp_root, batch)
+
+        # Swap in each complete indicator partition
+        written = sorted(entry for entry in os.listdir(tmp_root) if entry.startswith("indicator="))
+        if indicator and not written:
+            # A single-indicator file without any value clears that indicator
+            shutil.rmtree(partition_dir(store_dir, indicator), ignore_errors=True)
+        for entry in written:
+            target = os.path.join(store_dir, entry)
+            shutil.rmtree(target, ignore_errors=True)
+            os.replace(os.path.join(tmp_root, entry), target)
+    finally:
+        shutil.rmtree(tmp_root, ignore_errors=True)
+
+    return [unquote(entry.split("=", 1)[1]) for entry in written]
+
+
+def partition_dir(store_dir, indicator):
+    """Directory holding one indicator's partitions."""
+    return os.path.join(store_dir, f"indicator={quote(indicator, safe='')}")
+
+
+def read_store(store_dir, indicators=None, years=None, columns=("country_code", "year", "indicator", "value")):
+    """
+    Read the long-format store, keeping only `indicators` and the (first, last) `years`. The
+    filters are pushed down to the partitions, and only `columns` are read.
+    """
+    dataset = ds.dataset(store_dir, format="parquet", partitioning=PARTITIONING)
+    expression = None
+    if indicators is not None:
+        expression = ds.field("indicator").isin(list(indicators))
+    if years is not None:
+        first, last = years
+        in_years = (ds.field("year") >= first) & (ds.field("year") <= last)
+        expression = in_years if expression is None else expression & in_years
+    return dataset.to_table(columns=list(columns), filter=expression).to_pandas()
+
+
+def indicator_panel(store_dir, indicators, years=None):
+    """
+    Wide panel of `indicators` indexed by (country_code, year), one column per indicator.
+    A (country, year) row is present when at least one indicator is observed.
+    """
+    long_df = read_store(store_dir, indicators, years)
+    panel = long_df.pivot_table(index=["country_code", "year"], columns="indicator", values="value",
+                                aggfunc="first", observed=True)
+    panel = panel.reindex(columns=list(indicators))
+    panel.columns.name = None
+    return panel
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest World Bank indicator CSVs into a partitioned Parquet store.")
+    parser.add_argument("files", nargs="+", help="Single-indicator World Bank CSVs or the WDI bulk CSV.")
+    parser.add_argument("--store", default=default_store_dir, help="Directory of the indicator store.")
+    parser.add_argument("--indicator", help="Name to store a single-indicator file under (default: the file name).")
+    parser.add_argument("--indicators", nargs="+", help="Indicator codes to keep from the WDI bulk CSV (default: all).")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_ROWS, help="CSV rows read per chunk.")
+    args = parser.parse_args()
+
+    if args.indicator and len(args.files) > 1:
+        parser.error("--indicator can only be used with a single file.")
+
+    for file_path in args.files:
+        names = ingest(file_path, args.store, args.indicator, args.indicators, args.chunksize)
+        print(f"Ingested {len(names)} indicator(s) from {file_path} into {args.store}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Script Name: zonal_stats.py
+
+Description:
+    Zonal statistics for `01-data_extraction.py`. Beyond the total DN per country, this computes
+    the following for every zone of any number of boundary layers (e.g. countries and admin-1
+    regions):
+    - lit_pixels: number of lit pixels (DN not 0 or NaN)
+    - dn_sum, dn_mean, dn_max
+    - dn_p<q>: DN percentiles of the lit pixels (by default the 10th, 25th, 50th, 75th and 90th)
+    - saturated_share: share of the lit pixels at or above the saturation (top-coded) DN
+    - hist_<v>: DN histogram (lit pixel counts per DN bin, labelled by the bin's lower edge;
+      values beyond the last edge are counted in the last bin)
+
+    Each layer is rasterized to a label raster (cached like the country labels, see
+    `label_cache.py`), so every statistic is a `np.bincount` reduction over the labels. The
+    per-pixel work (lit mask, histogram bins, saturation) is done once per window and shared
+    by all the layers, so the raster is read in a single pass whatever the number of layers.
+
+    Percentiles are read from the per-zone histogram (the lower edge of the bin holding the
+    requested rank, i.e. the inverted-CDF percentile). With the default unit-width bins of
+    integer rasters such as the harmonized DN files they are exact; with float rasters their
+    resolution is that of the bins.
+
+Author:
+    Shamayla Durrin Islam
+    shamayla.islam@mail.utoronto.ca
+
+Date:
+    Created: October 17, 2026
+
+Dependencies:
+    - Python 3.8 or higher
+    - numpy
+    - pandas >= 1.3
+    - pyarrow (to write the Parquet tables)
+
+Usage:
+    from zonal_stats import ZoneLayer, ZonalStats
+
+    layers = [ZoneLayer("country", names, label_raster=labels),
+              ZoneLayer("admin1", admin_names, label_raster=admin_labels)]
+    zonal = ZonalStats(layers, band_dtype, saturation=63)
+    totals = extract_country_totals(tif_path, None, labels=(labels, names), zonal=zonal)
+    tables = zonal.frames()  # one wide DataFrame per layer
+"""
+
+import numpy as np
+import pandas as pd
+from rasterio.windows import Window
+
+from ntl_extraction import country_ids, lit_mask, window_labels
+
+# Saturation (top-coded) DN of the harmonized DMSP/VIIRS NTL files
+HARMONIZED_SATURATION = 63
+
+DEFAULT_PERCENTILES = (10, 25, 50, 75, 90)
+
+# Number of bins of the default float histogram
+FLOAT_BINS = 64
+
+
+def default_edges(dtype, saturation=None):
+    """
+    Histogram bin edges: unit-width bins from 1 up to the saturation (or the dtype's maximum)
+    for integer rasters, `FLOAT_BINS` bins from 0 to the saturation for float rasters.
+    """
+    dtype = np.dtype(dtype)
+    if np.issubdtype(dtype, np.integer):
+        top = saturation if saturation is not None else min(np.iinfo(dtype).max, 65535)
+        return np.arange(1, int(top) + 2, dtype="float64")
+    if saturation is None:
+        raise ValueError("Float rasters need a saturation value or explicit histogram edges.")
+    return np.linspace(0, saturation, FLOAT_BINS + 1)
+
+
+class ZoneLayer:
+    """
+    One boundary layer: a label raster covering the raster grid (e.g. memory-mapped from the
+    label cache), or the zone polygons to label each window on the fly.
+    """
+
+    def __init__(self, name, names=None, label_raster=None, zones=None, name_field="COUNTRY"):
+        self.name = name
+        self.label_raster = label_raster
+        self.zones = zones
+        self.name_field = name_field
+        if label_raster is None:
+            self.name_to_id, self.names = country_ids(zones, name_field)
+        else:
+            self.names = names
+
+    def labels(self, dataset, window):
+        """Labels of the pixels of `window`."""
+        if self.label_raster is not None:
+            rows, cols = window.toslices()
+            return np.asarray(self.label_raster[rows, cols])
+        return window_labels(dataset, window, self.zones, self.name_to_id, self.name_field)
+
+
+class ZonalStats:
+    """Accumulate the zonal statistics of every layer over the windows of one raster."""
+
+    def __init__(self, layers, band_dtype, edges=None, saturation=HARMONIZED_SATURATION,
+                 percentiles=DEFAULT_PERCENTILES):
+        self.layers = layers
+        self.dtype = np.dtype(band_dtype)
+        self.saturation = saturation
+        self.percentiles = tuple(percentiles)
+        self.edges = np.asarray(edges if edges is not None else default_edges(self.dtype, saturation),
+                                dtype="float64")
+        self.n_bins = len(self.edges) - 1
+
+        # Unit-width integer bins: the bin is simply the DN minus the first edge
+        self.unit_bins = np.issubdtype(self.dtype, np.integer) and np.all(np.diff(self.edges) == 1)
+
+        self.sums = [np.zeros(len(layer.names)) for layer in layers]
+        self.maxima = [np.full(len(layer.names), -np.inf) for layer in layers]
+        self.saturated = [np.zeros(len(layer.names), dtype="int64") for layer in layers]
+        self.histograms = [np.zeros((len(layer.names), self.n_bins), dtype="int64") for layer in layers]
+
+    def bin_index(self, values):
+        """Histogram bin of each value; values outside the edges go to the first or last bin."""
+        if self.unit_bins:
+            bins = values.astype("int64") - int(self.edges[0])
+        else:
+            bins = np.searchsorted(self.edges, values, side="right") - 1
+        return np.clip(bins, 0, self.n_bins - 1)
+
+    def update(self, band, dataset, window=None, primary_labels=None):
+        """
+        Add one window of the band (the whole raster when `window` is None). `primary_labels`
+        are the labels of the first layer for this window, if the caller already has them.
+        """
+        if window is None:
+            window = Window(0, 0, dataset.width, dataset.height)
+
+        # Per-pixel work shared by every layer
+        lit = lit_mask(band).ravel()
+        values = band.ravel()[lit]
+        bins = self.bin_index(values)
+        saturated = values >= self.saturation if self.saturation is not None else None
+
+        for i, layer in enumerate(self.layers):
+            labels = primary_labels if i == 0 and primary_labels is not None else layer.labels(dataset, window)
+            labels = np.asarray(labels).ravel()[lit].astype("int64")
+            n_labels = len(layer.names)
+
+            self.histograms[i] += np.bincount(
+                labels * self.n_bins + bins, minlength=n_labels * self.n_bins
+            ).reshape(n_labels, self.n_bins)
+            self.sums[i] += np.bincount(labels, weights=values, minlength=n_labels)
+            if saturated is not None:
+                self.saturated[i] += np.bincount(labels[saturated], minlength=n_labels)
+            np.maximum.at(self.maxima[i], labels, values)
+
+    def percentile_values(self, histogram, counts):
+        """Inverted-CDF percentiles of every zone from its histogram."""
+        cumulative = np.cumsum(histogram, axis=1)
+        result = {}
+        for q in self.percentiles:
+            rank = np.ceil(q / 100 * counts).clip(min=1)
+            # First bin whose cumulative count reaches the rank
+            bins = (cumulative < rank[:, None]).sum(axis=1).clip(max=self.n_bins - 1)
+            result[f"dn_p{q:g}"] = self.edges[bins]
+        return result
+
+    def frame(self, i):
+        """Wide table of the statistics of layer `i`, one row per zone with at least one lit pixel."""
+        layer = self.layers[i]
+        histogram = self.histograms[i]
+        counts = histogram.sum(axis=1)
+
+        # Drop label 0 (no zone) and zones without a single lit pixel
+        keep = counts > 0
+        keep[0] = False
+        histogram, counts = histogram[keep], counts[keep]
+
+        sums = self.sums[i][keep]
+        maxima = self.maxima[i][keep]
+        if np.issubdtype(self.dtype, np.integer):
+            sums = np.rint(sums).astype("int64")
+            maxima = maxima.astype("int64")
+
+        columns = {
+            layer.name: layer.names[keep],
+            "lit_pixels": counts,
+            "dn_sum": sums,
+            "dn_mean": self.sums[i][keep] / counts,
+            "dn_max": maxima,
+        }
+        columns.update(self.percentile_values(histogram, counts))
+        if self.saturation is not None:
+            columns["saturated_share"] = self.saturated[i][keep] / counts
+
+        labels = [f"hist_{edge:g}" for edge in self.edges[:-1]]
+        result = pd.concat(
+            [pd.DataFrame(columns), pd.DataFrame(histogram, columns=labels)], axis=1
+        )
+        return result.sort_values(layer.name, ignore_index=True)
+
+    def frames(self):
+        """Wide statistics table of every layer, keyed by layer name."""
+        return {layer.name: self.frame(i) for i, layer in enumerate(self.layers)}